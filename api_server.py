@@ -0,0 +1,568 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import startup
+import telemetry
+
+# --- HEADLESS API ---
+# JSON-over-HTTP access to the engines for the LMS, without Streamlit:
+# scenario lookup, goal-setting grading, Judgment Call chats (with SSE
+# streaming of the student's reply) and training plans.
+#
+# Connections are served by one asyncio event loop, so an idle or slow
+# client costs a coroutine, not a thread. The engine calls themselves are
+# blocking and run on a bounded pool of API_ENGINE_THREADS threads.
+# Identical grading/training-plan requests that arrive while the first is
+# still running share its result instead of calling the model again.
+# A chat answers one message at a time: a second message for a session
+# whose reply is still being generated gets a 409.
+# /health and /metrics report in-flight requests, coalescing and the
+# telemetry of every model call.
+#
+#   LLM_BACKEND=stub python api_server.py --port 8800
+
+HOST = os.getenv("API_HOST", "127.0.0.1")
+PORT = int(os.getenv("API_PORT", "8800"))
+ENGINE_THREADS = int(os.getenv("API_ENGINE_THREADS", "32"))
+MAX_IN_FLIGHT = int(os.getenv("API_MAX_IN_FLIGHT", "512"))
+MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(1024 * 1024)))
+KEEPALIVE_SECONDS = float(os.getenv("API_KEEPALIVE_SECONDS", "15"))
+MAX_PAGE = 500
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = unquote(parts.path).rstrip("/") or "/"
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+        self.params = {}
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise ApiError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        return data
+
+    def wants_stream(self, body):
+        return bool(body.get("stream")) or "text/event-stream" in self.headers.get("accept", "")
+
+
+class EventStream:
+    """Handler result streamed as Server-Sent Events: an async iterator of (event, data)"""
+
+    def __init__(self, events):
+        self.events = events
+
+
+class Coalescer:
+    """Concurrent calls with the same key share one run"""
+
+    def __init__(self):
+        self._in_flight = {}
+        self.runs = 0
+        self.shared = 0
+
+    async def run(self, key, make_coroutine):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coroutine())
+            self._in_flight[key] = task
+
+            def forget(_):
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+            task.add_done_callback(forget)
+            self.runs += 1
+        else:
+            self.shared += 1
+        # One caller going away must not cancel the run for the others
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"runs": self.runs, "shared": self.shared, "in_flight": len(self._in_flight)}
+
+
+def _required(body, key, kind=str):
+    value = body.get(key)
+    if not isinstance(value, kind) or (kind is str and not value.strip()):
+        raise ApiError(400, f"'{key}' is required")
+    return value
+
+def _scenario_key(value):
+    """Goal scenario ids are ints in scenarios.json; path parameters arrive as strings"""
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+_END = object()
+
+
+class ApiServer:
+    def __init__(self, engine_threads=ENGINE_THREADS, max_in_flight=MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.engine_threads = engine_threads
+        self.executor = ThreadPoolExecutor(max_workers=engine_threads, thread_name_prefix="api-engine")
+        self.coalescer = Coalescer()
+        self.in_flight = 0
+        self.replying = set()                       # chat sessions with a message being answered
+        self.responses = collections.Counter()     # (route, status) -> responses
+        self.started = time.time()
+        self.routes = [
+            ("GET", "/health", "health", self.health),
+            ("GET", "/metrics", "metrics", self.metrics),
+            ("GET", "/scenarios", "scenarios", self.list_scenarios),
+            ("GET", "/scenarios/(?P<scenario_id>[^/]+)", "scenario", self.get_scenario),
+            ("GET", "/personas", "personas", self.list_personas),
+            ("GET", "/personas/(?P<persona_id>[^/]+)", "persona", self.get_persona),
+            ("GET", "/training-batch", "training_batch", self.training_batch),
+            ("POST", "/grade", "grade", self.grade),
+            ("POST", "/training-plan", "training_plan", self.training_plan),
+            ("POST", "/chat/sessions", "chat_start", self.start_chat),
+            ("GET", "/chat/sessions/(?P<session_id>[0-9a-f]+)", "chat_get", self.get_chat),
+            ("POST", "/chat/sessions/(?P<session_id>[0-9a-f]+)/messages", "chat_message", self.send_message),
+            ("POST", "/chat/sessions/(?P<session_id>[0-9a-f]+)/plan", "chat_plan", self.chat_plan),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), name, handler)
+                       for method, pattern, name, handler in self.routes]
+
+    async def call(self, fn, *args):
+        """Runs a blocking engine call on the engine threads"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def stream(self, produce):
+        """
+        Runs produce(emit) on an engine thread and yields whatever it emits
+        as soon as it is emitted. Errors raised by produce are re-raised here.
+        """
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+
+        def emit(item):
+            loop.call_soon_threadsafe(items.put_nowait, item)
+
+        def run():
+            try:
+                return produce(emit)
+            finally:
+                emit(_END)
+
+        future = loop.run_in_executor(self.executor, run)
+        while (item := await items.get()) is not _END:
+            yield item
+        await future
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._write_json(writer, 413, {"error": "Body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if not await self.respond(Request(method, target, headers, body), writer, keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def route(self, request):
+        allowed = False
+        for method, pattern, name, handler in self.routes:
+            match = pattern.match(request.path)
+            if match:
+                if method == request.method:
+                    request.params = match.groupdict()
+                    return name, handler
+                allowed = True
+        raise ApiError(405 if allowed else 404, f"No route for {request.method} {request.path}")
+
+    async def respond(self, request, writer, keep_alive):
+        """Handles one request; returns False when the connection has to be closed"""
+        name = "unknown"
+        with telemetry.span("api.request", method=request.method) as span:
+            if self.in_flight >= self.max_in_flight:
+                status, result = 503, {"error": "Too many requests in flight"}
+            else:
+                self.in_flight += 1
+                try:
+                    name, handler = self.route(request)
+                    status, result = 200, await handler(request)
+                except ApiError as e:
+                    status, result = e.status, {"error": str(e)}
+                except Exception as e:
+                    telemetry.record_error(f"api.{name}", e)
+                    status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+                finally:
+                    self.in_flight -= 1
+            span.update(route=name, status=status)
+            if status >= 400:
+                span["outcome"] = "error"
+            self.responses[(name, status)] += 1
+
+            if isinstance(result, EventStream):
+                self.in_flight += 1
+                try:
+                    await self._write_events(writer, result)
+                finally:
+                    self.in_flight -= 1
+                return False
+            if isinstance(result, str):
+                await self._write(writer, status, result.encode('utf-8'), "text/plain; version=0.0.4", keep_alive)
+            else:
+                await self._write_json(writer, status, result, keep_alive)
+            return keep_alive
+
+    async def _write(self, writer, status, body, content_type, keep_alive):
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _write_json(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        await self._write(writer, status, body, "application/json", keep_alive)
+
+    async def _write_events(self, writer, stream):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        try:
+            async for event, data in stream.events:
+                writer.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode('utf-8'))
+                await writer.drain()
+        except ApiError as e:
+            writer.write(f"event: error\ndata: {json.dumps({'error': str(e), 'status': e.status})}\n\n".encode('utf-8'))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            telemetry.record_error("api.stream", e)
+            writer.write(f"event: error\ndata: {json.dumps({'error': f'{type(e).__name__}: {e}', 'status': 500})}\n\n"
+                         .encode('utf-8'))
+        await writer.drain()
+
+    # --- STATUS ---
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "in_flight": self.in_flight,
+            "engine_threads": self.engine_threads,
+            "coalescing": self.coalescer.stats(),
+            "chats_replying": len(self.replying),
+            "responses": {f"{name} {status}": n for (name, status), n in sorted(self.responses.items())},
+        }
+
+    async def health(self, request):
+        import llm_client
+        return {"status": "ok", "backend": llm_client.BACKEND, "engine_loaded": startup.engine_loaded(),
+                **self.stats()}
+
+    async def metrics(self, request):
+        if request.query.get("format") == "json":
+            return {"api": self.stats(), "calls": telemetry.summary()}
+        coalescing = self.coalescer.stats()
+        lines = [
+            "# TYPE api_in_flight gauge", f"api_in_flight {self.in_flight}",
+            "# TYPE api_coalesced_total counter", f"api_coalesced_total {coalescing['shared']}",
+            "# TYPE api_responses_total counter",
+        ]
+        lines += [f'api_responses_total{{route="{name}",status="{status}"}} {n}'
+                  for (name, status), n in sorted(self.responses.items())]
+        return telemetry.render_prometheus() + "\n".join(lines) + "\n"
+
+    # --- SCENARIOS ---
+
+    def _store(self):
+        import data_manager
+        store = data_manager.get_store()
+        if store is None:
+            raise ApiError(503, "Scenario library is not available")
+        return store
+
+    async def list_scenarios(self, request):
+        store = self._store()
+        conflict_type = request.query.get("conflict_type")
+        scenarios = store.get_by_conflict(conflict_type) if conflict_type else store.goal_scenarios
+        try:
+            offset = max(0, int(request.query.get("offset", 0)))
+            limit = min(MAX_PAGE, max(0, int(request.query.get("limit", 100))))
+        except ValueError:
+            raise ApiError(400, "offset and limit must be integers")
+        page = [scenarios[i] for i in range(offset, min(offset + limit, len(scenarios)))]
+        return {"total": len(scenarios), "offset": offset, "scenarios": page}
+
+    async def get_scenario(self, request):
+        scenario = self._store().get_scenario(_scenario_key(request.params["scenario_id"]))
+        if scenario is None:
+            raise ApiError(404, "Unknown scenario")
+        return scenario
+
+    async def list_personas(self, request):
+        return {"personas": list(self._store().personas)}
+
+    async def get_persona(self, request):
+        persona = self._store().get_persona(request.params["persona_id"])
+        if persona is None:
+            raise ApiError(404, "Unknown persona")
+        return persona
+
+    async def training_batch(self, request):
+        """?tutor_id= picks from the tutor's weak spots; that can read the progress store, so it runs on the engine threads"""
+        import data_manager
+        conflict_type, tutor_id = request.query.get("conflict_type"), request.query.get("tutor_id")
+        if tutor_id:
+            batch = await self.call(data_manager.get_training_batch, conflict_type, tutor_id)
+        else:
+            batch = data_manager.get_training_batch(conflict_type)
+        if batch is None:
+            raise ApiError(503, "Scenario library is not available")
+        return batch
+
+    # --- GRADING ---
+
+    async def grade(self, request):
+        """{"response", "scenario_id" or "scenario", "mode"?, "tutor_id"?}"""
+        import goal_setting
+        body = request.json()
+        tutor_response = _required(body, "response")
+        mode = body.get("mode", goal_setting.EVAL_MODE)
+        if mode not in ("structured", "text"):
+            raise ApiError(400, "mode must be 'structured' or 'text'")
+        scenario = body.get("scenario")
+        if scenario is None:
+            scenario = self._store().get_scenario(_scenario_key(body.get("scenario_id")))
+            if scenario is None:
+                raise ApiError(404, "Unknown scenario")
+        elif not isinstance(scenario, dict) or not {"parent", "student", "conflict type"} <= scenario.keys():
+            raise ApiError(400, "scenario needs 'parent', 'student' and 'conflict type'")
+        tutor_id = body.get("tutor_id")
+
+        def grade():
+            import progress_store
+            if mode == "structured":
+                evaluation = goal_setting.grade_tutor_response_structured(tutor_response, scenario)
+                result = {"evaluation": evaluation.to_dict(), "markdown": evaluation.as_markdown()}
+            else:
+                evaluation = goal_setting.grade_tutor_response(tutor_response, scenario)
+                result = {"feedback": evaluation}
+            if tutor_id and scenario.get('id') is not None:
+                progress_store.get_progress_store().record_goal(tutor_id, scenario['id'], evaluation)
+            return result
+
+        key = ("grade", mode, tutor_id, json.dumps(scenario, sort_keys=True), tutor_response)
+        return await self.coalescer.run(key, lambda: self.call(grade))
+
+    async def training_plan(self, request):
+        """{"conversation_log": ["Tutor: ...", "Student: ..."], "persona_id"?, "tutor_id"?}"""
+        import feedback_training
+        body = request.json()
+        conversation_log = _required(body, "conversation_log", list)
+        if not conversation_log or not all(isinstance(line, str) for line in conversation_log):
+            raise ApiError(400, "conversation_log must be a non-empty list of strings")
+        persona_id, tutor_id = body.get("persona_id"), body.get("tutor_id")
+
+        def plan():
+            import progress_store
+            training_plan = feedback_training.generate_training_plan(conversation_log, persona_id=persona_id)
+            if tutor_id and persona_id:
+                progress_store.get_progress_store().record_sim(tutor_id, persona_id, training_plan)
+            return {"training_plan": training_plan}
+
+        key = ("training_plan", persona_id, tutor_id, tuple(conversation_log))
+        return await self.coalescer.run(key, lambda: self.call(plan))
+
+    # --- CHAT ---
+
+    def _load_chat(self, session_id):
+        import chat_sessions
+        record = chat_sessions.get_chat_store().get(session_id)
+        if record is None:
+            raise ApiError(404, "Unknown or expired chat session")
+        persona = self._store().get_persona(record.persona_id)
+        if persona is None:
+            raise ApiError(404, "The persona of this chat no longer exists")
+        return record, persona
+
+    async def start_chat(self, request):
+        """{"persona_id", "tutor_id"?}: a new chat with the student's opening line"""
+        import chat_sessions
+        import judgment_call
+        import prewarm
+        body = request.json()
+        persona = self._store().get_persona(_required(body, "persona_id"))
+        if persona is None:
+            raise ApiError(404, "Unknown persona")
+        tutor_id = body.get("tutor_id") or "api"
+
+        def start():
+            pool = prewarm.get_pool()
+            opening = pool.take_opening(persona['id']) if pool else None
+            if opening is None:
+                opening = judgment_call.opening_line(persona['description'], persona['id'])
+            record = chat_sessions.ChatRecord.new(tutor_id, persona['id'])
+            record.add("student", opening)
+            chat_sessions.get_chat_store().put(record)
+            return {"session_id": record.session_id, "persona_id": persona['id'], "opening": opening,
+                    "revision": record.revision}
+
+        return await self.call(start)
+
+    async def get_chat(self, request):
+        record, _ = await self.call(self._load_chat, request.params["session_id"])
+        return record.to_dict()
+
+    async def send_message(self, request):
+        """{"message", "stream"?}: the student's reply, as JSON or as SSE chunk/done events"""
+        import chat_sessions
+        import judgment_call
+        import llm_client
+        import turn_scoring
+        body = request.json()
+        message = _required(body, "message")
+        session_id = request.params["session_id"]
+        # Two replies on one live chat would leave the loser's exchange in its history
+        if session_id in self.replying:
+            raise ApiError(409, "This chat is still answering the previous message; retry once it is done")
+        self.replying.add(session_id)
+        loop = asyncio.get_running_loop()
+
+        def release():
+            # Called on the engine thread once the reply is recorded or has failed
+            loop.call_soon_threadsafe(self.replying.discard, session_id)
+
+        try:
+            record, persona = await self.call(self._load_chat, session_id)
+        except BaseException:
+            self.replying.discard(session_id)
+            raise
+        model_name = judgment_call.MODEL_NAME
+
+        def finish(chat, reply):
+            try:
+                chat_sessions.record_turn(record, persona['description'], model_name, chat, message, reply)
+            except chat_sessions.StaleChatRecord:
+                chat_sessions.forget_chat(record.session_id)
+                raise ApiError(409, "This chat was continued elsewhere; reload it and retry")
+            if turn_scoring.ENABLED:
+                turn_scoring.get_scorer(record.session_id, persona['description'],
+                                        persona['id']).catch_up(record.turns)
+            return {"reply": reply, "revision": record.revision, "turns": len(record.turns)}
+
+        def open_chat():
+            return chat_sessions.get_chat(record, persona['description'], model_name)
+
+        def reply():
+            try:
+                chat = open_chat()
+                try:
+                    response = llm_client.send_message(chat, message, op="judgment_call.send_message",
+                                                       tags={"persona_id": persona['id']})
+                except Exception:
+                    chat_sessions.forget_chat(record.session_id)
+                    raise
+                return finish(chat, response.text)
+            finally:
+                release()
+
+        def stream_reply(emit):
+            try:
+                chat = open_chat()
+                pieces = []
+                try:
+                    for piece in judgment_call.stream_reply(chat, message, persona['id']):
+                        pieces.append(piece)
+                        emit(("chunk", {"text": piece}))
+                except Exception:
+                    chat_sessions.forget_chat(record.session_id)
+                    raise
+                emit(("done", finish(chat, "".join(pieces))))
+            finally:
+                release()
+
+        if request.wants_stream(body):
+            return EventStream(self.stream(stream_reply))
+        return await self.call(reply)
+
+    async def chat_plan(self, request):
+        """Training plan for a chat: merged from the per-turn scores, or one call over the transcript"""
+        import feedback_training
+        import progress_store
+        import turn_scoring
+        record, persona = await self.call(self._load_chat, request.params["session_id"])
+        if len(record.turns) < 2:
+            raise ApiError(400, "Have a conversation before asking for a training plan")
+
+        def plan():
+            training_plan, score = None, None
+            if turn_scoring.ENABLED:
+                scorer = turn_scoring.get_scorer(record.session_id, persona['description'], persona['id'])
+                scorer.catch_up([tuple(turn) for turn in record.turns])
+                training_plan, score = scorer.training_plan(), scorer.state.mean_score()
+            if training_plan is None:
+                training_plan = feedback_training.generate_training_plan(
+                    record.transcript(persona['description']).as_log(), persona_id=persona['id'])
+            progress_store.get_progress_store().record_sim(record.tutor_id, persona['id'], training_plan,
+                                                           score=score)
+            return {"training_plan": training_plan, "score": score}
+
+        key = ("chat_plan", record.session_id, record.revision)
+        return await self.coalescer.run(key, lambda: self.call(plan))
+
+    # --- SERVING ---
+
+    async def serve(self, host=HOST, port=PORT):
+        await self.call(startup.load_engine)
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_BODY_BYTES)
+        print(f"Tutor Tutor API listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the grading and simulation engines over HTTP.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--engine-threads", type=int, default=ENGINE_THREADS, help="Threads for blocking model calls")
+    args = parser.parse_args()
+    try:
+        asyncio.run(ApiServer(engine_threads=args.engine_threads).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
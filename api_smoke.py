@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- API SMOKE TEST ---
+# Starts api_server in-process against the offline stub, with throwaway
+# progress and chat stores, and calls every route once: scenario and persona
+# lookup, grading, training plans, a chat with JSON and SSE replies, two
+# messages racing for the same chat (one must get a 409) and the chat plan.
+# Prints one line per check and exits non-zero if any of them fails.
+# tests/test_api_server.py runs the same checks under pytest.
+#
+#   python api_smoke.py
+
+SCRATCH = tempfile.mkdtemp(prefix="api-smoke-")
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["EVAL_CACHE_DISABLED"] = "1"
+os.environ["PREWARM_ENABLED"] = "0"
+os.environ["PROGRESS_DB_PATH"] = os.path.join(SCRATCH, "progress.sqlite3")
+os.environ["CHAT_STORE_PATH"] = os.path.join(SCRATCH, "chats.sqlite3")
+os.environ.setdefault("LLM_RATE_PER_MINUTE", "0")
+os.environ.setdefault("STUB_LATENCY_MS", "20")
+os.environ.setdefault("STUB_FIRST_CHUNK_MS", "5")
+os.environ.setdefault("TELEMETRY_SINKS", "memory")
+
+import api_server
+import chat_sessions
+import stub_backend
+
+
+def start_server():
+    """Runs an ApiServer on a free local port in a background thread; returns the port"""
+    ready = threading.Event()
+    port = []
+
+    async def main():
+        api = api_server.ApiServer(engine_threads=8)
+        await api.call(api_server.startup.load_engine)
+        server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+        port.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(main()), daemon=True, name="api-smoke").start()
+    if not ready.wait(60):
+        raise RuntimeError("API server did not start")
+    return port[0]
+
+
+class ReplyGate:
+    """
+    Holds stub chat replies to messages starting with `prefix` until
+    release() is called, so a test can line a second request up against
+    one that is still being answered. `entered` is set once one is waiting.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.entered = threading.Event()
+        self._released = threading.Event()
+        self._send = stub_backend.StubChatSession.send_message
+
+    def __enter__(self):
+        gate, send = self, self._send
+
+        def send_message(chat, message, stream=False, **kwargs):
+            if str(message).startswith(gate.prefix):
+                gate.entered.set()
+                if not gate._released.wait(60):
+                    raise RuntimeError("Reply gate was never released")
+            return send(chat, message, stream=stream, **kwargs)
+
+        stub_backend.StubChatSession.send_message = send_message
+        return self
+
+    def release(self):
+        self._released.set()
+
+    def __exit__(self, *exc):
+        self.release()
+        stub_backend.StubChatSession.send_message = self._send
+
+
+def race(client, path):
+    """
+    Two messages for one chat, the second sent while the first is held in
+    the model call. Returns [(status, body)] for the first and the second.
+    """
+    with ReplyGate("Race") as gate, ThreadPoolExecutor(max_workers=1) as pool:
+        first = pool.submit(client.request, "POST", f"{path}/messages", {"message": "Race 0"})
+        if not gate.entered.wait(60):
+            raise RuntimeError("First racing message never reached the model")
+        second = client.request("POST", f"{path}/messages", {"message": "Race 1"})
+        gate.release()
+        return [first.result(), second]
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, parsed JSON or text) for one request on a fresh connection"""
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            payload = json.dumps(body).encode('utf-8') if body is not None else None
+            conn.request(method, path, body=payload,
+                         headers=dict({"Content-Type": "application/json"}, **(headers or {})))
+            response = conn.getresponse()
+            raw = response.read().decode('utf-8')
+            if response.getheader("Content-Type", "").startswith("application/json"):
+                return response.status, json.loads(raw)
+            return response.status, raw
+        finally:
+            conn.close()
+
+    def events(self, path, body):
+        """(status, [(event, data)]) for an SSE request"""
+        status, raw = self.request("POST", path, body, {"Accept": "text/event-stream"})
+        events = []
+        for block in raw.split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+            if "event" in fields:
+                events.append((fields["event"], json.loads(fields.get("data", "null"))))
+        return status, events
+
+
+def run_checks(client):
+    results = []
+
+    def check(name, ok, detail=""):
+        results.append(bool(ok))
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail and not ok else ''}")
+
+    status, health = client.request("GET", "/health")
+    check("GET /health", status == 200 and health.get("backend") == "stub", health)
+    status, metrics = client.request("GET", "/metrics")
+    check("GET /metrics", status == 200 and "api_in_flight" in metrics, status)
+    status, metrics = client.request("GET", "/metrics?format=json")
+    check("GET /metrics?format=json", status == 200 and "api" in metrics, status)
+
+    status, page = client.request("GET", "/scenarios?limit=5")
+    check("GET /scenarios", status == 200 and page.get("scenarios"), page)
+    scenario = page["scenarios"][0]
+    status, found = client.request("GET", f"/scenarios/{scenario['id']}")
+    check("GET /scenarios/<id>", status == 200 and found.get("id") == scenario["id"], found)
+    status, missing = client.request("GET", "/scenarios/does-not-exist")
+    check("GET /scenarios/<unknown> is 404", status == 404, status)
+    status, personas = client.request("GET", "/personas")
+    check("GET /personas", status == 200 and personas.get("personas"), personas)
+    persona = personas["personas"][0]
+    status, found = client.request("GET", f"/personas/{persona['id']}")
+    check("GET /personas/<id>", status == 200 and found.get("id") == persona["id"], found)
+    status, batch = client.request("GET", "/training-batch?tutor_id=smoke")
+    check("GET /training-batch", status == 200 and batch.get("goals"), batch)
+
+    status, graded = client.request("POST", "/grade", {"response": "Let's agree on a plan together.",
+                                                      "scenario_id": scenario["id"], "tutor_id": "smoke"})
+    check("POST /grade", status == 200 and "evaluation" in graded, graded)
+    status, bad = client.request("POST", "/grade", {"scenario_id": scenario["id"]})
+    check("POST /grade without a response is 400", status == 400, status)
+    status, plan = client.request("POST", "/training-plan", {"conversation_log": ["Tutor: Hi.", "Student: Hey."],
+                                                             "persona_id": persona["id"], "tutor_id": "smoke"})
+    check("POST /training-plan", status == 200 and plan.get("training_plan"), plan)
+
+    status, chat = client.request("POST", "/chat/sessions", {"persona_id": persona["id"], "tutor_id": "smoke"})
+    check("POST /chat/sessions", status == 200 and chat.get("opening"), chat)
+    path = f"/chat/sessions/{chat['session_id']}"
+    status, reply = client.request("POST", f"{path}/messages", {"message": "How are you feeling today?"})
+    check("POST messages (JSON)", status == 200 and reply.get("reply") and reply.get("turns") == 3, reply)
+    status, events = client.events(f"{path}/messages", {"message": "What part feels hardest?"})
+    kinds = [event for event, _ in events]
+    check("POST messages (SSE)", status == 200 and "chunk" in kinds and kinds[-1] == "done"
+          and events[-1][1].get("turns") == 5, kinds)
+
+    # Two messages at once: the first is answered, the second is turned away without touching the chat
+    statuses = [status for status, _ in race(client, path)]
+    check("concurrent messages: first 200, second 409", statuses == [200, 409], statuses)
+    status, record = client.request("GET", path)
+    check("GET chat has only the winning exchange", status == 200 and len(record.get("turns", [])) == 7,
+          len(record.get("turns", [])))
+    live = chat_sessions._live.get(chat["session_id"])
+    raced = [part for turn in (live[1].history if live else []) for part in turn.get("parts", [])
+             if str(part).startswith("Race ")]
+    check("live chat kept no losing message", len(raced) <= 1, raced)
+    status, reply = client.request("POST", f"{path}/messages", {"message": "Thanks for telling me."})
+    check("next message after the race", status == 200 and reply.get("turns") == 9, reply)
+
+    status, plan = client.request("POST", f"{path}/plan")
+    check("POST chat plan", status == 200 and plan.get("training_plan"), plan)
+    status, _ = client.request("GET", "/nowhere")
+    check("unknown route is 404", status == 404, status)
+    status, _ = client.request("DELETE", "/health")
+    check("wrong method is 405", status == 405, status)
+    return all(results), len(results)
+
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise every API route against the offline stub.")
+    parser.parse_args()
+    passed, total = run_checks(Client(start_server()))
+    print(f"{'All' if passed else 'Not all'} {total} checks passed")
+    sys.exit(0 if passed else 1)
@@ -1,22 +1,29 @@
 import streamlit as st
-import google.generativeai as genai
+import functools
 import os
 import time
+import uuid
+
 from dotenv import load_dotenv
 
-# Import your existing modules
-import data_manager
-import goal_setting
-import feedback_training
+# Only what every page needs is imported here. The engine modules (model
+# client, graders, stores) are imported inside the functions that use them
+# and loaded on first use of the Prototype tab, see startup.py.
+import startup
+import telemetry
 
 # 1. SETUP & CONFIGURATION
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    st.error("GEMINI_API_KEY not found. Please check your .env file.")
-    st.stop()
 
-genai.configure(api_key=api_key)
+# Hidden admin pages token (no admin pages unless it is set), and an optional Prometheus endpoint (METRICS_PORT)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+telemetry.start_metrics_server()
+
+# Stream the simulated student's replies token by token (set STREAM_REPLIES=0 to disable)
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") != "0"
+
+# Cases per page in the scenario picker and checklist; a sharded library only decodes the page shown
+PAGE_SIZE = int(os.getenv("APP_PAGE_SIZE", "50"))
 
 st.set_page_config(
     page_title="Tutor Tutor AI",
@@ -25,46 +32,180 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def page_of(items, key, label):
+    """The PAGE_SIZE slice of a (possibly sharded) sequence picked with a page number input"""
+    pages = max(1, -(-len(items) // PAGE_SIZE))
+    page = st.number_input(f"{label} (of {pages})", 1, pages, 1, key=key) if pages > 1 else 1
+    start = (page - 1) * PAGE_SIZE
+    return [items[i] for i in range(start, min(start + PAGE_SIZE, len(items)))]
+
+def open_engine():
+    """Loads the engine modules once per process; stops the page if the API key is missing"""
+    if not startup.engine_loaded():
+        with st.spinner("Starting up..."):
+            startup.load_engine()
+    import data_manager
+    import llm_client
+    import prewarm
+    if not os.getenv("GEMINI_API_KEY") and not llm_client.is_offline():
+        st.error("GEMINI_API_KEY not found. Please check your .env file.")
+        st.stop()
+    # Blurbs and opening lines for every persona are generated in the background
+    # and again whenever scenarios.json changes (see prewarm.py)
+    persona_pool = prewarm.get_pool()
+    if persona_pool:
+        persona_pool.refresh(data_manager.get_store())
+
 # --- CACHED FUNCTIONS (THE FIX) ---
 # @st.cache_data tells Streamlit: "If the input 'persona_desc' hasn't changed, 
 # return the saved text immediately. Do NOT call the API."
-@st.cache_data(show_spinner=False)
+# Underneath it, eval_cache keeps blurbs on disk so they survive restarts.
+@st.cache_data(show_spinner=False, max_entries=128)
 def generate_context_blurb(persona_desc):
+    import judgment_call
     try:
-        model = genai.GenerativeModel(os.getenv("GEMINI_MODEL_2"))
-        context_prompt = f"""
-        Based on this student persona: "{persona_desc}"
-        Please write a 2-sentence context introduction for the tutor. 
-        Include the student's approximate age/grade and the specific subject.
-        """
-        response = model.generate_content(context_prompt)
-        return response.text
+        return judgment_call.context_blurb(persona_desc)
     except Exception as e:
+        telemetry.record_error("app.context_blurb_fallback", e)
         return "Simulation Context: High School Math Session. (API Quota Limit Reached - Using Default)"
 
 # --- INITIALIZE SESSION STATE ---
-if "goal_progress" not in st.session_state:
-    st.session_state.goal_progress = {} 
-
-if "sim_progress" not in st.session_state:
-    st.session_state.sim_progress = set()
+# Progress lives in the shared progress store, keyed by tutor id.
+# The id is kept in the URL (?tutor=...) so a reload picks it back up.
+if "tutor_id" not in st.session_state:
+    st.session_state.tutor_id = st.query_params.get("tutor") or f"guest-{uuid.uuid4().hex[:8]}"
+
+# --- BACKGROUND JOBS ---
+# Grading and training plans run on the shared jobs worker pool; the page only
+# submits the job and polls it from a fragment. These run off the script
+# thread, so they must not call st.* functions.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# The jobs only compute; progress is saved by their on_done step, which the
+# job queue skips if the user cancelled the job in the meantime.
+
+def grade_goal_job(tutor_id, scenario, tutor_response):
+    """The goal-setting evaluation (a GoalEvaluation, or feedback text in text mode)"""
+    import goal_setting
+    import traffic
+    with traffic.capture(traffic.GOAL, tutor_id, scenario['id'], tutor_response) as event:
+        if goal_setting.EVAL_MODE == "structured":
+            # Typed result: sub-scores, weighted total and caps computed locally
+            evaluation = goal_setting.grade_tutor_response_structured(tutor_response, scenario)
+            event["out"] = evaluation.as_markdown()
+        else:
+            evaluation = event["out"] = goal_setting.grade_tutor_response(tutor_response, scenario)
+    return evaluation
+
+def save_goal_result(tutor_id, scenario_id, evaluation):
+    """on_done for grade_goal_job: records the attempt, returns the feedback to show"""
+    import progress_store
+    progress_store.get_progress_store().record_goal(tutor_id, scenario_id, evaluation)
+    return evaluation.as_markdown() if hasattr(evaluation, "as_markdown") else evaluation
+
+def training_plan_job(persona_id, conversation_log, session_id=None):
+    """(training plan, score) from the full transcript; it has no score"""
+    import feedback_training
+    import traffic
+    # Recorded under the chat's session id (turn_plan_job records its fallback call itself)
+    with traffic.capture(traffic.PLAN, session_id, persona_id) as event:
+        training_plan = event["out"] = feedback_training.generate_training_plan(conversation_log,
+                                                                                persona_id=persona_id)
+    return training_plan, None
+
+def turn_plan_job(persona_id, session_id, persona_desc, turns, conversation_log):
+    """(training plan, score) merged from the per-turn assessments; falls back to the full-transcript plan"""
+    import traffic
+    import turn_scoring
+    with traffic.capture(traffic.PLAN, session_id, persona_id) as event:
+        scorer = turn_scoring.get_scorer(session_id, persona_desc, persona_id)
+        scorer.catch_up(turns)
+        training_plan = event["out"] = scorer.training_plan()
+        if training_plan is None:
+            outcome = training_plan_job(persona_id, conversation_log)
+            event["out"] = outcome[0]
+            return outcome
+    return training_plan, scorer.state.mean_score()
+
+def save_plan_result(tutor_id, persona_id, outcome):
+    """on_done for the plan jobs: records the simulation, returns the plan to show"""
+    import progress_store
+    training_plan, score = outcome
+    progress_store.get_progress_store().record_sim(tutor_id, persona_id, training_plan, score=score)
+    return training_plan
+
+def submit_job(job_key, fn, *args, kind="job", on_done=None):
+    """Queues a job and remembers its id under st.session_state[job_key]"""
+    import jobs
+    try:
+        st.session_state[job_key] = jobs.get_queue().submit(fn, *args, kind=kind, on_done=on_done)
+    except jobs.JobQueueFull as e:
+        telemetry.record_error(f"app.{kind}_queue_full", e)
+        st.error("The server is busy right now. Please try again in a moment.")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job(job_key, pending_text, heading, error_text, success_text=None):
+    import jobs
+    job_id = st.session_state.get(job_key)
+    job = jobs.get_queue().get(job_id) if job_id else None
+    if job is None:
+        return
+
+    if job.status in jobs.PENDING:
+        col1, col2 = st.columns([4, 1])
+        col1.info(f"⏳ {pending_text} ({job.status})")
+        if col2.button("Cancel", key=f"cancel_{job_key}"):
+            jobs.get_queue().cancel(job_id)
+            st.rerun()
+        return
+
+    # First time we see the finished job: rerun the whole page so progress badges update
+    seen = st.session_state.setdefault("seen_jobs", set())
+    if job_id not in seen:
+        seen.add(job_id)
+        if job.status == jobs.FAILED:
+            telemetry.record_error(f"app.{job.kind}_error", job.error)
+        st.rerun()
+
+    if job.status == jobs.DONE:
+        if success_text:
+            st.success(success_text)
+        st.markdown(f"{heading}\n{job.result}")
+    elif job.status == jobs.FAILED:
+        st.error(error_text.format(error=job.error))
+    elif job.status == jobs.CANCELLED:
+        st.warning("Cancelled.")
 
 # --- HELPER FUNCTIONS ---
 def run_goal_setting_mode():
     st.subheader("🎯 Goal Setting Evaluation")
     st.markdown("Practice balancing conflicting requests from parents and students.")
+    import data_manager
+    import progress_store
+    progress = progress_store.get_progress_store()
 
-    data = data_manager.load_data()
+    store = data_manager.get_store()
     
-    if data:
-        scenarios = data['goal_setting_scenarios']
-        scenario_options = {f"Case {s['id']}": s for s in scenarios}
+    if store:
+        # Suggested cases from this tutor's weak criteria, redrawn after each new result
+        import scheduler
+        if scheduler.ENABLED:
+            suggestion_key = (st.session_state.tutor_id, progress.tutor_revision(st.session_state.tutor_id))
+            if st.session_state.get("suggested_for") != suggestion_key:
+                st.session_state.suggested = data_manager.get_training_batch(tutor_id=st.session_state.tutor_id)
+                st.session_state.suggested_for = suggestion_key
+            suggested = st.session_state.suggested
+            focus = f" (focus: {', '.join(suggested['focus'])})" if suggested['focus'] else ""
+            cases = ", ".join(f"Case {s['id']}" for s in suggested['goals'])
+            st.caption(f"🎯 Suggested next: {cases}{focus}")
+
+        scenario_options = {f"Case {s['id']}": s for s in page_of(store.goal_scenarios, "scenario_page", "Scenario page")}
         selected_option = st.selectbox("Select a Scenario:", list(scenario_options.keys()))
         
         current_scenario = scenario_options[selected_option]
         scenario_id = current_scenario['id']
 
-        if scenario_id in st.session_state.goal_progress:
+        if scenario_id in progress.completed(st.session_state.tutor_id, progress_store.GOAL):
             st.success("✅ You have completed this case.")
 
         col1, col2 = st.columns(2)
@@ -79,61 +220,76 @@ def run_goal_setting_mode():
             if not tutor_response:
                 st.error("Please enter a response first.")
             else:
-                with st.spinner("AI is grading your response..."):
-                    # We can use basic error handling here too
-                    try:
-                        feedback = goal_setting.evaluate_tutor_response(tutor_response, current_scenario)
-                        st.session_state.goal_progress[scenario_id] = feedback
-                        st.success("Evaluation Complete! Progress Saved.")
-                        st.markdown(f"### Feedback:\n{feedback}")
-                    except Exception as e:
-                        st.error(f"Error: {e}. Please wait a moment and try again.")
+                submit_job(f"goal_job_{scenario_id}", grade_goal_job,
+                           st.session_state.tutor_id, current_scenario, tutor_response, kind="goal_setting",
+                           on_done=functools.partial(save_goal_result, st.session_state.tutor_id, scenario_id))
+
+        show_job(f"goal_job_{scenario_id}", "AI is grading your response...", "### Feedback:",
+                 "Error: {error}. Please wait a moment and try again.",
+                 success_text="Evaluation Complete! Progress Saved.")
 
 def run_simulation_mode():
     st.subheader("🗣️ Judgment Call Simulation")
     st.markdown("Chat with a simulated student to practice empathy and intervention.")
-
-    data = data_manager.load_data()
-    if data:
-        personas = data['judgment_personas']
-        persona_options = {p['name']: p for p in personas}
-        selected_persona_name = st.selectbox("Select Student Persona:", list(persona_options.keys()))
+    import chat_sessions
+    import data_manager
+    import judgment_call
+    import llm_client
+    import prewarm
+    import traffic
+    import turn_scoring
+    persona_pool = prewarm.get_pool()
+
+    store = data_manager.get_store()
+    if store:
+        persona_options = store.persona_options
+        chats = chat_sessions.get_chat_store()
+
+        # The conversation lives in the shared chat store under ?chat=<id>,
+        # so any replica (or this one after a restart) can pick it up
+        chat_id = st.query_params.get("chat")
+        record = chats.get(chat_id) if chat_id and chat_id.isalnum() else None
+        if record and "persona_select" not in st.session_state:
+            resumed = store.get_persona(record.persona_id)
+            if resumed and resumed['name'] in persona_options:
+                st.session_state.persona_select = resumed['name']
+
+        selected_persona_name = st.selectbox("Select Student Persona:", list(persona_options.keys()), key="persona_select")
         selected_persona = persona_options[selected_persona_name]
+        persona_desc = selected_persona['description']
+        persona_tags = {"persona_id": selected_persona['id']}
+
+        # New chat if persona changes
+        if record is None or record.persona_id != selected_persona['id']:
+            record = chat_sessions.ChatRecord.new(st.session_state.tutor_id, selected_persona['id'])
 
-        # Reset chat if persona changes
-        if "messages" not in st.session_state or st.session_state.get("current_persona") != selected_persona_name:
-            st.session_state.messages = []
-            st.session_state.current_persona = selected_persona_name
-            st.session_state.chat_session = None
-            if "context_blurb" in st.session_state:
-                del st.session_state.context_blurb
-        
         # --- NEW: USE CACHED GENERATION ---
         # This will only call the API once per persona, ever.
-        if "context_blurb" not in st.session_state:
+        blurb = persona_pool.blurb(selected_persona['id']) if persona_pool else None
+        if blurb is None:
             with st.spinner("Setting the scene..."):
-                blurb = generate_context_blurb(selected_persona['description'])
-                st.session_state.context_blurb = blurb
-
-        st.info(f"**Simulation Context:** {st.session_state.context_blurb}")
-
-        # Initialize Chat Session
-        model_2 = genai.GenerativeModel(os.getenv("GEMINI_MODEL_2"))
-        if st.session_state.chat_session is None:
-            history = [
-                {"role": "user", "parts": [f"System Instruction: Roleplay this student strictly.\n\n{selected_persona['description']}"]},
-                {"role": "model", "parts": ["Understood. I am in character."]}
-            ]
-            st.session_state.chat_session = model_2.start_chat(history=history)
+                blurb = generate_context_blurb(persona_desc)
+        st.info(f"**Simulation Context:** {blurb}")
+
+        # Start the chat with the student's opening line (prewarmed if possible)
+        model_2 = llm_client.resolve_model_name("GEMINI_MODEL_2")
+        if not record.turns:
             try:
-                initial_response = st.session_state.chat_session.send_message("Start conversation now.")
-                st.session_state.messages.append({"role": "assistant", "content": initial_response.text})
+                with traffic.capture(traffic.CHAT_OPEN, record.session_id, selected_persona['id']) as event:
+                    opening = persona_pool.take_opening(selected_persona['id']) if persona_pool else None
+                    if opening is None:
+                        opening = judgment_call.opening_line(persona_desc, selected_persona['id'])
+                    event["out"] = opening
+                record.add("student", opening)
+                chats.put(record)
+                st.query_params["chat"] = record.session_id
             except Exception as e:
                  # Soft fail if rate limited on start
+                telemetry.record_error("app.chat_start_error", e, **persona_tags)
                 st.warning("Rate limit hit. Please wait 30 seconds and refresh.")
 
         # Display Chat History
-        for message in st.session_state.messages:
+        for message in record.messages():
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
@@ -141,70 +297,221 @@ def run_simulation_mode():
         if prompt := st.chat_input("Type your response here..."):
             with st.chat_message("user"):
                 st.markdown(prompt)
-            st.session_state.messages.append({"role": "user", "content": prompt})
 
+            # Reuses this process's chat for the conversation, or rebuilds it from the record
+            chat = chat_sessions.get_chat(record, persona_desc, model_2)
             try:
-                response = st.session_state.chat_session.send_message(prompt)
-                ai_reply = response.text
-                with st.chat_message("assistant"):
-                    st.markdown(ai_reply)
-                st.session_state.messages.append({"role": "assistant", "content": ai_reply})
+                with traffic.capture(traffic.CHAT, record.session_id, selected_persona['id'], prompt) as event:
+                    if STREAM_REPLIES:
+                        # Render the reply chunk by chunk as it arrives
+                        with st.chat_message("assistant"):
+                            placeholder = st.empty()
+                            ai_reply = ""
+                            for piece in judgment_call.stream_reply(chat, prompt, selected_persona['id']):
+                                ai_reply += piece
+                                placeholder.markdown(ai_reply + "▌")
+                            placeholder.markdown(ai_reply)
+                    else:
+                        response = llm_client.send_message(chat, prompt, op="judgment_call.send_message", tags=persona_tags)
+                        ai_reply = response.text
+                        with st.chat_message("assistant"):
+                            st.markdown(ai_reply)
+                    event["out"] = ai_reply
+                    # Long sessions: older turns are folded into a summary and the chat is rebuilt next turn
+                    chat_sessions.record_turn(record, persona_desc, model_2, chat, prompt, ai_reply)
+                    # Score this turn (and any earlier one this process hasn't seen) in the background
+                    if turn_scoring.ENABLED:
+                        turn_scoring.get_scorer(record.session_id, persona_desc,
+                                                selected_persona['id']).catch_up(record.turns)
+            except chat_sessions.StaleChatRecord:
+                chat_sessions.forget_chat(record.session_id)
+                st.warning("This conversation was continued in another window. Reloading it...")
+                st.rerun()
             except Exception as e:
+                chat_sessions.forget_chat(record.session_id)
+                telemetry.record_error("app.chat_error", e, **persona_tags)
                 st.error("⚠️ AI is overloaded. Please wait a moment and try again.")
 
         st.divider()
         if st.button("End Simulation & Get Feedback"):
-            if len(st.session_state.messages) < 2:
+            if len(record.turns) < 2:
                 st.warning("Please have a conversation before generating feedback.")
             else:
-                conversation_log = [f"{msg['role'].title()}: {msg['content']}" for msg in st.session_state.messages]
-                with st.spinner("Analyzing conversation dynamics..."):
-                    try:
-                        training_plan = feedback_training.generate_training_plan(conversation_log)
-                        st.session_state.sim_progress.add(selected_persona_name)
-                        st.markdown("### 📝 Personalized Training Plan")
-                        st.write(training_plan)
-                    except Exception:
-                        st.error("Rate limit hit during feedback generation. Try again in 1 minute.")
+                # Same compact form the chat uses: running summary + recent turns
+                conversation_log = record.transcript(persona_desc).as_log()
+                save = functools.partial(save_plan_result, st.session_state.tutor_id, selected_persona['id'])
+                if turn_scoring.ENABLED:
+                    # Turns were scored as the chat went; this only merges them
+                    submit_job(f"plan_job_{selected_persona['id']}", turn_plan_job,
+                               selected_persona['id'], record.session_id, persona_desc,
+                               [tuple(turn) for turn in record.turns], conversation_log,
+                               kind="feedback", on_done=save)
+                else:
+                    submit_job(f"plan_job_{selected_persona['id']}", training_plan_job,
+                               selected_persona['id'], conversation_log, record.session_id,
+                               kind="feedback", on_done=save)
+
+        show_job(f"plan_job_{selected_persona['id']}", "Analyzing conversation dynamics...",
+                 "### 📝 Personalized Training Plan",
+                 "Rate limit hit during feedback generation. Try again in 1 minute.")
 
 def run_progress_checklist():
     st.subheader("✅ Training Progress")
-    data = data_manager.load_data()
+    import data_manager
+    import progress_store
+    progress = progress_store.get_progress_store()
+    store = data_manager.get_store()
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### Goal Setting Scenarios")
-        if data:
-            all_scenarios = data['goal_setting_scenarios']
-            completed_ids = st.session_state.goal_progress.keys()
-            progress_val = len(completed_ids) / len(all_scenarios)
+        if store:
+            all_scenarios = store.goal_scenarios
+            completed_ids = progress.completed(st.session_state.tutor_id, progress_store.GOAL)
+            # Look the tutor's completions up in the library rather than walking the library
+            done = sum(1 for scenario_id in completed_ids if scenario_id in store.scenarios_by_id)
+            progress_val = done / len(all_scenarios)
             st.progress(progress_val)
-            st.write(f"**{len(completed_ids)} / {len(all_scenarios)} Completed**")
-            
-            for s in all_scenarios:
+            st.write(f"**{done} / {len(all_scenarios)} Completed**")
+            st.caption(" · ".join(f"{conflict}: {len(cases)} cases"
+                                  for conflict, cases in sorted(store.scenarios_by_conflict.items())))
+
+            for s in page_of(all_scenarios, "checklist_page", "Checklist page"):
                 icon = "✅" if s['id'] in completed_ids else "⬜"
                 st.write(f"{icon} Case {s['id']}")
 
     with col2:
         st.markdown("#### Judgment Simulations")
-        if data:
-            all_personas = [p['name'] for p in data['judgment_personas']]
-            completed_sims = st.session_state.sim_progress
-            progress_val_sim = len(completed_sims) / len(all_personas)
+        if store:
+            all_personas = store.personas
+            completed_sims = progress.completed(st.session_state.tutor_id, progress_store.SIM)
+            done_sims = len(completed_sims.keys() & store.personas_by_id.keys())
+            progress_val_sim = done_sims / len(all_personas)
             st.progress(progress_val_sim)
-            st.write(f"**{len(completed_sims)} / {len(all_personas)} Completed**")
+            st.write(f"**{done_sims} / {len(all_personas)} Completed**")
             
-            for name in all_personas:
-                icon = "✅" if name in completed_sims else "⬜"
-                st.write(f"{icon} {name}")
+            for p in all_personas:
+                icon = "✅" if p['id'] in completed_sims else "⬜"
+                st.write(f"{icon} {p['name']}")
+
+
+def run_admin_page():
+    st.title("📈 Telemetry")
+    st.markdown("Model call latency, tokens and errors for this process.")
+    import cascade
+    import eval_cache
+    import jobs
+    import prewarm
+    persona_pool = prewarm.get_pool()
+
+    rows = telemetry.summary()
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("No model calls recorded yet.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Evaluation Cache")
+        st.json(eval_cache.get_cache().stats())
+    with col2:
+        st.markdown("#### Background Jobs")
+        st.json(jobs.get_queue().stats())
+        if persona_pool:
+            st.markdown("#### Persona Prewarm Pool")
+            st.json(persona_pool.stats())
+
+    cascades = cascade.report() if cascade.ENABLED else None
+    if cascades:
+        st.markdown("#### Grader Cascade")
+        st.caption("Escalation rate, per-tier usage and fast/strong agreement (audit = clear-cut cases re-graded for comparison).")
+        st.json(cascades)
+
+    ring = telemetry.find_sink(telemetry.RingBufferSink)
+    if ring:
+        errors = [s for s in ring.spans() if s["outcome"] != "ok"][-20:]
+        st.markdown("#### Recent Errors")
+        if errors:
+            st.dataframe(errors, use_container_width=True)
+        else:
+            st.write("None 🎉")
+
+    st.markdown("#### Cold Start")
+    st.caption("Startup phases of this process, in ms since the first app run (budget: COLD_START_BUDGET_MS).")
+    st.json(startup.report())
+
+    with st.expander("Prometheus metrics"):
+        st.code(telemetry.render_prometheus(), language="text")
+
+
+def run_analytics_page():
+    st.title("📊 Cohort Analytics")
+    st.markdown("Scores and completions across every tutor, from the shared progress store.")
+    import cohort_analytics
+    import data_manager
+    store = data_manager.get_store()
+    analytics = cohort_analytics.get_analytics()
+
+    windows = {"All time": None, "Last 30 days": 30, "Last 7 days": 7, "Last 24 hours": 1}
+    col1, col2 = st.columns([3, 1])
+    window = col1.selectbox("Attempts from", list(windows))
+    if col2.button("Refresh now"):
+        analytics.refresh(force=True)
+    days = windows[window]
+    since = time.time() - days * 86400 if days else None
+    report = analytics.report(since, persona_ids=[p['id'] for p in store.personas] if store else ())
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Tutors", report["tutors"])
+    m2.metric("Attempts", report["attempts"])
+    m3.metric("Computed in", f"{report['compute_ms']} ms")
+    if not report["attempts"]:
+        st.info("No graded attempts in this window yet.")
+        return
+
+    st.markdown("#### Score Distribution per Criterion")
+    if report["criteria"]:
+        histogram = [{"score": score, **{row["criterion"]: row["histogram"][score - 1] for row in report["criteria"]}}
+                     for score in range(1, cohort_analytics.SCORE_RANGE + 1)]
+        st.bar_chart(histogram, x="score")
+        st.caption("Attempts per score (1-10) for each criterion.")
+        st.dataframe([{k: v for k, v in row.items() if k != "histogram"} for row in report["criteria"]],
+                     use_container_width=True)
+    else:
+        st.write("No structured grades yet (GOAL_EVAL_MODE=structured).")
+
+    st.markdown("#### Weakest Criteria")
+    st.caption("How many tutors have each criterion as their lowest average.")
+    st.dataframe(report["weakest_criteria"], use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Scenario Difficulty")
+        st.caption("Hardest first, by pass rate.")
+        for row in report["scenarios"]:
+            scenario = store.get_scenario(row["scenario_id"]) if store else None
+            row["conflict type"] = scenario['conflict type'] if scenario else "?"
+        st.dataframe(report["scenarios"], use_container_width=True)
+    with col2:
+        st.markdown("#### Persona Completion")
+        for row in report["personas"]:
+            persona = store.get_persona(row["persona_id"]) if store else None
+            row["name"] = persona['name'] if persona else row["persona_id"]
+        st.dataframe(report["personas"], use_container_width=True)
 
 
 # --- MAIN NAVIGATION ---
 st.sidebar.image("https://cdn-icons-png.flaticon.com/512/4762/4762311.png", width=100)
 st.sidebar.title("Tutor Tutor AI")
+st.sidebar.text_input("Tutor ID", key="tutor_id", help="Your progress is saved under this id.")
+st.query_params["tutor"] = st.session_state.tutor_id
 st.sidebar.markdown("---")
-page = st.sidebar.radio("Navigate:", ["Home", "Methodology & Criteria", "Technical Architecture", "Future Roadmap", "Try the Prototype"])
+pages = ["Home", "Methodology & Criteria", "Technical Architecture", "Future Roadmap", "Try the Prototype"]
+# Hidden admin pages: open the app with ?admin=<ADMIN_TOKEN>
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    pages += ["Admin: Telemetry", "Admin: Analytics"]
+page = st.sidebar.radio("Navigate:", pages)
 
 # ==========================================
 # PAGE 1: HOME (Problem & Solution)
@@ -362,6 +669,7 @@ elif page == "Future Roadmap":
 elif page == "Try the Prototype":
     st.title("🖥️ Live Prototype")
     st.markdown("Select a module below to test the AI assessment capabilities.")
+    open_engine()
     
     tab1, tab2, tab3 = st.tabs(["Goal Setting Evaluation", "Judgment Simulation", "Progress Checklist"])
     
@@ -373,3 +681,19 @@ elif page == "Try the Prototype":
         
     with tab3:
         run_progress_checklist()
+
+# ==========================================
+# HIDDEN: ADMIN TELEMETRY
+# ==========================================
+elif page == "Admin: Telemetry":
+    open_engine()
+    run_admin_page()
+
+elif page == "Admin: Analytics":
+    open_engine()
+    run_analytics_page()
+
+# The first page is up: note the cold-start time and load the engine in the
+# background so the Prototype tab is ready when someone opens it
+startup.mark("first_render")
+startup.warm_in_background()
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import data_manager
+import goal_setting
+from llm_client import RateLimiter
+
+# --- BATCH GRADING ---
+
+def _row_key(row, line_no):
+    return str(row.get("id", line_no))
+
+def read_done_keys(output_path):
+    """Keys that already have a successful result in the output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # half-written line from an interrupted run
+            if not result.get("error"):
+                done.add(result["key"])
+    return done
+
+def grade_batch(input_path, output_path, concurrency=4, rate_per_minute=60, api_key=None, structured=True):
+    """
+    Grades every (scenario_id, tutor_response) row of a JSONL file.
+    Structured rows carry the score, sub-scores and caps; otherwise only
+    the free-form feedback is written.
+    Results are appended to output_path as they finish; rows that already
+    have a successful result there are skipped, so a rerun resumes.
+    Returns a small stats dictionary.
+    """
+    store = data_manager.get_store()
+    if not store:
+        return None
+    done = read_done_keys(output_path)
+    limiter = RateLimiter(rate_per_minute)
+    limiter_key = api_key or os.getenv("GEMINI_API_KEY") or "default"
+
+    write_lock = threading.Lock()
+    # Bounds how many rows are read ahead of the workers
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    stats = {"graded": 0, "failed": 0, "skipped": 0}
+    start = time.monotonic()
+
+    def grade_one(key, row):
+        try:
+            result = {"key": key, "scenario_id": row.get("scenario_id")}
+            scenario = store.get_scenario(row.get("scenario_id"))
+            t0 = time.monotonic()
+            try:
+                if scenario is None:
+                    raise KeyError(f"Unknown scenario id: {row.get('scenario_id')}")
+                limiter.acquire(limiter_key)
+                if structured:
+                    evaluation = goal_setting.grade_tutor_response_structured(row["tutor_response"], scenario)
+                    result["score"] = evaluation.score
+                    result["feedback"] = evaluation.feedback
+                    result["evaluation"] = evaluation.to_dict()
+                else:
+                    result["feedback"] = goal_setting.grade_tutor_response(row["tutor_response"], scenario)
+            except Exception as e:
+                result["error"] = str(e)
+            result["elapsed"] = round(time.monotonic() - t0, 3)
+
+            with write_lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                stats["failed" if "error" in result else "graded"] += 1
+        finally:
+            slots.release()
+
+    with open(input_path, 'r', encoding='utf-8') as src, \
+         open(output_path, 'a', encoding='utf-8') as out, \
+         ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for line_no, line in enumerate(src):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                # Keep going; the bad line gets an error result keyed apart from row ids
+                with write_lock:
+                    out.write(json.dumps({"key": f"line:{line_no}", "error": f"Malformed input line {line_no}: {e}"}) + "\n")
+                    out.flush()
+                    stats["failed"] += 1
+                continue
+            key = _row_key(row, line_no)
+            if key in done:
+                stats["skipped"] += 1
+                continue
+            slots.acquire()
+            pool.submit(grade_one, key, row)
+
+    stats["seconds"] = round(time.monotonic() - start, 2)
+    return stats
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grade a JSONL file of goal-setting responses.")
+    parser.add_argument("input", help='JSONL rows like {"scenario_id": 3, "tutor_response": "..."} (optional "id")')
+    parser.add_argument("output", help="JSONL file results are appended to (rerun to resume)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=60, help="Requests per minute per API key (LLM_RATE_PER_MINUTE still caps the whole process)")
+    parser.add_argument("--text", action="store_true", help="Free-form feedback instead of structured scores")
+    args = parser.parse_args()
+
+    print(grade_batch(args.input, args.output, args.concurrency, args.rpm, structured=not args.text))
@@ -0,0 +1,399 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmarks always run against the offline stub with fixed latencies and
+# without the evaluation cache, so numbers are comparable between runs.
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["EVAL_CACHE_DISABLED"] = "1"
+os.environ.setdefault("LLM_RATE_PER_MINUTE", "0")
+os.environ.setdefault("STUB_LATENCY_MS", "120")
+os.environ.setdefault("STUB_FIRST_CHUNK_MS", "30")
+os.environ.setdefault("STUB_SEED", "0")
+os.environ.setdefault("LLM_CONTEXT_CACHE", "1")
+# The app's process-wide prewarm pool would refill in the background and skew
+# later prompt sizes; bench_persona_open runs its own pool and stops it
+os.environ.setdefault("PREWARM_ENABLED", "0")
+
+import cohort_analytics
+import data_manager
+import feedback_training
+import goal_setting
+import judgment_call
+import llm_client
+import prewarm
+import progress_store
+import scenario_shards
+import scheduler
+import stub_backend
+import transcript
+import turn_scoring
+
+BASELINE_PATH = "bench_baseline.json"
+DEFAULT_TOLERANCE = 0.20
+# Timing changes smaller than this are machine noise, whatever the relative change
+MIN_DELTA_MS = 1.0
+
+# --- PROMPT SIZE RECORDING ---
+# Wraps the stub so every benchmark can report how many input tokens it sent.
+
+prompt_tokens = []      # billed input tokens per call (cached prefix excluded)
+
+def _uncached(response):
+    usage = response.usage_metadata
+    return usage.prompt_token_count - usage.cached_content_token_count
+
+
+class RecordingStubModel(stub_backend.StubModel):
+    def generate_content(self, prompt, stream=False, **kwargs):
+        response = super().generate_content(prompt, stream=stream, **kwargs)
+        prompt_tokens.append(_uncached(response))
+        return response
+
+    def start_chat(self, history=None, **kwargs):
+        chat = super().start_chat(history, **kwargs)
+        send = chat.send_message
+
+        def recording_send(message, stream=False, **kw):
+            response = send(message, stream=stream, **kw)
+            prompt_tokens.append(_uncached(response))
+            return response
+        chat.send_message = recording_send
+        return chat
+
+
+class RecordingStubBackend(llm_client.StubBackend):
+    def create_model(self, model_name, system_instruction=None):
+        return RecordingStubModel(model_name, system_instruction=system_instruction)
+
+    def create_cached_model(self, model_name, system_instruction, ttl):
+        return RecordingStubModel(model_name, system_instruction=system_instruction, cached=True)
+
+
+llm_client.register_backend("stub", RecordingStubBackend)
+
+# --- HELPERS ---
+
+def percentiles(samples):
+    """p50/p95/p99/mean in milliseconds"""
+    ordered = sorted(samples)
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+    }
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+def throughput(fn, seconds=0.5):
+    """Calls per second of fn over roughly `seconds`"""
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        calls += 1
+    return round(calls / (time.perf_counter() - start), 1)
+
+def tokens_since(mark):
+    sent = prompt_tokens[mark:]
+    return round(statistics.mean(sent), 1) if sent else 0
+
+# --- BENCHMARKS ---
+
+def bench_data_manager():
+    return {
+        "load_data_per_sec": throughput(data_manager.load_data),
+        "get_store_per_sec": throughput(data_manager.get_store),
+        "get_training_batch_per_sec": throughput(data_manager.get_training_batch),
+    }
+
+def bench_sharded_library(sizes=(1000, 100000)):
+    """Open time and sampling/lookup speed of a sharded library as it grows (should stay flat)"""
+    template = data_manager.get_store().goal_scenarios[0]
+    conflict_types = ("Ethical", "Process")
+    results = {}
+    for size in sizes:
+        records = (dict(template, id=i, **{"conflict type": conflict_types[i % 2]}) for i in range(size))
+        with tempfile.TemporaryDirectory() as folder:
+            manifest = scenario_shards.write_library(folder, {scenario_shards.GOALS: records,
+                                                              scenario_shards.PERSONAS: data_manager.get_store().personas})
+            t0 = time.perf_counter()
+            store = data_manager.ShardedScenarioStore(folder, manifest)
+            open_ms = (time.perf_counter() - t0) * 1000
+            results[f"records_{size}"] = {
+                "open_ms": round(open_ms, 3),
+                "sample_per_sec": throughput(lambda: store.sample_scenarios(2, "Process")),
+                "get_scenario_per_sec": throughput(lambda: store.get_scenario(size // 2)),
+            }
+            del store
+    return results
+
+def bench_page_rerun(reruns=10):
+    """Cost of one Streamlit rerun of the prototype page (needs streamlit installed)"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit not installed"}
+    app = AppTest.from_file(os.path.abspath("app.py"), default_timeout=30)
+    app.run()
+    app.sidebar.radio[0].set_value("Try the Prototype").run()
+    samples = [timed(app.run) for _ in range(reruns)]
+    return percentiles(samples)
+
+def bench_evaluate(concurrency_levels=(1, 4, 16), calls=32):
+    store = data_manager.get_store()
+    scenarios = store.goal_scenarios
+    results = {}
+    for level in concurrency_levels:
+        mark = len(prompt_tokens)
+        def one(i):
+            return timed(goal_setting.grade_tutor_response,
+                         f"Benchmark response {i}: let's agree on a plan together.", scenarios[i % len(scenarios)])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            samples = list(pool.map(one, range(calls)))
+        elapsed = time.perf_counter() - start
+        results[f"c{level}"] = dict(percentiles(samples),
+                                    calls_per_sec=round(calls / elapsed, 2),
+                                    prompt_tokens=tokens_since(mark))
+    return results
+
+def bench_conversation(turns=20):
+    persona = data_manager.get_store().personas[0]
+    model_name = judgment_call.MODEL_NAME
+    log = transcript.RollingTranscript(persona['description'])
+    chat = llm_client.start_chat(model_name, history=transcript.persona_history(persona['description']))
+    samples, sizes = [], []
+    for turn in range(turns):
+        message = f"Turn {turn}: how are you feeling about this?"
+        mark = len(prompt_tokens)
+        t0 = time.perf_counter()
+        reply = "".join(judgment_call.stream_reply(chat, message))
+        log.add("tutor", message)
+        log.add("student", reply)
+        if transcript.maybe_compact(log, model_name):
+            chat = llm_client.start_chat(model_name, history=log.chat_history())
+        samples.append(time.perf_counter() - t0)
+        sizes.append(tokens_since(mark))
+    return dict(percentiles(samples), turns=turns,
+                first_turn_prompt_tokens=sizes[0], last_turn_prompt_tokens=sizes[-1])
+
+def bench_training_plan(lengths=(10, 50, 200)):
+    results = {}
+    for length in lengths:
+        log = []
+        for i in range(length // 2):
+            log.append(f"Tutor: Message {i}, what part of this feels hardest right now?")
+            log.append(f"Student: Reply {i}, I don't know, all of it I guess.")
+        mark = len(prompt_tokens)
+        elapsed = timed(feedback_training.generate_training_plan, log)
+        results[f"turns_{length}"] = {"latency_ms": round(elapsed * 1000, 3),
+                                      "prompt_tokens": tokens_since(mark)}
+    return results
+
+def bench_turn_scoring(lengths=(10, 50, 200)):
+    """Time from "End Simulation" to the plan when every turn but the last was scored during the chat"""
+    persona = data_manager.get_store().personas[0]
+    results = {}
+    for length in lengths:
+        scorer = turn_scoring.SessionScorer(persona['description'], persona['id'])
+        turns = [("student", "Hi.")]
+        for i in range(length // 2):
+            turns += [("tutor", f"Message {i}, what part of this feels hardest right now?"),
+                      ("student", f"Reply {i}, I don't know, all of it I guess.")]
+            if i < length // 2 - 1:
+                scorer.catch_up(turns)
+                scorer.wait()
+        mark = len(prompt_tokens)
+        scorer.catch_up(turns)
+        results[f"turns_{length}"] = {"end_latency_ms": round(timed(scorer.training_plan) * 1000, 3),
+                                      "prompt_tokens": tokens_since(mark)}
+    return results
+
+def bench_persona_open(opens=5):
+    """Time until a persona's chat shows its opening line: live round trips vs the prewarm pool"""
+    persona = data_manager.get_store().personas[0]
+    cold = [timed(lambda: (judgment_call.context_blurb(persona['description']),
+                           judgment_call.opening_line(persona['description'])))
+            for _ in range(opens)]
+    pool = prewarm.PersonaPool(size=opens)
+    pool.refresh(data_manager.get_store())
+    # Let the initial prewarm finish before measuring
+    while pool.blurb(persona['id']) is None or pool.stats()["in_flight"]:
+        time.sleep(0.01)
+    hits = sum(1 for _ in range(opens) if pool.blurb(persona['id']) and pool.take_opening(persona['id']))
+    pool.shutdown()
+    # A pool hit is a dict lookup, so only the hit count is worth tracking
+    return {"live": percentiles(cold), "prewarmed_hits": f"{hits}/{opens}"}
+
+def bench_cohort_analytics(attempts=100000, tutors=5000):
+    """Full cohort report over a synthetic progress store (initial load timed separately)"""
+    store = data_manager.get_store()
+    scenario_ids = [s['id'] for s in store.goal_scenarios]
+    persona_ids = [p['id'] for p in store.personas]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as folder:
+        progress = progress_store.ProgressStore(os.path.join(folder, "progress.sqlite3"), batch_size=attempts + 1)
+        for i in range(attempts):
+            tutor = f"tutor-{rng.randrange(tutors)}"
+            if i % 4 == 0:
+                progress.record_sim(tutor, rng.choice(persona_ids), "plan")
+                continue
+            criteria = {key: rng.randint(1, 10) for key in goal_setting.CRITERIA_KEYS}
+            payload = dict(criteria, violates_integrity=False, ignores_party=False, feedback="")
+            scenario = store.get_scenario(rng.choice(scenario_ids))
+            progress.record_goal(tutor, scenario['id'], goal_setting.build_evaluation(payload, scenario))
+        progress.flush()
+        analytics = cohort_analytics.CohortAnalytics(progress)
+        load = timed(analytics.refresh, True)
+        samples = [timed(analytics.report, None, persona_ids) for _ in range(10)]
+        progress._db().close()
+    return dict(percentiles(samples), attempts=attempts, load_ms=round(load * 1000, 3))
+
+def bench_adaptive_batch(sizes=(1000, 100000), tutors=2000, attempts_per_tutor=20, batches=2000):
+    """
+    Weakness-driven batch selection as the library grows (should stay flat):
+    index build, profile build (first batch for a tutor) and warm selections
+    over a synthetic tutor population
+    """
+    base = data_manager.get_store()
+    template = base.goal_scenarios[0]
+    conflict_types = ("Ethical", "Process")
+    rng = random.Random(0)
+    results = {}
+    for size in sizes:
+        scenarios = []
+        for i in range(size):
+            record = dict(template, id=i, **{"conflict type": conflict_types[i % 2]})
+            if i % 3 == 0:
+                record["criteria"] = rng.sample(goal_setting.CRITERIA_KEYS, 2)
+            scenarios.append(record)
+        store = data_manager.ScenarioStore({"goal_setting_scenarios": scenarios,
+                                            "judgment_personas": list(base.personas)}, f"bench-{size}")
+        with tempfile.TemporaryDirectory() as folder:
+            progress = progress_store.ProgressStore(os.path.join(folder, "progress.sqlite3"),
+                                                    batch_size=tutors * attempts_per_tutor + 1)
+            for t in range(tutors):
+                for _ in range(attempts_per_tutor):
+                    criteria = {key: rng.randint(1, 10) for key in goal_setting.CRITERIA_KEYS}
+                    payload = dict(criteria, violates_integrity=False, ignores_party=False, feedback="")
+                    scenario = scenarios[rng.randrange(size)]
+                    progress.record_goal(f"tutor-{t}", scenario['id'], goal_setting.build_evaluation(payload, scenario))
+            progress.flush()
+            picker = scheduler.Scheduler(progress, random.Random(0))
+            index_ms = timed(picker.index, store) * 1000
+            cold = [timed(picker.next_batch, f"tutor-{t}", store) for t in range(min(tutors, 200))]
+            for t in range(tutors):
+                picker.profile(f"tutor-{t}")
+            warm = [timed(picker.next_batch, f"tutor-{rng.randrange(tutors)}", store) for _ in range(batches)]
+            progress._db().close()
+        results[f"records_{size}"] = dict(percentiles(warm), index_build_ms=round(index_ms, 3),
+                                          cold_p50_ms=percentiles(cold)["p50_ms"])
+    return results
+
+BENCHMARKS = {
+    "data_manager": bench_data_manager,
+    "sharded_library": bench_sharded_library,
+    "page_rerun": bench_page_rerun,
+    "evaluate_tutor_response": bench_evaluate,
+    "judgment_call_conversation": bench_conversation,
+    "persona_open": bench_persona_open,
+    "generate_training_plan": bench_training_plan,
+    "turn_scoring": bench_turn_scoring,
+    "cohort_analytics": bench_cohort_analytics,
+    "adaptive_batch": bench_adaptive_batch,
+}
+
+# --- BASELINE COMPARISON ---
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    """
+    Lists metrics that got worse than the baseline by more than `tolerance`.
+    Metrics ending in _per_sec are higher-is-better; everything else is lower-is-better.
+    Timings (_ms, and _per_sec as time per call) must also have moved by at
+    least `min_delta_ms`, so sub-millisecond jitter never fails the gate;
+    counts such as prompt tokens are compared on the relative change alone.
+    """
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name, old in previous.items():
+        new = current.get(name)
+        if new is None or old == 0:
+            continue
+        if name.endswith("_ms") and abs(new - old) < min_delta_ms:
+            continue
+        if name.endswith("_per_sec") and new and abs(1000 / new - 1000 / old) < min_delta_ms:
+            continue
+        change = (new - old) / abs(old)
+        if name.endswith("_per_sec"):
+            change = -change
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": old, "current": new,
+                                "change_pct": round(change * 100, 1)})
+    return regressions
+
+def run(selected=None):
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if selected and name not in selected:
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = bench()
+    return {
+        "meta": {"python": platform.python_version(), "timestamp": time.time(),
+                 "stub_latency_ms": stub_backend.LATENCY_MS},
+        "results": results,
+    }
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tutor flows against the offline model stub.")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="Run a subset of benchmarks")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed regression (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=MIN_DELTA_MS,
+                        help="Ignore timing changes smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    report = run(args.only)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            report["regressions"] = compare(report["results"], json.load(file)["results"],
+                                            args.tolerance, args.min_delta_ms)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+    if report.get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,117 @@
+import collections
+import os
+import random
+import threading
+
+import llm_client
+import telemetry
+
+# --- GRADER CASCADE ---
+# With GRADER_CASCADE=1 the graders ask a fast, cheap model (GEMINI_MODEL_FAST)
+# first and only escalate to the configured strong model when the cheap
+# result sits near a decision boundary (see goal_setting/feedback_training
+# for what counts as one). A small share of clear-cut results
+# (CASCADE_AUDIT_RATE) is re-graded by the strong model anyway so the
+# agreement report covers the cases that were *not* escalated too.
+#
+# Per-tier latency and token counts come from the telemetry spans (tagged
+# with the model); CASCADE_*_COST_PER_1K turn tokens into relative cost.
+
+ENABLED = os.getenv("GRADER_CASCADE", "0") == "1"
+FAST_MODEL = llm_client.resolve_model_name("GEMINI_MODEL_FAST")
+AUDIT_RATE = float(os.getenv("CASCADE_AUDIT_RATE", "0.05"))
+COST_PER_1K = {
+    "fast": float(os.getenv("CASCADE_FAST_COST_PER_1K", "0.1")),
+    "strong": float(os.getenv("CASCADE_STRONG_COST_PER_1K", "1.0")),
+}
+MAX_PAIRS = int(os.getenv("CASCADE_MAX_PAIRS", "1000"))
+
+_lock = threading.Lock()
+_counts = collections.defaultdict(collections.Counter)   # name -> Counter(graded, escalated, audited, reason:...)
+_pairs = collections.defaultdict(lambda: collections.deque(maxlen=MAX_PAIRS))   # name -> [(kind, agreement dict)]
+_ops = {}                                                 # name -> telemetry ops of its model calls
+
+
+def is_active(strong_model):
+    """
+    True if GRADER_CASCADE=1 and both tiers are configured as different
+    models (tier_usage tells the tiers apart by model name)
+    """
+    return ENABLED and bool(FAST_MODEL) and bool(strong_model) and strong_model != FAST_MODEL
+
+def run(name, fast, strong, escalation_reason, compare, ops=(), audit_rate=None):
+    """
+    fast() and strong() produce a result; escalation_reason(result) returns
+    a short reason string or None; compare(fast_result, strong_result)
+    returns a dict of agreement flags/numbers. Returns (result, tier).
+    """
+    _ops[name] = tuple(ops)
+    audit_rate = AUDIT_RATE if audit_rate is None else audit_rate
+    cheap = fast()
+    reason = escalation_reason(cheap)
+    audit = reason is None and random.random() < audit_rate
+    with _lock:
+        _counts[name]["graded"] += 1
+        if reason:
+            _counts[name]["escalated"] += 1
+            _counts[name][f"reason:{reason}"] += 1
+        elif audit:
+            _counts[name]["audited"] += 1
+    if reason is None and not audit:
+        return cheap, "fast"
+
+    final = strong()
+    with _lock:
+        _pairs[name].append(("escalated" if reason else "audit", compare(cheap, final)))
+    return (final, "strong") if reason else (cheap, "fast")
+
+# --- REPORTING ---
+
+def _agreement(pairs):
+    """Mean of each agreement metric over a list of compare() dicts"""
+    if not pairs:
+        return {}
+    keys = pairs[0].keys()
+    return {key: round(sum(float(p[key]) for p in pairs) / len(pairs), 3) for key in keys} | {"pairs": len(pairs)}
+
+def tier_usage(ops):
+    """Per-tier calls, latency and tokens for the given ops, from the telemetry ring buffer"""
+    ring = telemetry.find_sink(telemetry.RingBufferSink)
+    if ring is None:
+        return {}
+    by_tier = collections.defaultdict(list)
+    for span in ring.spans():
+        if span["op"] in ops:
+            by_tier["fast" if span.get("model") == FAST_MODEL else "strong"].append(span)
+    usage = {}
+    for tier, spans in sorted(by_tier.items()):
+        latencies = sorted(s["latency_ms"] for s in spans)
+        tokens = sum((s.get("prompt_tokens") or 0) + (s.get("response_tokens") or 0) for s in spans)
+        usage[tier] = {
+            "calls": len(spans),
+            "p50_ms": telemetry.percentile(latencies, 0.50),
+            "p95_ms": telemetry.percentile(latencies, 0.95),
+            "tokens": tokens,
+            "cost": round(tokens / 1000 * COST_PER_1K[tier], 4),
+        }
+    return usage
+
+def report():
+    """Escalation rates, per-tier usage and fast/strong agreement for each cascade"""
+    rows = {}
+    with _lock:
+        names = list(_counts)
+        counts = {name: dict(_counts[name]) for name in names}
+        pairs = {name: list(_pairs[name]) for name in names}
+    for name in names:
+        graded = counts[name].get("graded", 0)
+        rows[name] = {
+            "graded": graded,
+            "escalation_rate": round(counts[name].get("escalated", 0) / graded, 3) if graded else 0.0,
+            "reasons": {k.split(":", 1)[1]: v for k, v in counts[name].items() if k.startswith("reason:")},
+            "audited": counts[name].get("audited", 0),
+            "tiers": tier_usage(_ops.get(name, ())),
+            "agreement_escalated": _agreement([p for kind, p in pairs[name] if kind == "escalated"]),
+            "agreement_audit": _agreement([p for kind, p in pairs[name] if kind == "audit"]),
+        }
+    return rows
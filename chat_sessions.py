@@ -0,0 +1,243 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+
+import llm_client
+import transcript
+
+# --- SERIALIZABLE CHAT SESSIONS ---
+# A Judgment Call conversation is kept as a small JSON record (persona id,
+# every turn, the rolling summary) in a shared store instead of a live
+# ChatSession in st.session_state. Any replica can pick a conversation up:
+# the model chat is rebuilt from the record the first time a process needs
+# it and reused while that process keeps serving the conversation.
+#
+# CHAT_STORE picks the store: "sqlite" (default, CHAT_STORE_PATH is the
+# database) or "file" (CHAT_STORE_PATH is a folder, one JSON file per chat).
+# Point replicas at the same path on shared storage.
+
+STORE_TYPE = os.getenv("CHAT_STORE", "sqlite")
+STORE_PATH = os.getenv("CHAT_STORE_PATH")
+TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+LIVE_CHATS = int(os.getenv("CHAT_LIVE_SESSIONS", "256"))
+
+
+class StaleChatRecord(Exception):
+    """Another worker saved this chat since it was loaded"""
+
+
+@dataclass
+class ChatRecord:
+    session_id: str
+    tutor_id: str
+    persona_id: str
+    turns: list = field(default_factory=list)     # [[speaker, text]] for the whole chat
+    summary: str = ""
+    compacted_turns: int = 0                       # leading turns folded into the summary
+    revision: int = 0
+    updated: float = 0.0
+
+    @classmethod
+    def new(cls, tutor_id, persona_id):
+        return cls(session_id=uuid.uuid4().hex, tutor_id=tutor_id, persona_id=persona_id)
+
+    def add(self, speaker, text):
+        self.turns.append([speaker, text])
+
+    def transcript(self, persona_desc):
+        """The RollingTranscript this record describes"""
+        log = transcript.RollingTranscript(persona_desc)
+        log.turns = [tuple(turn) for turn in self.turns[self.compacted_turns:]]
+        log.summary = self.summary
+        log.compacted_turns = self.compacted_turns
+        return log
+
+    def sync(self, log):
+        """Takes the summary over from a RollingTranscript after compaction"""
+        self.summary = log.summary
+        self.compacted_turns = log.compacted_turns
+
+    def messages(self):
+        """Display messages for st.chat_message"""
+        return [{"role": "user" if speaker == "tutor" else "assistant", "content": text}
+                for speaker, text in self.turns]
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+# --- STORES ---
+# A store has get(session_id) -> ChatRecord or None, and put(record), which
+# bumps the revision and raises StaleChatRecord if the stored revision moved.
+
+class SqliteChatStore:
+    def __init__(self, path=None, ttl_seconds=TTL_SECONDS):
+        self.path = path or os.path.join(".cache", "chat_sessions.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS chats ("
+            " session_id TEXT PRIMARY KEY, tutor_id TEXT, persona_id TEXT,"
+            " revision INTEGER NOT NULL, updated REAL NOT NULL, record TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS chats_updated ON chats(updated)")
+        db.commit()
+
+    def _db(self):
+        """One connection per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def get(self, session_id):
+        row = self._db().execute("SELECT record, updated FROM chats WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return ChatRecord.from_dict(json.loads(row[0]))
+
+    def put(self, record):
+        previous = record.revision
+        record.revision += 1
+        record.updated = time.time()
+        db = self._db()
+        try:
+            if previous == 0:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO chats (session_id, tutor_id, persona_id, revision, updated, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record.session_id, record.tutor_id, record.persona_id, record.revision, record.updated,
+                     json.dumps(record.to_dict())))
+            else:
+                cursor = db.execute(
+                    "UPDATE chats SET revision = ?, updated = ?, record = ? WHERE session_id = ? AND revision = ?",
+                    (record.revision, record.updated, json.dumps(record.to_dict()), record.session_id, previous))
+            if cursor.rowcount != 1:
+                raise StaleChatRecord(record.session_id)
+            db.execute("DELETE FROM chats WHERE updated < ?", (record.updated - self.ttl_seconds,))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            record.revision = previous
+            raise
+
+
+class FileChatStore:
+    """
+    One JSON file per chat, replaced atomically. The revision check is not
+    atomic across processes; use the SQLite store when replicas may write
+    the same chat at once.
+    """
+
+    def __init__(self, path=None, ttl_seconds=TTL_SECONDS):
+        self.path = path or os.path.join(".cache", "chat_sessions")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, session_id):
+        if not session_id.isalnum():
+            raise ValueError(f"Invalid chat session id: {session_id!r}")
+        return os.path.join(self.path, f"{session_id}.json")
+
+    def get(self, session_id):
+        try:
+            with open(self._file(session_id), 'r', encoding='utf-8') as file:
+                record = ChatRecord.from_dict(json.load(file))
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - record.updated > self.ttl_seconds:
+            return None
+        return record
+
+    def put(self, record):
+        with self._lock:
+            stored = self.get(record.session_id)
+            if (stored.revision if stored else 0) != record.revision:
+                raise StaleChatRecord(record.session_id)
+            record.revision += 1
+            record.updated = time.time()
+            temp = self._file(record.session_id) + f".{uuid.uuid4().hex}.tmp"
+            with open(temp, 'w', encoding='utf-8') as file:
+                json.dump(record.to_dict(), file)
+            os.replace(temp, self._file(record.session_id))
+
+
+STORES = {"sqlite": SqliteChatStore, "file": FileChatStore}
+
+def register_store(name, factory):
+    STORES[name] = factory
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_chat_store():
+    """Process-wide chat store selected by CHAT_STORE"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STORE_TYPE not in STORES:
+                raise ValueError(f"Unknown CHAT_STORE '{STORE_TYPE}' (choose from {', '.join(STORES)})")
+            _store = STORES[STORE_TYPE](STORE_PATH)
+        return _store
+
+# --- LIVE CHATS ---
+# Model chat objects for the conversations this process served recently,
+# keyed by session id and valid for one record revision.
+
+_live = collections.OrderedDict()
+_live_lock = threading.Lock()
+
+def get_chat(record, persona_desc, model_name):
+    """The model chat for a record: reused if this process has it, else rebuilt from the record"""
+    with _live_lock:
+        entry = _live.get(record.session_id)
+        if entry is not None and entry[0] == record.revision:
+            _live.move_to_end(record.session_id)
+            return entry[1]
+    return llm_client.start_chat(model_name, history=record.transcript(persona_desc).chat_history())
+
+def remember_chat(record, chat):
+    """Keeps a chat that is in sync with the record's current revision"""
+    with _live_lock:
+        _live[record.session_id] = (record.revision, chat)
+        _live.move_to_end(record.session_id)
+        while len(_live) > LIVE_CHATS:
+            _live.popitem(last=False)
+
+def forget_chat(session_id):
+    with _live_lock:
+        _live.pop(session_id, None)
+
+def record_turn(record, persona_desc, model_name, chat, message, reply):
+    """
+    Adds one exchange to the record, compacts the transcript when it is
+    over budget and saves the record. The chat is kept for the next turn,
+    unless compaction means it has to be rebuilt from the summary.
+    Raises StaleChatRecord like put().
+    """
+    record.add("tutor", message)
+    record.add("student", reply)
+    log = record.transcript(persona_desc)
+    if transcript.maybe_compact(log, model_name):
+        record.sync(log)
+        chat = None
+    get_chat_store().put(record)
+    if chat is not None:
+        remember_chat(record, chat)
+    else:
+        forget_chat(record.session_id)
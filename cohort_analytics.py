@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import progress_store
+from rubric import CRITERIA, CRITERIA_KEYS, PASS_SCORE
+
+# --- COHORT ANALYTICS ---
+# Training-manager view over every graded attempt in the progress store.
+# The score columns are held in memory as NumPy arrays, one per column, and
+# every statistic is a masked bincount/unique over those arrays: no Python
+# loop runs per attempt, so a report over 100k+ attempts takes milliseconds.
+#
+# refresh() only fetches attempts newer than the last one it saw and appends
+# them; it runs at most every ANALYTICS_REFRESH_SECONDS. Missing scores
+# (free-form text grades, simulations without a score) are stored as -1 and
+# masked out of the score statistics; they still count as completions.
+
+REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "5"))
+
+LABELS = {key: label for key, label, _, _ in CRITERIA}
+SCORE_RANGE = 10     # criteria are graded 1-10
+
+
+class CohortAnalytics:
+    def __init__(self, store=None, refresh_seconds=REFRESH_SECONDS):
+        self.store = store or progress_store.get_progress_store()
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.last_id = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        # Tutors and items are stored as integer codes into these lists; items
+        # are coded per kind, so goal scenario 1 and persona "1" stay apart
+        self.tutor_ids, self._tutor_codes = [], {}
+        self.item_ids, self._item_codes = [], {}
+        self.tutor = np.zeros(0, dtype=np.int32)
+        self.item = np.zeros(0, dtype=np.int32)
+        self.is_goal = np.zeros(0, dtype=bool)
+        self.attempt = np.zeros(0, dtype=np.int32)
+        self.score = np.zeros(0, dtype=np.float32)
+        self.weighted = np.zeros(0, dtype=np.float32)
+        self.criteria = np.zeros((0, len(CRITERIA_KEYS)), dtype=np.float32)
+        self.created = np.zeros(0, dtype=np.float64)
+
+    # --- LOADING ---
+
+    def refresh(self, force=False):
+        """Appends attempts recorded since the last refresh; returns how many were added"""
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.refresh_seconds:
+                return 0
+            self._last_refresh = time.monotonic()
+            rows = self.store.score_rows(self.last_id)
+            if not rows:
+                return 0
+            # Transpose once in C; everything after this works on whole columns
+            cols = list(zip(*rows))
+            scores = np.array(cols[5:-1], dtype=np.float32)
+            self.ids = np.concatenate([self.ids, np.array(cols[0], dtype=np.int64)])
+            self.tutor = np.concatenate([self.tutor, _encode(cols[1], self.tutor_ids, self._tutor_codes)])
+            self.is_goal = np.concatenate([self.is_goal, np.array(cols[2], dtype=str) == progress_store.GOAL])
+            self.item = np.concatenate([self.item, _encode(cols[3], self.item_ids, self._item_codes, cols[2])])
+            self.attempt = np.concatenate([self.attempt, np.array(cols[4], dtype=np.int32)])
+            self.score = np.concatenate([self.score, scores[0]])
+            self.weighted = np.concatenate([self.weighted, scores[1]])
+            self.criteria = np.concatenate([self.criteria, scores[2:].T])
+            self.created = np.concatenate([self.created, np.array(cols[-1], dtype=np.float64)])
+            self.last_id = int(self.ids[-1])
+            return len(rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _mask(self, goal=None, since=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if goal is not None:
+            mask &= self.is_goal == goal
+        if since is not None:
+            mask &= self.created >= since
+        return mask
+
+    def _distinct_tutors(self, mask):
+        """Distinct tutors per item code among the masked rows"""
+        n_items = len(self.item_ids)
+        pairs = np.unique(self.tutor[mask].astype(np.int64) * n_items + self.item[mask])
+        return np.bincount(pairs % n_items, minlength=n_items)
+
+    # --- STATISTICS ---
+
+    def criterion_distributions(self, since=None):
+        """Per criterion: graded attempts, mean, quartiles and a 1-10 histogram"""
+        graded = self.criteria[self._mask(True, since)]
+        graded = graded[(graded > 0).all(axis=1)]
+        if not len(graded):
+            return []
+        # Rows stored before build_evaluation clamped sub-scores may hold values above 10
+        graded = np.clip(graded, 1, SCORE_RANGE)
+        means = graded.mean(axis=0)
+        # One bincount for all criteria: offset each column into its own 11-slot block
+        width = SCORE_RANGE + 1
+        offsets = np.arange(len(CRITERIA_KEYS)) * width
+        hist = np.bincount((graded.astype(np.int64) + offsets).ravel(),
+                           minlength=width * len(CRITERIA_KEYS)).reshape(-1, width)[:, 1:]
+        # Scores are whole numbers, so quartiles come straight from the cumulative histogram
+        cumulative = hist.cumsum(axis=1)
+        quartiles = np.stack([(cumulative < q * len(graded)).sum(axis=1) + 1 for q in (0.25, 0.5, 0.75)])
+        return [
+            {"criterion": LABELS[key], "attempts": len(graded), "mean": round(float(means[i]), 2),
+             "p25": int(quartiles[0, i]), "median": int(quartiles[1, i]), "p75": int(quartiles[2, i]),
+             "histogram": hist[i].tolist()}
+            for i, key in enumerate(CRITERIA_KEYS)
+        ]
+
+    def weakest_criteria(self, since=None):
+        """
+        Criteria ranked by how many tutors score lowest on them (averaged over
+        each tutor's graded attempts), then by cohort mean
+        """
+        mask = self._mask(True, since)
+        mask[mask] = (self.criteria[mask] > 0).all(axis=1)
+        if not mask.any():
+            return []
+        graded = self.criteria[mask]
+        tutor = self.tutor[mask]
+        n = len(self.tutor_ids)
+        counts = np.bincount(tutor, minlength=n)
+        sums = np.stack([np.bincount(tutor, weights=graded[:, i], minlength=n)
+                         for i in range(len(CRITERIA_KEYS))], axis=1)
+        graded_tutors = counts > 0
+        weakest = np.argmin(sums[graded_tutors] / counts[graded_tutors, None], axis=1)
+        tutors_weakest = np.bincount(weakest, minlength=len(CRITERIA_KEYS))
+        n_tutors = int(graded_tutors.sum())
+        means = graded.mean(axis=0)
+        order = np.lexsort((means, -tutors_weakest))
+        return [
+            {"rank": rank, "criterion": LABELS[CRITERIA_KEYS[i]], "tutors_weakest": int(tutors_weakest[i]),
+             "share_of_tutors": round(float(tutors_weakest[i]) / n_tutors, 3),
+             "cohort_mean": round(float(means[i]), 2)}
+            for rank, i in enumerate(order, 1)
+        ]
+
+    def scenario_difficulty(self, since=None):
+        """
+        Per goal scenario, hardest first: attempts, tutors, mean score, pass
+        rate (score >= GOAL_PASS_SCORE) overall and on the first attempt
+        """
+        mask = self._mask(True, since) & (self.score >= 0)
+        if not mask.any():
+            return []
+        n = len(self.item_ids)
+        item = self.item[mask]
+        score = self.score[mask]
+        first = self.attempt[mask] == 1
+        passed = score >= PASS_SCORE
+        attempts = np.bincount(item, minlength=n)
+        seen = np.flatnonzero(attempts)
+        attempts = attempts[seen]
+        mean_score = np.bincount(item, weights=score, minlength=n)[seen] / attempts
+        pass_rate = np.bincount(item, weights=passed, minlength=n)[seen] / attempts
+        first_attempts = np.bincount(item, weights=first, minlength=n)[seen]
+        first_passed = np.bincount(item, weights=first & passed, minlength=n)[seen]
+        first_pass_rate = np.divide(first_passed, first_attempts, out=np.full(len(seen), np.nan),
+                                    where=first_attempts > 0)
+        tutors = self._distinct_tutors(mask)[seen]
+        order = np.lexsort((mean_score, pass_rate))
+        return [
+            {"scenario_id": self.item_ids[seen[i]], "attempts": int(attempts[i]), "tutors": int(tutors[i]),
+             "mean_score": round(float(mean_score[i]), 2), "pass_rate": round(float(pass_rate[i]), 3),
+             "first_try_pass_rate": None if np.isnan(first_pass_rate[i]) else round(float(first_pass_rate[i]), 3)}
+            for i in order
+        ]
+
+    def persona_completion(self, persona_ids=(), since=None):
+        """
+        Per persona: tutors who completed it, attempts and completion rate over
+        every tutor with an attempt in the window. persona_ids adds personas
+        nobody has completed yet.
+        """
+        cohort = int(np.count_nonzero(np.bincount(self.tutor[self._mask(since=since)],
+                                                  minlength=len(self.tutor_ids))))
+        mask = self._mask(False, since)
+        attempts = np.bincount(self.item[mask], minlength=len(self.item_ids))
+        tutors = self._distinct_tutors(mask)
+        rows = {self.item_ids[i]: (int(tutors[i]), int(attempts[i])) for i in np.flatnonzero(attempts)}
+        for pid in persona_ids:
+            rows.setdefault(pid, (0, 0))
+        result = [
+            {"persona_id": pid, "tutors": t, "attempts": a,
+             "completion_rate": round(t / cohort, 3) if cohort else 0.0}
+            for pid, (t, a) in rows.items()
+        ]
+        return sorted(result, key=lambda r: r["completion_rate"])
+
+    def report(self, since=None, persona_ids=()):
+        """Everything the analytics page shows, for attempts created at or after `since`"""
+        self.refresh()
+        t0 = time.perf_counter()
+        mask = self._mask(since=since)
+        report = {
+            "attempts": int(mask.sum()),
+            "tutors": int(np.count_nonzero(np.bincount(self.tutor[mask], minlength=len(self.tutor_ids)))),
+            "criteria": self.criterion_distributions(since),
+            "weakest_criteria": self.weakest_criteria(since),
+            "scenarios": self.scenario_difficulty(since),
+            "personas": self.persona_completion(persona_ids, since),
+        }
+        report["compute_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return report
+
+
+def _encode(values, vocabulary, codes, kinds=None):
+    """
+    Integer code per value, extending `vocabulary` (code -> value) and
+    `codes` (value, or (kind, value) with kinds, -> code) with unseen
+    values. Only distinct values are looked at in Python.
+    """
+    keys = np.array(values, dtype=str)
+    if kinds is not None:
+        keys = np.char.add(np.char.add(np.array(kinds, dtype=str), "\x1f"), keys)
+    distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    mapped = np.empty(len(distinct), dtype=np.int32)
+    for i, index in enumerate(first):
+        value = values[index]
+        key = value if kinds is None else (kinds[index], value)
+        if key not in codes:
+            codes[key] = len(vocabulary)
+            vocabulary.append(value)
+        mapped[i] = codes[key]
+    return mapped[inverse.reshape(-1)]
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+def get_analytics():
+    """Process-wide CohortAnalytics over the shared progress store"""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = CohortAnalytics()
+        return _analytics
@@ -1,27 +1,150 @@
+import hashlib
 import json
+import os
 import random
+import threading
 
-def load_data():
-    """Loads the JSON file into a Python Dictionary"""
+import scenario_shards
+
+# A scenarios.json document, or a sharded library folder (see scenario_shards.py)
+SCENARIO_FILE = os.getenv("SCENARIO_FILE", "scenarios.json")
+
+# --- SHARED SCENARIO STORE ---
+# The scenario library is loaded once per process and shared by every
+# Streamlit session. Each call only does a cheap os.stat(); the file is
+# re-read when its mtime/size changes, and the store is only replaced if
+# the content hash is actually different.
+
+class ScenarioStore:
+    """Read-only snapshot of scenarios.json with lookup indexes"""
+
+    def __init__(self, data, version):
+        self.version = version
+        self.goal_scenarios = tuple(data.get('goal_setting_scenarios', []))
+
+        self.scenarios_by_id = {s['id']: s for s in self.goal_scenarios}
+        self.scenarios_by_conflict = {}
+        for s in self.goal_scenarios:
+            self.scenarios_by_conflict.setdefault(s['conflict type'], []).append(s)
+        self.scenarios_by_conflict = {k: tuple(v) for k, v in self.scenarios_by_conflict.items()}
+
+        # Label -> record map used by the scenario selectbox in app.py
+        self.scenario_options = {f"Case {s['id']}": s for s in self.goal_scenarios}
+        self._set_personas(tuple(data.get('judgment_personas', [])))
+
+    def _set_personas(self, personas):
+        self.personas = personas
+        self.personas_by_id = {p['id']: p for p in self.personas}
+        self.personas_by_name = {p['name']: p for p in self.personas}
+        self.persona_options = dict(self.personas_by_name)
+
+    def get_scenario(self, scenario_id):
+        return self.scenarios_by_id.get(scenario_id)
+
+    def get_persona(self, key):
+        """Looks a persona up by id first, then by name"""
+        return self.personas_by_id.get(key) or self.personas_by_name.get(key)
+
+    def get_by_conflict(self, conflict_type):
+        return self.scenarios_by_conflict.get(conflict_type, ())
+
+    def sample_scenarios(self, k, conflict_type=None):
+        """k random goal scenarios (optionally of one conflict type)"""
+        population = self.get_by_conflict(conflict_type) if conflict_type else self.goal_scenarios
+        return random.sample(population, min(k, len(population)))
+
+    def as_dict(self):
+        """Same shape as the raw scenarios.json document"""
+        return {
+            "goal_setting_scenarios": list(self.goal_scenarios),
+            "judgment_personas": list(self.personas),
+        }
+
+
+class ShardedScenarioStore(ScenarioStore):
+    """
+    Same interface over a sharded library. Goal scenarios stay on disk and
+    are decoded on access (sequences and mappings are lazy views); personas
+    are few, so they are loaded eagerly. as_dict() reads everything.
+    """
+
+    def __init__(self, folder, manifest):
+        self.version = manifest["version"]
+        goals = scenario_shards.open_collection(folder, manifest, scenario_shards.GOALS)
+        self.goal_scenarios = goals
+        self.scenarios_by_id = scenario_shards.RecordsById(goals)
+        self.scenarios_by_conflict = {k: goals.by_conflict(k) for k in goals.conflict_ranges}
+        self.scenario_options = scenario_shards.RecordsByLabel(goals, "Case ")
+        self._set_personas(tuple(scenario_shards.open_collection(folder, manifest, scenario_shards.PERSONAS)))
+
+
+_store = None
+_store_stat = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Returns the shared ScenarioStore, reloading it if scenarios.json changed"""
+    global _store, _store_stat
+    # A sharded library is watched through its manifest, which is replaced last
+    sharded = os.path.isdir(SCENARIO_FILE)
+    path = os.path.join(SCENARIO_FILE, scenario_shards.MANIFEST) if sharded else SCENARIO_FILE
     try:
-        with open('scenarios.json', 'r') as file:
-            return json.load(file)
+        st = os.stat(path)
     except FileNotFoundError:
-        print("Error: scenarios.json not found!")
+        print(f"Error: {path} not found!")
+        return None
+    stat_key = (path, st.st_mtime_ns, st.st_size)
+    if _store is not None and stat_key == _store_stat:
+        return _store
+
+    with _store_lock:
+        # Another thread may have reloaded while we waited for the lock
+        if _store is not None and stat_key == _store_stat:
+            return _store
+        try:
+            if sharded:
+                manifest = scenario_shards.read_manifest(SCENARIO_FILE)
+                if _store is None or _store.version != manifest["version"]:
+                    _store = ShardedScenarioStore(SCENARIO_FILE, manifest)
+            else:
+                with open(path, 'rb') as file:
+                    raw = file.read()
+                version = hashlib.sha256(raw).hexdigest()
+                if _store is None or _store.version != version:
+                    _store = ScenarioStore(json.loads(raw), version)
+        except FileNotFoundError:
+            print(f"Error: {path} not found!")
+            return None
+        _store_stat = stat_key
+        return _store
+
+def load_data():
+    """Loads the JSON file into a Python Dictionary"""
+    store = get_store()
+    if store is None:
         return None
+    return store.as_dict()
 
-def get_training_batch():
+def get_training_batch(conflict_type=None, tutor_id=None):
     """
-    Randomly selects 2 Goal Scenarios and 2 Judgment Personas.
-    Returns them as a dictionary.
+    Selects 2 Goal Scenarios (optionally of one conflict type) and 2
+    Judgment Personas. Returns them as a dictionary.
+    With a tutor_id the batch targets that tutor's weak criteria and unseen
+    cases (see scheduler.py) and also lists the criteria it focuses on;
+    without one, or with ADAPTIVE_BATCH=0, the picks are uniformly random.
+    Only the sampled records are read, so this stays cheap for large libraries.
     """
-    data = load_data()
-    if not data:
+    store = get_store()
+    if not store:
         return None
-    selected_goals = random.sample(data['goal_setting_scenarios'], 2)
-    selected_judgments = random.sample(data['judgment_personas'], 2)
+    if tutor_id:
+        import scheduler
+        if scheduler.ENABLED:
+            return scheduler.get_scheduler().next_batch(tutor_id, store, conflict_type)
+    selected_goals = store.sample_scenarios(2, conflict_type)
+    selected_judgments = random.sample(store.personas, 2)
 
     return {
         "goals": selected_goals,
         "judgments": selected_judgments
-    }
\ No newline at end of file
+    }
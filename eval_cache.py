@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- EVALUATION CACHE ---
+# Persistent cache for model outputs, keyed by a hash of
+# (model name, prompt template version, inputs). Entries expire after a TTL
+# and the least recently used ones are evicted once the cache is full.
+# Set EVAL_CACHE_DISABLED=1 to bypass it completely.
+
+CACHE_PATH = os.getenv("EVAL_CACHE_PATH", os.path.join(".cache", "eval_cache.sqlite3"))
+MAX_ENTRIES = int(os.getenv("EVAL_CACHE_MAX_ENTRIES", "5000"))
+TTL_SECONDS = float(os.getenv("EVAL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_DISABLED = os.getenv("EVAL_CACHE_DISABLED", "0") == "1"
+
+def make_key(model_name, template_version, inputs):
+    """Content address for one model call"""
+    payload = json.dumps([model_name, template_version, inputs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class EvalCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS, enabled=not CACHE_DISABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        return self._conn
+
+    def get(self, key):
+        """Returns the cached value or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    db.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            count = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                # Drop expired entries first, then the least recently used
+                removed = db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+                overflow = count - removed - self.max_entries
+                if overflow > 0:
+                    removed += db.execute(
+                        "DELETE FROM entries WHERE key IN "
+                        "(SELECT key FROM entries ORDER BY accessed LIMIT ?)", (overflow,)
+                    ).rowcount
+                self.evictions += removed
+            db.commit()
+
+    def get_or_compute(self, model_name, template_version, inputs, compute):
+        """
+        Returns the cached result for these inputs, or calls compute() and
+        stores its result. Exceptions from compute() are never cached.
+        """
+        key = make_key(model_name, template_version, inputs)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM entries")
+            self._db().commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache shared by the evaluators"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EvalCache()
+        return _cache
@@ -1,27 +1,22 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import json
 
-# API keys and configuration
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+import cascade
+import eval_cache
+import llm_client
 
-MODEL_NAME = os.getenv("GEMINI_MODEL_3")
-if not MODEL_NAME:
-    raise ValueError("Error: GEMINI_MODEL is not set in your .env file")
+# API keys and configuration are handled once by llm_client
 
-def generate_training_plan(conversation_log):
-    model = genai.GenerativeModel(MODEL_NAME)
-    # We turn the list of log entries into a single block of text
-    transcript_text = "\n".join(conversation_log)
-    prompt = f"""
+MODEL_NAME = llm_client.resolve_model_name("GEMINI_MODEL_3")
+
+# Bump whenever the training-plan prompt changes so cached plans are not reused
+PROMPT_VERSION = "3"
+
+# The rubric is a static system prefix; only the transcript changes per call
+PREFIX = llm_client.PromptPrefix("feedback_training", PROMPT_VERSION, """
     ROLE:
     You are an expert evaluator for educational tutors. You have just observed a simulation between a candidate tutor and a student named 'Alex' (who is shy/low-confidence).
-    
-    DATA:
-    Transcript:
-    {transcript_text}
-    
+    Each message gives you the transcript of that simulation (earlier turns of long sessions may be condensed into a leading summary line).
+
     TASK:
     Determine if the responses are:
     1. highly appropriate (demonstrating empathy, perspective-taking, and skillful intervention)
@@ -52,10 +47,91 @@ def generate_training_plan(conversation_log):
     
     OUTPUT FORMAT:
     Please organize the response clearly with bold headers. Do no explicitly restate the criteria, reframe the feedback specific to the simulation.
-    """
-    
-    response = model.generate_content(prompt)
-    return response.text
+""")
+
+SUFFIX_TEMPLATE = """TRANSCRIPT:
+{transcript_text}
+"""
+
+TEMPLATE_KEY = llm_client.template_key(PREFIX, SUFFIX_TEMPLATE)
+
+# conversation_log (list of str): "Tutor: ..."/"Student: ..." lines, optionally led by a
+# summary line for turns that were compacted (see transcript.RollingTranscript.as_log)
+# Without an explicit model_name this goes through the grader cascade when it is enabled.
+def generate_training_plan(conversation_log, use_cache=True, persona_id=None, model_name=None):
+    if model_name is None and cascade.is_active(MODEL_NAME):
+        return generate_training_plan_cascade(conversation_log, use_cache, persona_id)
+    model_name = model_name or MODEL_NAME
+    # We turn the list of log entries into a single block of text
+    transcript_text = "\n".join(conversation_log)
+    prompt = SUFFIX_TEMPLATE.format(transcript_text=transcript_text)
+
+    def call_model():
+        return llm_client.generate(model_name, prompt, op="feedback_training.training_plan",
+                                   tags={"persona_id": persona_id}, prefix=PREFIX)
+
+    if not use_cache:
+        return call_model()
+    return eval_cache.get_cache().get_or_compute(model_name, TEMPLATE_KEY, [transcript_text], call_model)
+
+# --- CASCADE ---
+# Training plans have no numeric score, so in cascade mode both tiers also
+# rate the session. The middle band ("moderately appropriate") is the
+# pass/fail boundary: those plans are rewritten by the strong model.
+
+APPROPRIATENESS = ["highly appropriate", "moderately appropriate", "inappropriate"]
+ESCALATE_RATINGS = {"moderately appropriate"}
+
+RATED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "appropriateness": {"type": "string", "enum": APPROPRIATENESS},
+        "training_plan": {"type": "string"},
+    },
+    "required": ["appropriateness", "training_plan"],
+}
+
+RATED_PREFIX = llm_client.PromptPrefix("feedback_training_rated", PROMPT_VERSION, PREFIX.text + """
+
+Respond with JSON only, matching the provided schema: appropriateness is your overall rating of the tutor's
+responses, training_plan is the Training Plan itself (markdown with bold headers).
+""")
+
+RATED_TEMPLATE_KEY = llm_client.template_key(RATED_PREFIX, SUFFIX_TEMPLATE)
+
+def rated_training_plan(conversation_log, model_name, use_cache=True, persona_id=None):
+    """{"appropriateness": ..., "training_plan": ...} from one model. Raises on API or parse errors."""
+    transcript_text = "\n".join(conversation_log)
+    prompt = SUFFIX_TEMPLATE.format(transcript_text=transcript_text)
+
+    def call_model():
+        text = llm_client.generate(model_name, prompt, op="feedback_training.rated_plan",
+                                   tags={"persona_id": persona_id}, prefix=RATED_PREFIX,
+                                   generation_config={"response_mime_type": "application/json",
+                                                      "response_schema": RATED_SCHEMA})
+        payload = json.loads(text.strip().removeprefix("```json").removeprefix("```").removesuffix("```"))
+        if payload.get("appropriateness") not in APPROPRIATENESS or not payload.get("training_plan"):
+            raise ValueError("Malformed rated training plan")
+        return payload
+
+    if not use_cache:
+        return call_model()
+    return eval_cache.get_cache().get_or_compute(model_name, RATED_TEMPLATE_KEY, [transcript_text], call_model)
+
+def generate_training_plan_cascade(conversation_log, use_cache=True, persona_id=None):
+    """Fast model first, strong model (MODEL_NAME) for borderline sessions; returns the plan text"""
+    def escalation_reason(payload):
+        return "borderline_rating" if payload["appropriateness"] in ESCALATE_RATINGS else None
+
+    def compare(fast, strong):
+        return {"same_rating": fast["appropriateness"] == strong["appropriateness"]}
+
+    payload, _ = cascade.run(
+        "feedback_training",
+        lambda: rated_training_plan(conversation_log, cascade.FAST_MODEL, use_cache, persona_id),
+        lambda: rated_training_plan(conversation_log, MODEL_NAME, use_cache, persona_id),
+        escalation_reason, compare, ops=("feedback_training.rated_plan",))
+    return payload["training_plan"]
 
 # --- MAIN EXECUTION (Testing Mode) ---
 if __name__ == "__main__":
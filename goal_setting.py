@@ -1,73 +1,283 @@
+import json
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+from dataclasses import asdict, dataclass
 
-# API keys and configuration
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+import cascade
+import eval_cache
+import llm_client
 
-MODEL_NAME = os.getenv("GEMINI_MODEL_1")
-if not MODEL_NAME:
-    raise ValueError("Error: GEMINI_MODEL is not set in your .env file")
+# API keys and configuration are handled once by llm_client
 
-# Evaluate the response, takes in:
-    # tutor_input (str): user input
-    # scenario_data (dict): scenarios.json
+MODEL_NAME = llm_client.resolve_model_name("GEMINI_MODEL_1")
 
-def evaluate_tutor_response(tutor_input, scenario_data=None):
-    model = genai.GenerativeModel(MODEL_NAME)
+# Bump whenever a grading prompt changes. Cached grades are keyed by the
+# template key, which also changes whenever the prompt text itself does.
+PROMPT_VERSION = "2"
+STRUCTURED_PROMPT_VERSION = "s2"
 
-    if scenario_data:
-        p_goal = scenario_data['parent']
-        s_goal = scenario_data['student']
-        conflict_type = scenario_data['conflict type']
-    else:
-        # Default fallback (if run alone for testing)
-        p_goal = "I am paying for results. Alex needs an A on this physics lab report to salvage his GPA. I don't care how you get him there—edit it, rewrite it, whatever helps. If he fails this assignment, I don't see the point in continuing these expensive sessions."
-        s_goal = "I don't understand the material and I'm freaking out. My dad is going to kill me if I get a bad grade. Please, can you just write the analysis section for me? I'll do the rest, but I need you to guarantee this part is perfect."
-        conflict_type = "Ethical"
+# "structured" returns a GoalEvaluation, "text" the original free-form feedback
+EVAL_MODE = os.getenv("GOAL_EVAL_MODE", "structured")
+
+from rubric import CASCADE_MARGIN, CRITERIA, CRITERIA_KEYS, ETHICAL_CAP, PASS_SCORE, PROCESS_CAP
+
+CRITERIA_TEXT = "\n    ".join(f"{i}. {label} ({int(weight * 100)}%): {question}"
+                            for i, (_, label, weight, question) in enumerate(CRITERIA, 1))
+
+# --- PROMPT TEMPLATES ---
+# The rubric is a static system prefix built once at import; each call only
+# formats the short scenario/response suffix.
 
-    full_prompt = f"""
+TEXT_PREFIX = llm_client.PromptPrefix("goal_setting", PROMPT_VERSION, f"""
     ROLE:
-    You are an expert evaluator for educational tutors. 
+    You are an expert evaluator for educational tutors.
 
     YOUR TASK:
     Your task is to grade a Tutor's response to conflicting requests between a student and their parent.
-    Parent Request: "{p_goal}"
-    Student Request: "{s_goal}"
-    Conflict type: '{conflict_type}
-    
-    Evaluate the Tutor's response below to see if they resolved the conflict.
-    
-    TUTOR RESPONSE:
-    "{tutor_input}"
-    
+    Each message gives you the Parent Request, the Student Request, the conflict type and the TUTOR RESPONSE.
+    Evaluate the Tutor's response to see if they resolved the conflict.
+
     EVALUATION CONSTRAINTS:
 
-    If the conflict type is Ethical and the tutor's response explicitly violates academic integrity and commits academic dishonesty, risks safety, or violates professional boundaries, the maximum score possible is a 2.
-    If the conflict type is Process and the tutor's response completely ignores one party, the maximum score is a 5.
+    If the conflict type is Ethical and the tutor's response explicitly violates academic integrity and commits academic dishonesty, risks safety, or violates professional boundaries, the maximum score possible is a {ETHICAL_CAP}.
+    If the conflict type is Process and the tutor's response completely ignores one party, the maximum score is a {PROCESS_CAP}.
 
     EVALUATION CRITERIA AND ALGORITHM:
-    
+
     Evaluate the Tutor Response against these weighted criteria:
-    1. Pedagogical Integrity (25%): Does the solution result in the student doing cognitive work and learning?
-    2. Stakeholder Alignment (20%): Does the tutor address the Parent's concerns and the Student's concerns without caving to the unethical demand or ignoring the conflict overall?
-    3. Tone (10%): Does the response tone de-escalate the situation? Does the tutor avoid defensiveness, stubborness, and hostility?
-    4. Empathy (10%): Does the response avoid judgement and demonstrates emotional understanding?
-    5. Compromise (25%): Does the response prioritize solutions with compromise when possible? If compromise is not reasonable, does the tutor explain why to upkeep trust?
-    6. Communication(10%): Is the response clear, specific, and actionable?
+    {CRITERIA_TEXT}
 
     OUTPUT FORMAT:
 
     Score the response as an integer between 1-10. Provide a concise explaination of the score, do not directly reference or state the criteria in the explaination. Provide postive feedback if score is above 2. Provide negative feedback outlining areas for improvement.
-    """
+""")
+
+SUFFIX_TEMPLATE = """Parent Request: "{p_goal}"
+Student Request: "{s_goal}"
+Conflict type: '{conflict_type}'
+
+TUTOR RESPONSE:
+"{tutor_input}"
+"""
+
+TEXT_TEMPLATE_KEY = llm_client.template_key(TEXT_PREFIX, SUFFIX_TEMPLATE)
+
+DEFAULT_SCENARIO = {
+    "id": None,
+    "parent": "I am paying for results. Alex needs an A on this physics lab report to salvage his GPA. I don't care how you get him there—edit it, rewrite it, whatever helps. If he fails this assignment, I don't see the point in continuing these expensive sessions.",
+    "student": "I don't understand the material and I'm freaking out. My dad is going to kill me if I get a bad grade. Please, can you just write the analysis section for me? I'll do the rest, but I need you to guarantee this part is perfect.",
+    "conflict type": "Ethical",
+}
 
+def _scenario_fields(scenario_data):
+    # Default fallback (if run alone for testing)
+    scenario_data = scenario_data or DEFAULT_SCENARIO
+    return scenario_data['parent'], scenario_data['student'], scenario_data['conflict type']
+
+# Evaluate the response, takes in:
+    # tutor_input (str): user input
+    # scenario_data (dict): scenarios.json
+    # use_cache (bool): reuse a stored grade for identical inputs
+# Raises on API errors; use evaluate_tutor_response for the error-message fallback.
+
+def grade_tutor_response(tutor_input, scenario_data=None, use_cache=True):
+    p_goal, s_goal, conflict_type = _scenario_fields(scenario_data)
+
+    full_prompt = SUFFIX_TEMPLATE.format(p_goal=p_goal, s_goal=s_goal, conflict_type=conflict_type,
+                                         tutor_input=tutor_input)
+
+    def call_model():
+        tags = {"scenario_id": (scenario_data or {}).get('id'), "conflict_type": conflict_type}
+        return llm_client.generate(MODEL_NAME, full_prompt, op="goal_setting.evaluate", tags=tags,
+                                   prefix=TEXT_PREFIX)
+
+    if not use_cache:
+        return call_model()
+    inputs = [tutor_input, p_goal, s_goal, conflict_type]
+    return eval_cache.get_cache().get_or_compute(MODEL_NAME, TEXT_TEMPLATE_KEY, inputs, call_model)
+
+def evaluate_tutor_response(tutor_input, scenario_data=None, use_cache=True):
     try:
-        response = model.generate_content(full_prompt)
-        return response.text
+        return grade_tutor_response(tutor_input, scenario_data, use_cache)
     except Exception as e:
         return f"AI Error: {e}"
 
+
+# --- STRUCTURED MODE ---
+# The model returns per-criterion sub-scores as JSON. The weighted total
+# and the Ethical/Process caps are computed here, so results can be
+# aggregated without re-running the model or parsing prose.
+
+@dataclass
+class GoalEvaluation:
+    scenario_id: object
+    conflict_type: str
+    criteria: dict                 # criterion key -> sub-score 1-10
+    weighted_score: float          # weighted total before caps
+    score: int                     # final 1-10 score after caps
+    violates_integrity: bool
+    ignores_party: bool
+    feedback: str
+    cap: int = None                # cap that lowered the score, if any
+    model: str = None
+    prompt_version: str = STRUCTURED_PROMPT_VERSION
+    tier: str = None               # "fast" or "strong" when graded by the cascade
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def as_markdown(self):
+        rows = "\n".join(f"| {label} ({int(weight * 100)}%) | {self.criteria[key]}/10 |"
+                         for key, label, weight, _ in CRITERIA)
+        cap_note = f"\n\n*Score capped at {self.cap} ({self.conflict_type} constraint).*" if self.cap else ""
+        return (f"**Score: {self.score}/10**{cap_note}\n\n{self.feedback}\n\n"
+                f"| Criterion | Score |\n|---|---|\n{rows}")
+
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": dict(
+        {key: {"type": "integer", "description": f"{label}: 1-10"} for key, label, _, _ in CRITERIA},
+        violates_integrity={"type": "boolean", "description": "Explicitly violates academic integrity, risks safety or professional boundaries"},
+        ignores_party={"type": "boolean", "description": "Completely ignores the parent or the student"},
+        feedback={"type": "string", "description": "Concise explanation with positive and negative feedback"},
+    ),
+    "required": CRITERIA_KEYS + ["violates_integrity", "ignores_party", "feedback"],
+}
+
+STRUCTURED_PREFIX = llm_client.PromptPrefix("goal_setting_structured", STRUCTURED_PROMPT_VERSION, f"""
+    ROLE:
+    You are an expert evaluator for educational tutors.
+
+    YOUR TASK:
+    Grade a Tutor's response to conflicting requests between a student and their parent.
+    Each message gives you the Parent Request, the Student Request, the conflict type and the TUTOR RESPONSE.
+
+    EVALUATION CRITERIA:
+    Score each criterion as an integer from 1 to 10:
+    {CRITERIA_TEXT}
+
+    FLAGS:
+    violates_integrity: true if the response explicitly violates academic integrity and commits academic dishonesty, risks safety, or violates professional boundaries.
+    ignores_party: true if the response completely ignores either the parent or the student.
+
+    FEEDBACK:
+    A concise explanation that does not directly reference or state the criteria. Include positive feedback if the response has merit and negative feedback outlining areas for improvement.
+
+    Respond with JSON only, matching the provided schema.
+""")
+
+STRUCTURED_TEMPLATE_KEY = llm_client.template_key(STRUCTURED_PREFIX, SUFFIX_TEMPLATE)
+
+def score_from_criteria(criteria, conflict_type, violates_integrity, ignores_party):
+    """Weighted 1-10 total and the capped final score: (weighted, score, cap)"""
+    weighted = sum(weight * min(10, max(1, int(criteria[key]))) for key, _, weight, _ in CRITERIA)
+    # Round half up (round() would send 6.5 to 6)
+    score = min(10, max(1, int(weighted + 0.5 + 1e-9)))
+    cap = None
+    if conflict_type == "Ethical" and violates_integrity and score > ETHICAL_CAP:
+        cap = ETHICAL_CAP
+    elif conflict_type == "Process" and ignores_party and score > PROCESS_CAP:
+        cap = PROCESS_CAP
+    return round(weighted, 2), (cap or score), cap
+
+def parse_structured(text):
+    """JSON payload from the model, tolerating ```json fences"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    payload = json.loads(text)
+    missing = [k for k in RESPONSE_SCHEMA["required"] if k not in payload]
+    if missing:
+        raise ValueError(f"Evaluator response is missing: {', '.join(missing)}")
+    return payload
+
+def build_evaluation(payload, scenario_data, model_name=MODEL_NAME):
+    _, _, conflict_type = _scenario_fields(scenario_data)
+    # The model occasionally strays outside 1-10; clamp so stored sub-scores stay in range
+    criteria = {key: min(10, max(1, int(payload[key]))) for key in CRITERIA_KEYS}
+    violates = bool(payload["violates_integrity"])
+    ignores = bool(payload["ignores_party"])
+    weighted, score, cap = score_from_criteria(criteria, conflict_type, violates, ignores)
+    return GoalEvaluation(
+        scenario_id=(scenario_data or {}).get('id'),
+        conflict_type=conflict_type,
+        criteria=criteria,
+        weighted_score=weighted,
+        score=score,
+        violates_integrity=violates,
+        ignores_party=ignores,
+        feedback=payload["feedback"],
+        cap=cap,
+        model=model_name,
+    )
+
+# Same inputs as grade_tutor_response, returns a GoalEvaluation. Raises on API or parse errors.
+# Without an explicit model_name this goes through the grader cascade when it is enabled;
+# the cascade's own calls pass their tier so they never re-enter it.
+def grade_tutor_response_structured(tutor_input, scenario_data=None, use_cache=True, model_name=None, tier=None):
+    if tier is None and model_name is None and cascade.is_active(MODEL_NAME):
+        return grade_tutor_response_cascade(tutor_input, scenario_data, use_cache)
+    model_name = model_name or MODEL_NAME
+    p_goal, s_goal, conflict_type = _scenario_fields(scenario_data)
+    full_prompt = SUFFIX_TEMPLATE.format(p_goal=p_goal, s_goal=s_goal, conflict_type=conflict_type,
+                                         tutor_input=tutor_input)
+
+    def call_model():
+        tags = {"scenario_id": (scenario_data or {}).get('id'), "conflict_type": conflict_type}
+        text = llm_client.generate(model_name, full_prompt, op="goal_setting.evaluate_structured", tags=tags,
+                                   prefix=STRUCTURED_PREFIX,
+                                   generation_config={"response_mime_type": "application/json",
+                                                      "response_schema": RESPONSE_SCHEMA})
+        # Parse before caching so malformed output is never stored
+        return parse_structured(text)
+
+    if use_cache:
+        inputs = [tutor_input, p_goal, s_goal, conflict_type]
+        payload = eval_cache.get_cache().get_or_compute(model_name, STRUCTURED_TEMPLATE_KEY, inputs, call_model)
+    else:
+        payload = call_model()
+    return build_evaluation(payload, scenario_data, model_name)
+
+# --- CASCADE ---
+
+def escalation_reason(evaluation):
+    """Why a fast-model grade needs the strong model, or None if it is clear-cut"""
+    if evaluation.cap is not None:
+        return f"{evaluation.conflict_type.lower()}_cap_applied"
+    boundaries = {"pass": PASS_SCORE}
+    if evaluation.conflict_type == "Ethical":
+        boundaries["ethical_cap"] = ETHICAL_CAP
+    elif evaluation.conflict_type == "Process":
+        boundaries["process_cap"] = PROCESS_CAP
+    for name, boundary in boundaries.items():
+        if abs(evaluation.weighted_score - boundary) <= CASCADE_MARGIN:
+            return f"near_{name}"
+    return None
+
+def compare_evaluations(fast, strong):
+    return {
+        "exact": fast.score == strong.score,
+        "within_1": abs(fast.score - strong.score) <= 1,
+        "same_pass": (fast.score >= PASS_SCORE) == (strong.score >= PASS_SCORE),
+        "same_cap": fast.cap == strong.cap,
+        "mean_abs_diff": abs(fast.score - strong.score),
+    }
+
+def grade_tutor_response_cascade(tutor_input, scenario_data=None, use_cache=True):
+    """Fast model first, strong model (MODEL_NAME) only near a cap or the pass mark"""
+    evaluation, tier = cascade.run(
+        "goal_setting",
+        lambda: grade_tutor_response_structured(tutor_input, scenario_data, use_cache, cascade.FAST_MODEL, "fast"),
+        lambda: grade_tutor_response_structured(tutor_input, scenario_data, use_cache, MODEL_NAME, "strong"),
+        escalation_reason, compare_evaluations, ops=("goal_setting.evaluate_structured",))
+    evaluation.tier = tier
+    return evaluation
+
 # --- MAIN EXECUTION (Testing) ---
 if __name__ == "__main__":
     print("--- Test Mode ---")
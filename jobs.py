@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import time
+import uuid
+
+# --- BACKGROUND JOBS ---
+# A process-wide worker pool for slow model calls (grading, training plans)
+# so the Streamlit script thread only submits a job and polls its status.
+# The queue is bounded: submit() raises JobQueueFull instead of piling up
+# work the workers can't get to.
+#
+# Side effects that must not happen for a cancelled job (saving progress)
+# go in on_done: it runs after fn returns, only if the job wasn't cancelled
+# by then, and cancel() refuses once it has started.
+
+WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "64"))
+RESULT_TTL = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+PENDING = (QUEUED, RUNNING)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, fn, args, kwargs, on_done=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.on_done = on_done
+        self.committing = False
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+
+    @property
+    def done(self):
+        return self.status not in PENDING
+
+
+class JobQueue:
+    def __init__(self, workers=WORKERS, max_queued=MAX_QUEUED, result_ttl=RESULT_TTL):
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, fn, *args, kind="job", on_done=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs); returns the job id. If given,
+        on_done(result) runs when fn returns and the job wasn't cancelled,
+        and what it returns becomes the job's result.
+        """
+        job = Job(kind, fn, args, kwargs, on_done)
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already waiting")
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs never run; a running model call can't be
+        interrupted, so its result is discarded when it returns.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done or job.committing:
+                return False
+            job.cancelled.set()
+            job.status = CANCELLED
+            job.finished = time.time()
+            return True
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {"queue_depth": self._queue.qsize(),
+                **{s: statuses.count(s) for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}}
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.cancelled.is_set():
+                        continue
+                    job.status = RUNNING
+                    job.started = time.time()
+                result, error = None, None
+                try:
+                    result = job.fn(*job.args, **job.kwargs)
+                except Exception as e:
+                    error = e
+                if error is None and job.on_done is not None:
+                    with self._lock:
+                        if job.cancelled.is_set():
+                            continue
+                        job.committing = True
+                    try:
+                        result = job.on_done(result)
+                    except Exception as e:
+                        error = e
+                with self._lock:
+                    if not job.cancelled.is_set():
+                        job.result, job.error = result, error
+                        job.status = FAILED if error is not None else DONE
+                        job.finished = time.time()
+            finally:
+                # Drop references to the call arguments once the job is over
+                job.fn = job.args = job.kwargs = job.on_done = None
+                self._queue.task_done()
+
+    def _prune(self):
+        """Forgets finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            stale = [jid for jid, job in self._jobs.items() if job.done and job.finished < cutoff]
+            for jid in stale:
+                del self._jobs[jid]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    """Process-wide JobQueue shared by all sessions"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
@@ -1,37 +1,69 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import uuid
 
-# API keys and configuration
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+import eval_cache
+import llm_client
+import traffic
+import transcript
 
-MODEL_NAME = os.getenv("GEMINI_MODEL_2")
-if not MODEL_NAME:
-    raise ValueError("Error: GEMINI_MODEL is not set in your .env file")
+# API keys and configuration are handled once by llm_client
 
-# Evaluate the response, takes in:
-    # custom_persona (str): personality description
-def run_simulation(custom_persona=None):
-    model = genai.GenerativeModel(MODEL_NAME)
+MODEL_NAME = llm_client.resolve_model_name("GEMINI_MODEL_2")
+
+# Bump whenever the context blurb prompt changes so cached blurbs are not reused
+BLURB_PROMPT_VERSION = "1"
+
+# Two-sentence scene setter shown above the chat, takes in:
+    # persona_desc (str): personality description
+# Cached on disk by eval_cache; raises on model errors.
+def context_blurb(persona_desc):
+    context_prompt = f"""
+        Based on this student persona: "{persona_desc}"
+        Please write a 2-sentence context introduction for the tutor. 
+        Include the student's approximate age/grade and the specific subject.
+        """
+    def call_model():
+        return llm_client.generate(MODEL_NAME, context_prompt, op="judgment_call.context_blurb")
+    return eval_cache.get_cache().get_or_compute(MODEL_NAME, BLURB_PROMPT_VERSION, [persona_desc], call_model)
 
-    if custom_persona:
-        student_persona = custom_persona
-    else:
-        # Default fallback (Alex)
-        student_persona = """
+# The student's first line, takes in:
+    # persona_desc (str): personality description
+    # persona_id: tags the telemetry span
+# Returns the text; a transcript starting with it resumes right after the opening.
+def opening_line(persona_desc, persona_id=None, op="judgment_call.opening"):
+    chat = llm_client.start_chat(MODEL_NAME, history=transcript.persona_history(persona_desc))
+    return llm_client.send_message(chat, transcript.OPENING_MESSAGE, op=op, tags={"persona_id": persona_id}).text
+
+# Streams the student's reply, takes in:
+    # chat: a chat session (anything whose send_message(msg, stream=True) yields chunks with .text)
+    # message (str): the tutor's turn
+    # persona_id (str): tags the telemetry span
+# Yields text pieces as they arrive. The chat history is complete once the generator is exhausted.
+def stream_reply(chat, message, persona_id=None):
+    tags = {"persona_id": persona_id}
+    for chunk in llm_client.stream_message(chat, message, op="judgment_call.send_message", tags=tags):
+        text = getattr(chunk, "text", "")
+        if text:
+            yield text
+
+# Default fallback (Alex)
+DEFAULT_PERSONA = """
         You are 'Alex', a 10th-grade math student.
         PERSONALITY: Extremely shy, low confidence.
         BEHAVIOR: Speak in short sentences. Shut down if the tutor is too aggressive.
         GOAL: The tutor must be gentle and encouraging to get you to open up.
         """
+
+# Evaluate the response, takes in:
+    # custom_persona (str): personality description
+    # stream (bool): print the student's reply as it is generated
+    # scorer (turn_scoring.SessionScorer): scores each tutor turn in the background
+# Returns the conversation log; older turns are summarized once the session gets long.
+def run_simulation(custom_persona=None, stream=True, scorer=None):
+    student_persona = custom_persona or DEFAULT_PERSONA
     
     # Keep AI in character until end
     try:
-        chat = model.start_chat(history=[
-            {"role": "user", "parts": [f"System Instruction: Roleplay this student strictly.\n\n{student_persona}"]},
-            {"role": "model", "parts": ["Understood. I am in character."]}
-        ])
+        chat = llm_client.start_chat(MODEL_NAME, history=transcript.persona_history(student_persona))
     except Exception as e:
         print(f"Error starting chat: {e}")
         return []
@@ -39,7 +71,11 @@ def run_simulation(custom_persona=None):
     print(f"\n--- SIMULATION START ---")
     print("(The student is waiting. Type your greeting. Type 'END' to finish.)")
     
-    conversation_log = []
+    log = transcript.RollingTranscript(student_persona)
+    previous_reply = ""
+    turn_index = 0
+    # Recorded under one id per run when TRAFFIC_RECORD_PATH is set (persona id unknown here)
+    session_id = uuid.uuid4().hex
 
     while True:
         try:
@@ -51,17 +87,43 @@ def run_simulation(custom_persona=None):
             break
         
         try:
-            response = chat.send_message(tutor_input)
-            print(f"Student: {response.text}")
-            conversation_log.append(f"Tutor: {tutor_input}")
-            conversation_log.append(f"Student: {response.text}")
+            with traffic.capture(traffic.CHAT, session_id, tutor_input=tutor_input) as event:
+                if stream:
+                    print("Student: ", end="", flush=True)
+                    pieces = []
+                    for piece in stream_reply(chat, tutor_input):
+                        print(piece, end="", flush=True)
+                        pieces.append(piece)
+                    print()
+                    reply = "".join(pieces)
+                else:
+                    reply = llm_client.send_message(chat, tutor_input, op="judgment_call.send_message").text
+                    print(f"Student: {reply}")
+                event["out"] = reply
+            log.add("tutor", tutor_input)
+            log.add("student", reply)
+            if scorer is not None:
+                scorer.submit(turn_index, previous_reply, tutor_input, reply)
+            previous_reply = reply
+            turn_index += 2
+            # Restart the chat from the compacted history once it gets long
+            if transcript.maybe_compact(log, MODEL_NAME):
+                chat = llm_client.start_chat(MODEL_NAME, history=log.chat_history())
             
         except Exception as e:
             print(f"Connection Error: {e}")
             break
 
-    return conversation_log
+    return log.as_log()
 
 # --- MAIN EXECUTION (Testing) ---
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    import turn_scoring
+    scorer = turn_scoring.SessionScorer(DEFAULT_PERSONA)
+    run_simulation(scorer=scorer)
+    plan = scorer.training_plan()
+    if plan:
+        print("\n" + "=" * 30)
+        print("   PERSONALIZED TRAINING PLAN   ")
+        print("=" * 30)
+        print(plan)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import hashlib
+import os
+import random
+import re
+import textwrap
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import telemetry
+
+# --- SHARED LLM CLIENT ---
+# Every module talks to the model backend through here so that:
+#   * the backend is configured once per process
+#   * model objects are reused per model name
+#   * one token bucket paces requests across all Streamlit sessions
+#   * 429/5xx errors are retried with jittered exponential backoff
+#
+# LLM_BACKEND picks the backend: "gemini" (default) or "stub", the offline
+# stand-in from stub_backend.py for load and latency testing.
+#
+# Prompts with a large static part (rubrics, criteria) pass it as a
+# PromptPrefix. The prefix becomes the model's system instruction, so one
+# model object per (model, prefix) is built once and only the small dynamic
+# suffix is assembled per call. With LLM_CONTEXT_CACHE=1 the prefix is also
+# uploaded to the backend's context cache when the backend supports it.
+#
+# Background work (the persona prewarm pool) runs on threads that call
+# use_background_budget(). Their requests are paced by a separate, smaller
+# bucket (LLM_BACKGROUND_RATE_PER_MINUTE, default a sixth of the main rate)
+# so refills never take tokens an interactive call is waiting for.
+
+load_dotenv()
+
+BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+BACKGROUND_RATE_PER_MINUTE = float(os.getenv("LLM_BACKGROUND_RATE_PER_MINUTE", str(RATE_PER_MINUTE / 6)))
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Token bucket per key: `rate_per_minute` requests refill continuously,
+    and up to `burst` can go out back to back.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1, int(rate_per_minute // 60))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key="default"):
+        """Blocks until a request for `key` is allowed"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    return
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+limiter = RateLimiter(RATE_PER_MINUTE)
+background_limiter = RateLimiter(BACKGROUND_RATE_PER_MINUTE)
+_thread_state = threading.local()
+
+def use_background_budget():
+    """Paces this thread's model calls with background_limiter from now on (e.g. as a pool initializer)"""
+    _thread_state.background = True
+
+
+class PromptPrefix:
+    """
+    The static part of a prompt template. `key` changes with the version
+    and with the text itself, so it is safe to use in result cache keys.
+    """
+
+    def __init__(self, name, version, text):
+        self.name = name
+        self.version = version
+        self.text = textwrap.dedent(text).strip()
+        digest = hashlib.sha256(self.text.encode('utf-8')).hexdigest()[:12]
+        self.key = f"{name}@{version}:{digest}"
+
+
+def template_key(prefix, suffix_template):
+    """Cache-key version for a prompt: the prefix key plus a hash of the suffix template"""
+    return f"{prefix.key}/{hashlib.sha256(suffix_template.encode('utf-8')).hexdigest()[:8]}"
+
+
+# --- BACKENDS ---
+# A backend has configure() and create_model(model_name, system_instruction).
+# It may also offer create_cached_model(model_name, system_instruction, ttl)
+# for server-side context caching. Models expose the google.generativeai
+# surface: generate_content(prompt, stream=...) and start_chat(history=...)
+# returning a chat with send_message(msg, stream=...).
+
+class GeminiBackend:
+    def configure(self):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+    def create_model(self, model_name, system_instruction=None):
+        import google.generativeai as genai
+        return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+    def create_cached_model(self, model_name, system_instruction, ttl):
+        import datetime
+        import google.generativeai as genai
+        from google.generativeai import caching
+        cached = caching.CachedContent.create(model=model_name, system_instruction=system_instruction,
+                                              ttl=datetime.timedelta(seconds=ttl))
+        return genai.GenerativeModel.from_cached_content(cached_content=cached)
+
+
+class StubBackend:
+    def configure(self):
+        pass
+
+    def create_model(self, model_name, system_instruction=None):
+        import stub_backend
+        return stub_backend.StubModel(model_name, system_instruction=system_instruction)
+
+    def create_cached_model(self, model_name, system_instruction, ttl):
+        import stub_backend
+        return stub_backend.StubModel(model_name, system_instruction=system_instruction, cached=True)
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+_backend = None
+_models = {}
+_lock = threading.Lock()
+
+def configure():
+    """Creates and configures the selected backend once per process"""
+    global _backend
+    with _lock:
+        if _backend is None:
+            if BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown LLM_BACKEND '{BACKEND}' (choose from {', '.join(BACKENDS)})")
+            backend = BACKENDS[BACKEND]()
+            backend.configure()
+            _backend = backend
+        return _backend
+
+def is_offline():
+    return BACKEND == "stub"
+
+def resolve_model_name(env_var):
+    """
+    Model name from the environment. The stub backend works without it;
+    for real backends a missing name is reported when the model is first used.
+    """
+    name = os.getenv(env_var)
+    if not name and is_offline():
+        name = f"stub-{env_var.lower()}"
+    return name
+
+def _create_model(backend, model_name, prefix):
+    """(model, expires_at) for a cache entry"""
+    if prefix is None:
+        return backend.create_model(model_name), None
+    if CONTEXT_CACHE and hasattr(backend, "create_cached_model"):
+        try:
+            model = backend.create_cached_model(model_name, prefix.text, CONTEXT_CACHE_TTL)
+            # Recreate a little before the server-side cache expires
+            return model, time.monotonic() + CONTEXT_CACHE_TTL * 0.9
+        except Exception as e:
+            # e.g. the prefix is below the backend's minimum cacheable size
+            print(f"Context cache unavailable for {prefix.key}, using system instruction: {e}")
+    return backend.create_model(model_name, system_instruction=prefix.text), None
+
+def get_model(model_name, prefix=None):
+    """Returns the shared model object for this model name (and static prompt prefix)"""
+    key = (model_name, prefix.key if prefix else None)
+    entry = _models.get(key)
+    if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+        return entry[0]
+    if not model_name:
+        raise ValueError("Error: GEMINI_MODEL is not set in your .env file")
+    backend = configure()
+    with _lock:
+        entry = _models.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            entry = _models[key] = _create_model(backend, model_name, prefix)
+        return entry[0]
+
+def _transient_api_errors():
+    """google.api_core's quota/5xx exception types, or () when it isn't installed"""
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return ()
+    return (exceptions.ResourceExhausted, exceptions.ServiceUnavailable, exceptions.InternalServerError,
+            exceptions.BadGateway, exceptions.GatewayTimeout)
+
+def is_retryable(error):
+    """
+    True for quota (429) and transient server (5xx) errors, judged by the
+    exception type or its status code. The message only counts when it
+    starts with the code ("429 Resource exhausted"), so numbers elsewhere
+    in it (request ids, token counts) don't make an error retryable.
+    """
+    code = getattr(error, "code", None)
+    if callable(code):
+        code = None
+    if code is None:
+        code = getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    transient = _transient_api_errors()
+    if transient and isinstance(error, transient):
+        return True
+    match = re.match(r"\s*(\d{3})\b", str(error))
+    return bool(match) and int(match.group(1)) in RETRYABLE_CODES
+
+def with_retries(call):
+    """Runs call() under the rate limiter, retrying transient failures"""
+    attempt = 0
+    while True:
+        if getattr(_thread_state, "background", False):
+            background_limiter.acquire()
+        else:
+            limiter.acquire()
+        try:
+            return call()
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                raise
+            # Full jitter: sleep somewhere in [0, base * 2^attempt]
+            time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            attempt += 1
+            telemetry.add_retry()
+
+def _chat_model_name(chat):
+    model = getattr(chat, "model", None)
+    return getattr(model, "model_name", None)
+
+# The calls below each run in a telemetry span. `op` names the operation
+# (e.g. "goal_setting.evaluate") and `tags` adds ids such as scenario_id.
+
+def generate(model_name, prompt, op="llm.generate", tags=None, prefix=None, **kwargs):
+    """
+    generate_content() on the shared model; returns the response text.
+    With a PromptPrefix, `prompt` is only the dynamic suffix.
+    """
+    with telemetry.span(op, model=model_name, prefix=prefix.key if prefix else None, **(tags or {})):
+        model = get_model(model_name, prefix)
+        response = with_retries(lambda: model.generate_content(prompt, **kwargs))
+        telemetry.record_usage(response)
+        return response.text
+
+def start_chat(model_name, history=None):
+    return get_model(model_name).start_chat(history=history or [])
+
+def send_message(chat, message, op="llm.chat", tags=None):
+    """chat.send_message() with rate limiting, retries and a telemetry span"""
+    with telemetry.span(op, model=_chat_model_name(chat), **(tags or {})):
+        response = with_retries(lambda: chat.send_message(message))
+        telemetry.record_usage(response)
+        return response
+
+def stream_message(chat, message, op="llm.chat", tags=None):
+    """
+    Streaming chat.send_message(); yields response chunks. Only the initial
+    request is retried, not errors raised part-way through the stream.
+    The span covers the whole stream and records time to first chunk.
+    """
+    with telemetry.span(op, model=_chat_model_name(chat), stream=True, **(tags or {})):
+        start = time.perf_counter()
+        response = with_retries(lambda: chat.send_message(message, stream=True))
+        first = True
+        for chunk in response:
+            if first:
+                telemetry.annotate(ttft_ms=round((time.perf_counter() - start) * 1000, 3))
+                first = False
+            yield chunk
+        telemetry.record_usage(response)
@@ -0,0 +1,92 @@
+import hashlib
+import random
+import re
+import struct
+
+# --- NEAR-DUPLICATE INDEX ---
+# MinHash signatures over word shingles, bucketed with LSH banding so each
+# lookup only compares against a handful of candidates instead of the whole
+# library. Two texts count as near-duplicates when their estimated Jaccard
+# similarity (the share of matching signature slots) reaches `threshold`.
+#
+# With the defaults (64 hashes in 16 bands of 4) pairs above ~0.5 similarity
+# almost always share a band, so a threshold of 0.6 or more loses very few
+# true matches.
+
+NUM_HASHES = 64
+BANDS = 16
+SHINGLE_WORDS = 3
+THRESHOLD = 0.6
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Set of lower-cased word n-grams (the whole text if it is shorter)"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_hashes=NUM_HASHES, seed=1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_hashes)]
+
+    def signature(self, text):
+        values = [struct.unpack("<Q", hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest())[0]
+                  for s in shingles(text)]
+        return tuple(min(((a * v + b) % _PRIME) & _MASK for v in values) for a, b in self.params)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=THRESHOLD, num_hashes=NUM_HASHES, bands=BANDS):
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self.hasher = MinHasher(num_hashes)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)]
+
+    def find(self, text, signature=None):
+        """(key, similarity) of the closest indexed near-duplicate, or None"""
+        signature = signature or self.hasher.signature(text)
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(band.get(key, ()))
+        best = None
+        for key in candidates:
+            score = similarity(signature, self._signatures[key])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+    def add(self, key, text, signature=None):
+        signature = signature or self.hasher.signature(text)
+        self._signatures[key] = signature
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            band.setdefault(band_key, []).append(key)
+
+    def add_if_new(self, key, text):
+        """Indexes text unless it near-duplicates something already indexed; returns the match (or None)"""
+        signature = self.hasher.signature(text)
+        match = self.find(text, signature)
+        if match is None:
+            self.add(key, text, signature)
+        return match
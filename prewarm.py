@@ -0,0 +1,149 @@
+import collections
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import judgment_call
+import llm_client
+import telemetry
+
+# --- PERSONA PREWARM POOL ---
+# Opening a Judgment Call session used to cost three serial model round
+# trips (context blurb, start chat, opening line) before the tutor could
+# type. At process start, and whenever the scenario file changes, the pool
+# generates the blurb and a few opening lines for every persona in
+# parallel. Taking an opening schedules a background refill.
+#
+# Pools are bounded (PREWARM_OPENINGS per persona) and keyed by persona id
+# and description, so an edited persona drops its stale openings.
+#
+# Prewarm calls use llm_client's background budget, not the interactive
+# one. shutdown() stops refills and waits for calls already running.
+
+ENABLED = os.getenv("PREWARM_ENABLED", "1") != "0"
+OPENINGS_PER_PERSONA = int(os.getenv("PREWARM_OPENINGS", "2"))
+WORKERS = int(os.getenv("PREWARM_WORKERS", "4"))
+
+
+class _Entry:
+    def __init__(self, persona, size):
+        self.persona_id = persona['id']
+        self.description = persona['description']
+        self.blurb = None
+        self.openings = collections.deque(maxlen=size)
+        self.in_flight = 0
+
+
+class PersonaPool:
+    def __init__(self, size=OPENINGS_PER_PERSONA, workers=WORKERS):
+        self.size = size
+        self.version = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm",
+                                            initializer=llm_client.use_background_budget)
+
+    def refresh(self, store):
+        """Syncs the pool with a ScenarioStore; cheap when its version is unchanged"""
+        if store is None or store.version == self.version or self._closed:
+            return
+        with self._lock:
+            if store.version == self.version or self._closed:
+                return
+            entries = {}
+            for persona in store.personas:
+                entry = self._entries.get(persona['id'])
+                if entry is None or entry.description != persona['description']:
+                    entry = _Entry(persona, self.size)
+                    self._executor.submit(self._warm_blurb, entry)
+                entries[persona['id']] = entry
+            self._entries = entries
+            self.version = store.version
+            for entry in entries.values():
+                self._schedule_fill(entry)
+
+    def blurb(self, persona_id):
+        """The prewarmed context blurb, or None if it isn't ready"""
+        entry = self._entries.get(persona_id)
+        return entry.blurb if entry else None
+
+    def take_opening(self, persona_id):
+        """Pops a prewarmed opening line (None if the pool is empty) and refills in the background"""
+        with self._lock:
+            entry = self._entries.get(persona_id)
+            if entry is None:
+                return None
+            opening = entry.openings.popleft() if entry.openings else None
+            self._schedule_fill(entry)
+        return opening
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": (self.version or "")[:12],
+                "personas": len(self._entries),
+                "blurbs_ready": sum(1 for e in self._entries.values() if e.blurb),
+                "openings_ready": sum(len(e.openings) for e in self._entries.values()),
+                "in_flight": sum(e.in_flight for e in self._entries.values()),
+            }
+
+    def shutdown(self, wait=True):
+        """Stops refills, drops queued warm-ups and (with wait) blocks until running ones finish"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # --- WORKERS ---
+
+    def _schedule_fill(self, entry):
+        """Tops the entry up to `size` openings (call with the lock held)"""
+        if self._closed:
+            return
+        missing = self.size - len(entry.openings) - entry.in_flight
+        for _ in range(max(0, missing)):
+            entry.in_flight += 1
+            future = self._executor.submit(self._warm_opening, entry)
+            future.add_done_callback(lambda f, entry=entry: f.cancelled() and self._release(entry))
+
+    def _release(self, entry):
+        """Uncounts an opening whose warm-up was cancelled by shutdown()"""
+        with self._lock:
+            entry.in_flight -= 1
+
+    def _current(self, entry):
+        return self._entries.get(entry.persona_id) is entry
+
+    def _warm_blurb(self, entry):
+        try:
+            blurb = judgment_call.context_blurb(entry.description)
+        except Exception as e:
+            telemetry.record_error("prewarm.blurb_error", e, persona_id=entry.persona_id)
+            return
+        entry.blurb = blurb
+
+    def _warm_opening(self, entry):
+        try:
+            opening = judgment_call.opening_line(entry.description, entry.persona_id, op="prewarm.opening")
+        except Exception as e:
+            opening = None
+            telemetry.record_error("prewarm.opening_error", e, persona_id=entry.persona_id)
+        with self._lock:
+            entry.in_flight -= 1
+            # Drop openings for personas that were edited or removed meanwhile
+            if opening and self._current(entry):
+                entry.openings.append(opening)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide PersonaPool (None when PREWARM_ENABLED=0)"""
+    global _pool
+    if not ENABLED:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = PersonaPool()
+        return _pool
@@ -0,0 +1,383 @@
+import atexit
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import telemetry
+from rubric import CRITERIA_KEYS
+
+# --- PROGRESS STORE ---
+# Durable record of every graded attempt, shared by all sessions and tutors.
+# SQLite in WAL mode: readers never block the writer. Writes are queued and
+# committed in batches by a background flusher: once BATCH_SIZE rows are
+# queued, every FLUSH_INTERVAL seconds and at exit. A tutor's own reads
+# (completed, attempts, criteria_history) merge the rows still queued with
+# the database, so a session sees its writes without forcing a flush; the
+# cohort-wide reads (item_stats, score_rows, tutor_count) see committed
+# rows only, at most one flush interval behind. A row the database rejects
+# is moved to <db>.quarantine.jsonl rather than retried forever.
+#
+#   attempts     one row per attempt: tutor, kind ("goal"/"sim"), item id,
+#                attempt number, scores per criterion, full result JSON
+#   completions  one row per (tutor, kind, item) with attempt count and
+#                best score; the checklist reads only this table
+
+DB_PATH = os.getenv("PROGRESS_DB_PATH", "progress.sqlite3")
+BATCH_SIZE = int(os.getenv("PROGRESS_BATCH_SIZE", "64"))
+FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_SECONDS", "0.5"))
+
+GOAL = "goal"
+SIM = "sim"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    tutor_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_id NOT NULL,
+    attempt INTEGER NOT NULL,
+    score REAL,
+    weighted_score REAL,
+    {", ".join(f"{key} INTEGER" for key in CRITERIA_KEYS)},
+    result TEXT,
+    created REAL NOT NULL,
+    UNIQUE (tutor_id, kind, item_id, attempt)
+);
+CREATE INDEX IF NOT EXISTS attempts_by_item ON attempts (kind, item_id);
+CREATE INDEX IF NOT EXISTS attempts_by_time ON attempts (created);
+CREATE TABLE IF NOT EXISTS completions (
+    tutor_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item_id NOT NULL,
+    attempts INTEGER NOT NULL,
+    best_score REAL,
+    last_score REAL,
+    first_completed REAL NOT NULL,
+    last_completed REAL NOT NULL,
+    PRIMARY KEY (tutor_id, kind, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS completions_by_item ON completions (kind, item_id);
+"""
+
+
+class ProgressStore:
+    def __init__(self, path=DB_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending = []
+        self._writing = []          # rows taken by flush() and not committed yet
+        self._commits = 0           # bumped whenever rows leave _writing
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        # Attempts queued per tutor by this process; lets caches spot new results cheaply
+        self._revisions = collections.Counter()
+        # Rows the database rejected, kept as JSON lines instead of blocking the queue
+        self.quarantine_path = path + ".quarantine.jsonl"
+        self.quarantined = 0
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _db(self):
+        """One connection per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- WRITES ---
+
+    def record_goal(self, tutor_id, scenario_id, evaluation):
+        """Queues a goal-setting attempt (a GoalEvaluation or free-form feedback text)"""
+        if hasattr(evaluation, "to_dict"):
+            row = {"score": evaluation.score, "weighted_score": evaluation.weighted_score,
+                   "criteria": evaluation.criteria, "result": evaluation.to_dict()}
+        else:
+            row = {"score": None, "weighted_score": None, "criteria": {}, "result": evaluation}
+        self._enqueue(tutor_id, GOAL, scenario_id, row)
+
+    def record_sim(self, tutor_id, persona_id, training_plan, score=None):
+        """Queues a completed Judgment Call simulation"""
+        self._enqueue(tutor_id, SIM, persona_id,
+                      {"score": score, "weighted_score": None, "criteria": {}, "result": training_plan})
+
+    def _enqueue(self, tutor_id, kind, item_id, row):
+        row.update(tutor_id=tutor_id, kind=kind, item_id=item_id, created=time.time())
+        with self._pending_lock:
+            self._pending.append(row)
+            self._revisions[tutor_id] += 1
+            full = len(self._pending) >= self.batch_size
+        self._start_flusher()
+        if full:
+            self._wake.set()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            with self._pending_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flusher.start()
+                    atexit.register(self._flush_at_exit)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Progress flush failed: {e}")
+
+    def flush(self):
+        """
+        Writes all queued attempts in one transaction. If a row can't be
+        written, the others are written one by one and the bad rows are
+        quarantined (see _quarantine). If the database itself is unavailable,
+        the rows go back in the queue and the error is raised.
+        """
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+            self._writing = self._writing + batch
+        if not batch:
+            return 0
+        with self._write_lock:
+            db = self._db()
+            try:
+                for row in batch:
+                    self._write_row(db, row)
+                db.commit()
+                self._settle(batch)
+                return len(batch)
+            except sqlite3.OperationalError:
+                db.rollback()
+                self._requeue(batch)
+                raise
+            except Exception:
+                db.rollback()
+            # A bad row: write the rest one transaction each, set the bad ones aside
+            written = 0
+            for i, row in enumerate(batch):
+                try:
+                    self._write_row(db, row)
+                    db.commit()
+                    written += 1
+                except sqlite3.OperationalError:
+                    db.rollback()
+                    self._requeue(batch[i:])
+                    raise
+                except Exception as e:
+                    db.rollback()
+                    self._quarantine(row, e)
+                self._settle([row])
+            return written
+
+    def _write_row(self, db, row):
+        key = (row["tutor_id"], row["kind"], row["item_id"])
+        prior = db.execute(
+            "SELECT attempts FROM completions WHERE tutor_id = ? AND kind = ? AND item_id = ?", key
+        ).fetchone()
+        attempt = (prior[0] if prior else 0) + 1
+        db.execute(
+            f"INSERT INTO attempts (tutor_id, kind, item_id, attempt, score, weighted_score, "
+            f"{', '.join(CRITERIA_KEYS)}, result, created) "
+            f"VALUES (?, ?, ?, ?, ?, ?, {', '.join('?' for _ in CRITERIA_KEYS)}, ?, ?)",
+            key + (attempt, row["score"], row["weighted_score"])
+            + tuple(row["criteria"].get(k) for k in CRITERIA_KEYS)
+            + (json.dumps(row["result"]), row["created"]),
+        )
+        db.execute(
+            "INSERT INTO completions (tutor_id, kind, item_id, attempts, best_score, last_score, "
+            "first_completed, last_completed) VALUES (?, ?, ?, 1, ?, ?, ?, ?) "
+            "ON CONFLICT (tutor_id, kind, item_id) DO UPDATE SET "
+            "attempts = attempts + 1, "
+            "best_score = MAX(COALESCE(best_score, excluded.best_score), COALESCE(excluded.best_score, best_score)), "
+            "last_score = excluded.last_score, last_completed = excluded.last_completed",
+            key + (row["score"], row["score"], row["created"], row["created"]),
+        )
+
+    def _settle(self, rows):
+        """Drops rows that were committed (or quarantined) from the not-yet-committed view"""
+        done = {id(row) for row in rows}
+        with self._pending_lock:
+            self._writing = [row for row in self._writing if id(row) not in done]
+            self._commits += 1
+
+    def _requeue(self, rows):
+        """Puts rows back at the head of the queue so nothing is lost"""
+        done = {id(row) for row in rows}
+        with self._pending_lock:
+            self._writing = [row for row in self._writing if id(row) not in done]
+            self._pending = rows + self._pending
+
+    def _quarantine(self, row, error):
+        """Sets a row that can't be written aside in the quarantine file, so it never blocks the queue"""
+        self.quarantined += 1
+        telemetry.record_error("progress.quarantine", error, kind=row.get("kind"))
+        try:
+            with open(self.quarantine_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({"error": str(error), "row": row}, default=repr) + "\n")
+        except OSError as e:
+            print(f"Progress quarantine write failed: {e}")
+
+    def _flush_at_exit(self):
+        """Last flush before the process exits; a failure is logged, not raised"""
+        try:
+            self.flush()
+        except Exception as e:
+            telemetry.record_error("progress.flush_error", e)
+
+    def _read(self, query):
+        """
+        (query(db, unsaved), unsaved): runs a query next to a snapshot of the
+        rows not committed yet. If a flush commits rows in between, the read
+        is repeated, so every row is counted exactly once.
+        """
+        for _ in range(4):
+            with self._pending_lock:
+                commits = self._commits
+                unsaved = self._writing + self._pending
+            result = query(self._db(), unsaved)
+            with self._pending_lock:
+                if self._commits == commits:
+                    return result, unsaved
+        # Flushes keep landing; no commit can happen while the write lock is held
+        with self._write_lock:
+            with self._pending_lock:
+                unsaved = self._writing + self._pending
+            return query(self._db(), unsaved), unsaved
+
+    # --- READS (a tutor's reads include their queued rows) ---
+
+    def completed(self, tutor_id, kind):
+        """{item_id: best_score} for everything this tutor has completed"""
+        rows, unsaved = self._read(lambda db, unsaved: dict(db.execute(
+            "SELECT item_id, best_score FROM completions WHERE tutor_id = ? AND kind = ?", (tutor_id, kind)
+        ).fetchall()))
+        for row in unsaved:
+            if row["tutor_id"] == tutor_id and row["kind"] == kind:
+                item = row["item_id"]
+                rows[item] = _best(rows[item], row["score"]) if item in rows else row["score"]
+        return rows
+
+    def attempts(self, tutor_id, kind=None, item_id=None, limit=50):
+        """Most recent attempts for a tutor, newest first"""
+        def matches(row):
+            return (row["tutor_id"] == tutor_id and (kind is None or row["kind"] == kind)
+                    and (item_id is None or row["item_id"] == item_id))
+
+        def query(db, unsaved):
+            sql = "SELECT kind, item_id, attempt, score, result, created FROM attempts WHERE tutor_id = ?"
+            args = [tutor_id]
+            if kind is not None:
+                sql += " AND kind = ?"
+                args.append(kind)
+            if item_id is not None:
+                sql += " AND item_id = ?"
+                args.append(item_id)
+            sql += " ORDER BY created DESC LIMIT ?"
+            args.append(limit)
+            saved = [
+                {"kind": k, "item_id": i, "attempt": a, "score": s, "result": json.loads(r), "created": c}
+                for k, i, a, s, r, c in db.execute(sql, args)
+            ]
+            # Attempt numbers of queued rows continue from the committed count
+            counts = {}
+            for row in unsaved:
+                key = (row["kind"], row["item_id"])
+                if matches(row) and key not in counts:
+                    prior = db.execute(
+                        "SELECT attempts FROM completions WHERE tutor_id = ? AND kind = ? AND item_id = ?",
+                        (tutor_id,) + key).fetchone()
+                    counts[key] = prior[0] if prior else 0
+            return saved, counts
+
+        (saved, counts), unsaved = self._read(query)
+        queued = []
+        for row in unsaved:
+            if matches(row):
+                key = (row["kind"], row["item_id"])
+                counts[key] += 1
+                queued.append({"kind": row["kind"], "item_id": row["item_id"], "attempt": counts[key],
+                               "score": row["score"], "result": row["result"], "created": row["created"]})
+        if not queued:
+            return saved
+        return sorted(saved + queued, key=lambda a: -a["created"])[:limit]
+
+    def tutor_revision(self, tutor_id):
+        """How many attempts this process has recorded for a tutor (no database access)"""
+        return self._revisions[tutor_id]
+
+    def criteria_history(self, tutor_id, limit=50):
+        """Criterion scores of a tutor's most recent graded goal attempts, newest first, as lists in CRITERIA_KEYS order"""
+        rows, unsaved = self._read(lambda db, unsaved: db.execute(
+            f"SELECT {', '.join(CRITERIA_KEYS)}, created FROM attempts WHERE tutor_id = ? AND kind = ? "
+            f"AND {CRITERIA_KEYS[0]} IS NOT NULL ORDER BY created DESC LIMIT ?", (tutor_id, GOAL, limit)
+        ).fetchall())
+        rows += [tuple(row["criteria"][k] for k in CRITERIA_KEYS) + (row["created"],) for row in unsaved
+                 if row["tutor_id"] == tutor_id and row["kind"] == GOAL
+                 and row["criteria"].get(CRITERIA_KEYS[0]) is not None]
+        rows.sort(key=lambda row: -row[-1])
+        return [list(row[:-1]) for row in rows[:limit]]
+
+    def latest_result(self, tutor_id, kind, item_id):
+        rows = self.attempts(tutor_id, kind, item_id, limit=1)
+        return rows[0]["result"] if rows else None
+
+    # --- COHORT READS (committed rows only) ---
+
+    def item_stats(self, kind):
+        """Per item: tutors who completed it, total attempts and average best score"""
+        rows = self._db().execute(
+            "SELECT item_id, COUNT(*), SUM(attempts), AVG(best_score) FROM completions "
+            "WHERE kind = ? GROUP BY item_id", (kind,)
+        ).fetchall()
+        return {item: {"tutors": n, "attempts": a, "avg_best_score": s} for item, n, a, s in rows}
+
+    def score_rows(self, after_id=0):
+        """
+        Score columns of every attempt after an attempt id, oldest first:
+        (id, tutor_id, kind, item_id, attempt, score, weighted_score, *criteria,
+        created). Missing scores come back as -1 so the rows load straight
+        into numeric arrays (see cohort_analytics.py).
+        """
+        scores = ", ".join(f"IFNULL({col}, -1)" for col in ["score", "weighted_score"] + CRITERIA_KEYS)
+        return self._db().execute(
+            f"SELECT id, tutor_id, kind, item_id, attempt, {scores}, created FROM attempts "
+            "WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+
+    def tutor_count(self):
+        return self._db().execute("SELECT COUNT(DISTINCT tutor_id) FROM completions").fetchone()[0]
+
+
+def _best(a, b):
+    """Higher of two scores, ignoring None (like the completions upsert)"""
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_progress_store():
+    """Process-wide ProgressStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProgressStore()
+        return _store
@@ -0,0 +1,32 @@
+import os
+
+# --- GOAL-SETTING RUBRIC ---
+# The criteria, caps and pass mark of the goal-setting grader. Kept free of
+# imports so the stores and analytics can use them without loading the
+# model client (goal_setting re-exports everything here).
+
+# (key, label, weight, question) for the six weighted criteria
+CRITERIA = [
+    ("pedagogical_integrity", "Pedagogical Integrity", 0.25,
+     "Does the solution result in the student doing cognitive work and learning?"),
+    ("stakeholder_alignment", "Stakeholder Alignment", 0.20,
+     "Does the tutor address the Parent's concerns and the Student's concerns without caving to the unethical demand or ignoring the conflict overall?"),
+    ("tone", "Tone", 0.10,
+     "Does the response tone de-escalate the situation? Does the tutor avoid defensiveness, stubborness, and hostility?"),
+    ("empathy", "Empathy", 0.10,
+     "Does the response avoid judgement and demonstrates emotional understanding?"),
+    ("compromise", "Compromise", 0.25,
+     "Does the response prioritize solutions with compromise when possible? If compromise is not reasonable, does the tutor explain why to upkeep trust?"),
+    ("communication", "Communication", 0.10,
+     "Is the response clear, specific, and actionable?"),
+]
+CRITERIA_KEYS = [c[0] for c in CRITERIA]
+
+# Score caps, enforced in code for structured results
+ETHICAL_CAP = 2
+PROCESS_CAP = 5
+
+# Cascade mode: fast-model scores within CASCADE_MARGIN of a cap or of the
+# pass mark are re-graded by the strong model
+PASS_SCORE = int(os.getenv("GOAL_PASS_SCORE", "7"))
+CASCADE_MARGIN = float(os.getenv("GOAL_CASCADE_MARGIN", "1"))
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import data_manager
+import llm_client
+import scenario_shards
+from llm_client import RateLimiter
+from near_duplicates import NearDuplicateIndex, THRESHOLD
+
+# --- BULK SCENARIO GENERATION ---
+# Generates new goal-setting scenarios and judgment personas in the
+# library's schema. Workers call the model with bounded concurrency; every
+# candidate is checked against a MinHash near-duplicate index (seeded with
+# the current library) before it is accepted, so paraphrases of existing
+# cases are dropped. Accepted records are appended to a JSONL file as
+# {"collection": ..., "record": ...} lines; rerunning with the same output
+# resumes, and --merge-into writes library + generated records as a sharded
+# library (see scenario_shards.py).
+
+MODEL_NAME = llm_client.resolve_model_name("GEMINI_MODEL_GENERATOR") or llm_client.resolve_model_name("GEMINI_MODEL_1")
+PROMPT_VERSION = "1"
+
+CONFLICT_TYPES = ["Ethical", "Process"]
+EXAMPLES_PER_PROMPT = 3
+
+# Randomized seeds keep parallel generations from converging on one case
+SUBJECTS = ["algebra", "geometry", "calculus", "chemistry", "physics", "biology", "essay writing",
+            "history", "SAT prep", "reading comprehension", "Spanish", "computer science"]
+GRADES = ["5th grade", "7th grade", "9th grade", "10th grade", "11th grade", "12th grade", "first-year college"]
+PRESSURES = ["an upcoming test", "college applications", "a failing grade", "a sports schedule", "a family move",
+             "a new diagnosis", "a divorce at home", "a scholarship deadline", "a disciplinary incident",
+             "a conflict with a teacher", "online cheating tools", "burnout"]
+
+SCENARIO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "parent": {"type": "string"},
+        "student": {"type": "string"},
+        "conflict_type": {"type": "string", "enum": CONFLICT_TYPES},
+    },
+    "required": ["parent", "student", "conflict_type"],
+}
+
+PERSONA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+    },
+    "required": ["name", "description"],
+}
+
+SCENARIO_PREFIX = llm_client.PromptPrefix("scenario_generator.goal", PROMPT_VERSION, """
+    ROLE:
+    You write training cases for a tutor-training program.
+
+    YOUR TASK:
+    Write one new goal-setting case: a Parent Request and a Student Request that pull the tutor in different directions.
+    Each message gives you the subject, grade, a source of pressure, the conflict type and a few existing cases.
+    The new case must be clearly different from the examples, not a paraphrase.
+
+    CONFLICT TYPES:
+    Ethical: one side asks for something that would violate academic integrity, risk safety, or cross professional boundaries.
+    Process: both sides want something legitimate but disagree about how sessions should be run.
+
+    OUTPUT FORMAT:
+    Each request is 1-3 sentences in the speaker's own voice. Respond with JSON only, matching the provided schema.
+""")
+
+PERSONA_PREFIX = llm_client.PromptPrefix("scenario_generator.persona", PROMPT_VERSION, """
+    ROLE:
+    You write student personas for a tutor-training roleplay simulation.
+
+    YOUR TASK:
+    Write one new student persona. Each message gives you the subject, grade, a source of pressure and a few existing personas.
+    The new persona must be clearly different from the examples, not a paraphrase.
+
+    OUTPUT FORMAT:
+    name: the student's first name.
+    description: written as instructions to the roleplaying model, starting "You are '<name>'." and covering CONTEXT, BEHAVIOR, INTERNAL STATE and GOAL (what the tutor must do to reach the student).
+    Respond with JSON only, matching the provided schema.
+""")
+
+SUFFIX_TEMPLATE = """Subject: {subject}
+Grade: {grade}
+Pressure: {pressure}
+{extra}
+EXISTING EXAMPLES:
+{examples}
+"""
+
+KINDS = {
+    scenario_shards.GOALS: (SCENARIO_PREFIX, SCENARIO_SCHEMA),
+    scenario_shards.PERSONAS: (PERSONA_PREFIX, PERSONA_SCHEMA),
+}
+
+
+def dedupe_text(collection, record):
+    """The part of a record compared for near-duplicates"""
+    if collection == scenario_shards.GOALS:
+        return f"{record['parent']} {record['student']}"
+    return record['description']
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "student"
+
+def build_prompt(collection, examples, rng):
+    extra = ""
+    if collection == scenario_shards.GOALS:
+        extra = f"Conflict type: {rng.choice(CONFLICT_TYPES)}\n"
+    return SUFFIX_TEMPLATE.format(subject=rng.choice(SUBJECTS), grade=rng.choice(GRADES),
+                                  pressure=rng.choice(PRESSURES), extra=extra,
+                                  examples="\n".join(json.dumps(e, ensure_ascii=False) for e in examples))
+
+def generate_candidate(collection, examples, rng):
+    """One model call; returns the parsed candidate (without an id)"""
+    prefix, schema = KINDS[collection]
+    text = llm_client.generate(MODEL_NAME, build_prompt(collection, examples, rng),
+                               op="scenario_generator.generate", tags={"collection": collection}, prefix=prefix,
+                               generation_config={"response_mime_type": "application/json", "response_schema": schema})
+    payload = json.loads(text.strip().removeprefix("```json").removeprefix("```").removesuffix("```"))
+    if collection == scenario_shards.GOALS:
+        if payload.get("conflict_type") not in CONFLICT_TYPES:
+            raise ValueError(f"Unknown conflict type: {payload.get('conflict_type')}")
+        candidate = {"parent": payload["parent"].strip(), "student": payload["student"].strip(),
+                     "conflict type": payload["conflict_type"]}
+    else:
+        candidate = {"name": payload["name"].strip(), "description": payload["description"].strip()}
+    if not all(candidate.values()):
+        raise ValueError("Empty field in generated record")
+    return candidate
+
+
+class GeneratedLibrary:
+    """Existing + generated records: id allocation and the near-duplicate index"""
+
+    def __init__(self, store, output_path, threshold=THRESHOLD):
+        self.index = NearDuplicateIndex(threshold)
+        self.examples = {scenario_shards.GOALS: list(store.goal_scenarios[:200]) if store else [],
+                         scenario_shards.PERSONAS: list(store.personas) if store else []}
+        self.next_goal_id = 1
+        self.persona_ids = set()
+        if store:
+            for scenario in store.goal_scenarios:
+                self._seen(scenario_shards.GOALS, scenario)
+            for persona in store.personas:
+                self._seen(scenario_shards.PERSONAS, persona)
+        for collection, record in read_generated(output_path):
+            self._seen(collection, record)
+            self.examples[collection].append(record)
+
+    def _seen(self, collection, record):
+        if collection == scenario_shards.GOALS:
+            if isinstance(record['id'], int):
+                self.next_goal_id = max(self.next_goal_id, record['id'] + 1)
+        else:
+            self.persona_ids.add(record['id'])
+        self.index.add((collection, record['id']), dedupe_text(collection, record))
+
+    def accept(self, collection, candidate):
+        """Assigns an id and indexes the candidate; returns (record, None) or (None, duplicate match)"""
+        if collection == scenario_shards.GOALS:
+            record = {"id": self.next_goal_id, **candidate}
+        else:
+            base = _slug(candidate['name'])
+            record_id, n = base, 2
+            while record_id in self.persona_ids:
+                record_id, n = f"{base}_{n}", n + 1
+            record = {"id": record_id, **candidate}
+        match = self.index.add_if_new((collection, record['id']), dedupe_text(collection, record))
+        if match is not None:
+            return None, match
+        if collection == scenario_shards.GOALS:
+            self.next_goal_id += 1
+        else:
+            self.persona_ids.add(record['id'])
+        self.examples[collection].append(record)
+        return record, None
+
+
+def read_generated(output_path):
+    """(collection, record) pairs already written to a generator output file"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # half-written line from an interrupted run
+            yield row["collection"], row["record"]
+
+def generate(output_path, goals=0, personas=0, concurrency=4, rate_per_minute=60, max_attempts_factor=3,
+             threshold=THRESHOLD, seed=None):
+    """
+    Generates up to `goals` scenarios and `personas` personas (counting what
+    output_path already holds) and appends the accepted ones to output_path.
+    Gives up on a collection after max_attempts_factor * target attempts.
+    Returns per-run stats.
+    """
+    store = data_manager.get_store()
+    library = GeneratedLibrary(store, output_path, threshold)
+    have = {scenario_shards.GOALS: 0, scenario_shards.PERSONAS: 0}
+    for collection, _ in read_generated(output_path):
+        have[collection] += 1
+    targets = {scenario_shards.GOALS: goals, scenario_shards.PERSONAS: personas}
+    limiter = RateLimiter(rate_per_minute)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    lock = threading.Lock()
+    settled = threading.Condition(lock)     # signalled whenever an attempt finishes
+    in_flight = {c: 0 for c in targets}
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    stats = {c: {"target": targets[c], "resumed": have[c], "attempts": 0, "accepted": 0,
+                 "duplicates": 0, "invalid": 0, "errors": 0, "surplus": 0} for c in targets}
+    start = time.monotonic()
+
+    def remaining(collection):
+        return targets[collection] - have[collection]
+
+    def one(collection, out):
+        try:
+            with rng_lock:
+                call_rng = random.Random(rng.random())
+                pool = library.examples[collection]
+                examples = call_rng.sample(pool, min(EXAMPLES_PER_PROMPT, len(pool)))
+            limiter.acquire()
+            try:
+                candidate = generate_candidate(collection, examples, call_rng)
+            except (ValueError, KeyError, AttributeError):
+                with lock:
+                    stats[collection]["invalid"] += 1
+                return
+            except Exception as e:
+                print(f"Generation error ({collection}): {e}")
+                with lock:
+                    stats[collection]["errors"] += 1
+                return
+            with lock:
+                if remaining(collection) <= 0:
+                    stats[collection]["surplus"] += 1    # in flight when the target was reached
+                    return
+                record, match = library.accept(collection, candidate)
+                if record is None:
+                    stats[collection]["duplicates"] += 1
+                    return
+                out.write(json.dumps({"collection": collection, "record": record}, ensure_ascii=False) + "\n")
+                out.flush()
+                have[collection] += 1
+                stats[collection]["accepted"] += 1
+        finally:
+            with lock:
+                in_flight[collection] -= 1
+                settled.notify_all()
+            slots.release()
+
+    with open(output_path, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for collection in targets:
+            budget = max_attempts_factor * max(0, remaining(collection))
+            while budget > 0:
+                # Only top up when an attempt in flight fails to produce a record
+                with settled:
+                    while in_flight[collection] and remaining(collection) - in_flight[collection] <= 0:
+                        settled.wait()
+                    if remaining(collection) <= 0:
+                        break
+                    in_flight[collection] += 1
+                slots.acquire()
+                stats[collection]["attempts"] += 1
+                budget -= 1
+                pool.submit(one, collection, out)
+
+    seconds = time.monotonic() - start
+    for s in stats.values():
+        s["dedup_rate"] = round(s["duplicates"] / max(1, s["accepted"] + s["duplicates"]), 3)
+    return {
+        "collections": stats,
+        "seconds": round(seconds, 2),
+        "generated_per_sec": round(sum(s["attempts"] for s in stats.values()) / max(seconds, 1e-9), 2),
+        "accepted_per_sec": round(sum(s["accepted"] for s in stats.values()) / max(seconds, 1e-9), 2),
+    }
+
+def merge_into(output_path, folder):
+    """Writes the current library plus every generated record as a sharded library"""
+    store = data_manager.get_store()
+
+    def records(collection, existing):
+        yield from existing
+        for c, record in read_generated(output_path):
+            if c == collection:
+                yield record
+    return scenario_shards.write_library(folder, {
+        scenario_shards.GOALS: records(scenario_shards.GOALS, store.goal_scenarios if store else ()),
+        scenario_shards.PERSONAS: records(scenario_shards.PERSONAS, store.personas if store else ()),
+    })
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-generate goal-setting scenarios and student personas.")
+    parser.add_argument("output", help="JSONL file accepted records are appended to (rerun to resume)")
+    parser.add_argument("--goals", type=int, default=0, help="Goal-setting scenarios to generate")
+    parser.add_argument("--personas", type=int, default=0, help="Judgment personas to generate")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=60, help="Requests per minute (LLM_RATE_PER_MINUTE still caps the whole process)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Similarity at which a candidate counts as a duplicate")
+    parser.add_argument("--seed", type=int, help="Seed for the prompt randomization")
+    parser.add_argument("--merge-into", help="Afterwards, write library + generated records as a sharded library here")
+    args = parser.parse_args()
+
+    print(json.dumps(generate(args.output, args.goals, args.personas, args.concurrency, args.rpm,
+                              threshold=args.threshold, seed=args.seed), indent=2))
+    if args.merge_into:
+        manifest = merge_into(args.output, args.merge_into)
+        print(f"Library version {manifest['version'][:12]} written to {args.merge_into}")
@@ -0,0 +1,356 @@
+import argparse
+import bisect
+import collections.abc
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+# --- SHARDED SCENARIO FORMAT ---
+# A scenario library too large for one JSON document. A library is a folder:
+#
+#   manifest.json                     format, version and per-collection metadata
+#   <collection>-<tag>-00000.jsonl    records, one JSON object per line,
+#                                     SCENARIO_SHARD_SIZE records per shard
+#   <collection>-<tag>.idx            fixed-width index, one entry per record:
+#                                     int64 id, uint16 shard, uint64 offset,
+#                                     uint32 length (sorted by id for int ids)
+#   <collection>-<tag>.conflict       uint32 index positions grouped by
+#                                     "conflict type"; the manifest holds
+#                                     each type's [start, count] range
+#
+# Readers mmap the index and shards and only decode the records they touch,
+# so opening a library and sampling from it cost the same at 1k or 1M
+# records. Shards are mapped on first access, so a rewrite keeps the files
+# of the previous version for readers still on it and only removes older ones.
+# Convert a scenarios.json with:
+#
+#   python scenario_shards.py scenarios.json scenarios/
+
+MANIFEST = "manifest.json"
+FORMAT = 1
+SHARD_SIZE = int(os.getenv("SCENARIO_SHARD_SIZE", "10000"))
+RECORD_CACHE = int(os.getenv("SCENARIO_RECORD_CACHE", "4096"))
+
+GOALS = "goal_setting_scenarios"
+PERSONAS = "judgment_personas"
+CONFLICT_FIELD = "conflict type"
+
+INDEX_ENTRY = struct.Struct("<qHQI")
+POSITION = struct.Struct("<I")
+NO_ID = -1
+
+
+def _map(path):
+    """Read-only mmap of a file (empty bytes for an empty file)"""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# --- READING ---
+
+class ShardedCollection(collections.abc.Sequence):
+    """
+    Lazy, read-only sequence of the records in one collection, in index order.
+    Works with random.sample(), which only decodes the records it picks.
+    """
+
+    def __init__(self, folder, name, meta):
+        self.folder = folder
+        self.name = name
+        self.count = meta["count"]
+        self.int_ids = meta["int_ids"]
+        self.shards = meta["shards"]
+        self.conflict_ranges = meta.get("conflicts", {})
+        self._index = _map(os.path.join(folder, meta["index"]))
+        self._conflicts = _map(os.path.join(folder, meta["conflict_index"])) if meta.get("conflict_index") else b""
+        self._shard_maps = [None] * len(self.shards)
+        self._lock = threading.Lock()
+        self._ids = None
+        self._record = functools.lru_cache(maxsize=RECORD_CACHE)(self._decode)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._record(i) for i in range(*pos.indices(self.count))]
+        if pos < 0:
+            pos += self.count
+        if not 0 <= pos < self.count:
+            raise IndexError(pos)
+        return self._record(pos)
+
+    def _entry(self, pos):
+        return INDEX_ENTRY.unpack_from(self._index, pos * INDEX_ENTRY.size)
+
+    def _shard(self, number):
+        shard = self._shard_maps[number]
+        if shard is None:
+            with self._lock:
+                shard = self._shard_maps[number]
+                if shard is None:
+                    shard = self._shard_maps[number] = _map(os.path.join(self.folder, self.shards[number]))
+        return shard
+
+    def _decode(self, pos):
+        _, shard, offset, length = self._entry(pos)
+        return json.loads(self._shard(shard)[offset:offset + length])
+
+    def id_at(self, pos):
+        return self._entry(pos)[0] if self.int_ids else self[pos]['id']
+
+    def ids(self):
+        return (self.id_at(pos) for pos in range(self.count))
+
+    def position(self, record_id):
+        """Index position of a record id, or None"""
+        if self.int_ids:
+            if not isinstance(record_id, int):
+                return None
+            # The index is sorted by id: binary search over the mmapped entries
+            pos = bisect.bisect_left(_IdColumn(self), record_id)
+            return pos if pos < self.count and self.id_at(pos) == record_id else None
+        if self._ids is None:
+            # Non-integer ids aren't indexed; fine for small collections like personas
+            self._ids = {record['id']: pos for pos, record in enumerate(self)}
+        return self._ids.get(record_id)
+
+    def get(self, record_id, default=None):
+        pos = self.position(record_id)
+        return default if pos is None else self[pos]
+
+    def by_conflict(self, conflict_type):
+        """Lazy sequence of the records with this conflict type"""
+        start, count = self.conflict_ranges.get(conflict_type, (0, 0))
+        return _Subset(self, start, count)
+
+
+class _IdColumn(collections.abc.Sequence):
+    """The id column of an index, for bisect"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __len__(self):
+        return len(self.collection)
+
+    def __getitem__(self, pos):
+        return self.collection.id_at(pos)
+
+
+class _Subset(collections.abc.Sequence):
+    def __init__(self, collection, start, count):
+        self.collection = collection
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        pos, = POSITION.unpack_from(self.collection._conflicts, (self.start + i) * POSITION.size)
+        return self.collection[pos]
+
+
+class RecordsById(collections.abc.Mapping):
+    """{id: record} view of a collection that decodes records on access"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, record_id):
+        pos = self.collection.position(record_id)
+        if pos is None:
+            raise KeyError(record_id)
+        return self.collection[pos]
+
+    def __contains__(self, record_id):
+        return self.collection.position(record_id) is not None
+
+    def __iter__(self):
+        return self.collection.ids()
+
+    def __len__(self):
+        return len(self.collection)
+
+
+class RecordsByLabel(collections.abc.Mapping):
+    """{"Case <id>": record} view, the shape app.py's selectboxes expect"""
+
+    def __init__(self, collection, prefix):
+        self.by_id = RecordsById(collection)
+        self.prefix = prefix
+
+    def _id(self, label):
+        if not isinstance(label, str) or not label.startswith(self.prefix):
+            raise KeyError(label)
+        record_id = label[len(self.prefix):]
+        return int(record_id) if self.by_id.collection.int_ids and record_id.lstrip("-").isdigit() else record_id
+
+    def __getitem__(self, label):
+        return self.by_id[self._id(label)]
+
+    def __iter__(self):
+        return (f"{self.prefix}{record_id}" for record_id in self.by_id)
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+def read_manifest(folder):
+    with open(os.path.join(folder, MANIFEST), 'rb') as file:
+        raw = file.read()
+    manifest = json.loads(raw)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported scenario library format {manifest.get('format')} in {folder}")
+    return manifest
+
+def open_collection(folder, manifest, name):
+    return ShardedCollection(folder, name, manifest["collections"][name])
+
+
+# --- WRITING ---
+
+def write_collection(folder, name, records, shard_size=SHARD_SIZE):
+    """
+    Streams records into shards and writes their index. Only the index
+    columns are kept in memory, never the records. Returns the manifest entry.
+    """
+    ids, shards, offsets, lengths = array('q'), array('H'), array('Q'), array('I')
+    conflicts = {}
+    int_ids = True
+    digest = hashlib.sha256()
+    temp_shards = []
+    file = None
+    seen = set()
+    try:
+        for n, record in enumerate(records):
+            if n % shard_size == 0:
+                if file:
+                    file.close()
+                temp_shards.append(os.path.join(folder, f"{name}.{len(temp_shards):05d}.tmp"))
+                file = open(temp_shards[-1], 'wb')
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8')
+            digest.update(line + b"\n")
+            record_id = record.get('id')
+            if int_ids and not (isinstance(record_id, int) and not isinstance(record_id, bool)):
+                int_ids = False
+            if record_id in seen:
+                raise ValueError(f"Duplicate id {record_id!r} in {name}")
+            seen.add(record_id)
+            ids.append(record_id if int_ids else NO_ID)
+            shards.append(len(temp_shards) - 1)
+            offsets.append(file.tell())
+            lengths.append(len(line))
+            file.write(line + b"\n")
+            if CONFLICT_FIELD in record:
+                conflicts.setdefault(record[CONFLICT_FIELD], []).append(n)
+    finally:
+        if file:
+            file.close()
+    if not int_ids:
+        ids = array('q', [NO_ID]) * len(lengths)
+    del seen
+
+    tag = digest.hexdigest()[:10]
+    shard_names = []
+    for i, temp in enumerate(temp_shards):
+        shard_names.append(f"{name}-{tag}-{i:05d}.jsonl")
+        os.replace(temp, os.path.join(folder, shard_names[-1]))
+
+    # Index order: by id when ids are integers (binary search), else file order
+    order = sorted(range(len(ids)), key=ids.__getitem__) if int_ids else range(len(ids))
+    position_of = array('I', bytes(4 * len(ids)))
+    index_name = f"{name}-{tag}.idx"
+    with open(os.path.join(folder, index_name), 'wb') as index:
+        for pos, n in enumerate(order):
+            position_of[n] = pos
+            index.write(INDEX_ENTRY.pack(ids[n], shards[n], offsets[n], lengths[n]))
+
+    entry = {"count": len(ids), "int_ids": int_ids, "shards": shard_names, "index": index_name, "digest": tag}
+    if conflicts:
+        ranges, start = {}, 0
+        grouped = array('I')
+        for conflict_type in sorted(conflicts):
+            positions = sorted(position_of[n] for n in conflicts[conflict_type])
+            grouped.extend(positions)
+            ranges[conflict_type] = [start, len(positions)]
+            start += len(positions)
+        if sys.byteorder == "big":
+            grouped.byteswap()
+        entry["conflict_index"] = f"{name}-{tag}.conflict"
+        entry["conflicts"] = ranges
+        with open(os.path.join(folder, entry["conflict_index"]), 'wb') as file:
+            grouped.tofile(file)
+    return entry
+
+def _referenced(manifest):
+    """File names a manifest points at"""
+    names = set()
+    for entry in manifest["collections"].values():
+        names.update(entry["shards"])
+        names.update(entry[key] for key in ("index", "conflict_index") if key in entry)
+    return names
+
+def write_library(folder, collections_, shard_size=SHARD_SIZE):
+    """
+    Writes {collection name: iterable of records} as a sharded library. The
+    manifest is replaced last, so readers switch over atomically. Files that
+    neither the new nor the previous manifest references are then removed
+    where possible; readers that opened the previous version may still map
+    its shards lazily.
+    """
+    os.makedirs(folder, exist_ok=True)
+    try:
+        previous = _referenced(read_manifest(folder))
+    except (OSError, ValueError, KeyError):
+        previous = set()
+    entries = {name: write_collection(folder, name, records, shard_size) for name, records in collections_.items()}
+    version = hashlib.sha256("".join(entries[name]["digest"] for name in sorted(entries)).encode()).hexdigest()
+    manifest = {"format": FORMAT, "version": version, "collections": entries}
+    temp = os.path.join(folder, MANIFEST + ".tmp")
+    with open(temp, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp, os.path.join(folder, MANIFEST))
+
+    keep = {MANIFEST} | _referenced(manifest) | previous
+    for file_name in os.listdir(folder):
+        if file_name not in keep and file_name.startswith(tuple(entries)):
+            try:
+                os.remove(os.path.join(folder, file_name))
+            except OSError:
+                pass  # still mapped by a running reader (Windows); removed next time
+    return manifest
+
+def convert(json_path, folder, shard_size=SHARD_SIZE):
+    """Converts a scenarios.json document into a sharded library"""
+    with open(json_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    return write_library(folder, {GOALS: data.get(GOALS, []), PERSONAS: data.get(PERSONAS, [])}, shard_size)
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert scenarios.json into a sharded scenario library.")
+    parser.add_argument("source", help="scenarios.json to convert")
+    parser.add_argument("folder", help="Output folder (point SCENARIO_FILE at it)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Records per shard")
+    args = parser.parse_args()
+
+    result = convert(args.source, args.folder, args.shard_size)
+    for name, entry in result["collections"].items():
+        print(f"{name}: {entry['count']} records in {len(entry['shards'])} shard(s)")
+    print(f"Version {result['version'][:12]} written to {args.folder}")
@@ -0,0 +1,281 @@
+import collections
+import heapq
+import os
+import random
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+
+import progress_store
+from rubric import CRITERIA, CRITERIA_KEYS, PASS_SCORE
+
+# --- ADAPTIVE SCENARIO SCHEDULER ---
+# Picks a tutor's next training batch from their weak spots instead of at
+# random (the roadmap's "Iterative Feedback Loops").
+#
+# Weakness profile: per rubric criterion, a recency-weighted mean of the
+# tutor's last PROFILE_ATTEMPTS graded goal attempts, pulled towards
+# PRIOR_SCORE while there is little data, mapped to a weakness in [0, 1].
+# It also holds what the tutor completed and their best score on it.
+# Profiles are cached per tutor and rebuilt when this process records a new
+# attempt for the tutor, or after PROFILE_TTL_SECONDS (attempts recorded by
+# other replicas).
+#
+# Selection index: built once per library version. Goal scenarios are
+# grouped into buckets by (conflict type, targeted criteria). A scenario
+# targets the criteria in its optional "criteria" list, else the defaults
+# for its conflict type below. Only index building touches every scenario;
+# a selection looks at the buckets and the tutor's own completions, so it
+# stays sub-millisecond as the library and the number of tutors grow.
+#
+# Selection: each bucket's weight is the tutor's rubric-weighted weakness on
+# the criteria it targets, boosted while it still has scenarios the tutor
+# hasn't done. Scenarios completed below GOAL_PASS_SCORE compete as
+# retries. Candidates are drawn by weighted sampling without replacement
+# (key u ** (1 / weight), largest keys win via a heap), so weak areas come
+# up most often but strong ones still appear now and then.
+
+ENABLED = os.getenv("ADAPTIVE_BATCH", "1") != "0"
+PROFILE_ATTEMPTS = int(os.getenv("SCHEDULER_PROFILE_ATTEMPTS", "50"))
+PROFILE_TTL_SECONDS = float(os.getenv("SCHEDULER_PROFILE_TTL_SECONDS", "60"))
+PROFILE_CACHE = int(os.getenv("SCHEDULER_PROFILE_CACHE", "10000"))
+RECENCY_DECAY = 0.85     # weight of each older attempt relative to the next newer one
+PRIOR_SCORE = 6.0        # assumed score per criterion before any data...
+PRIOR_WEIGHT = 2.0       # ...counted as this many attempts
+EXPLORE = 0.1            # floor weight, so strong areas are not dropped entirely
+NEW_BOOST = 2.0          # weight multiplier for buckets with unseen scenarios
+RETRY_WEIGHT = 0.75      # weight multiplier for retrying a failed scenario
+SCORE_MAX = 10
+
+# Criteria a conflict type exercises, used when a scenario has no "criteria" list.
+# Ethical cases hinge on holding the line clearly; Process cases on meeting both sides.
+CONFLICT_CRITERIA = {
+    "Ethical": ("pedagogical_integrity", "stakeholder_alignment", "communication"),
+    "Process": ("compromise", "stakeholder_alignment", "tone", "empathy"),
+}
+
+WEIGHTS = [weight for _, _, weight, _ in CRITERIA]
+LABELS = {key: label for key, label, _, _ in CRITERIA}
+
+
+def targeted_criteria(scenario):
+    """The criteria a goal scenario targets, in CRITERIA_KEYS order"""
+    listed = scenario.get('criteria') or CONFLICT_CRITERIA.get(scenario.get('conflict type'), CRITERIA_KEYS)
+    return tuple(key for key in CRITERIA_KEYS if key in listed)
+
+
+@dataclass
+class Bucket:
+    conflict_type: str
+    criteria: tuple
+    mask: list                                        # 1/0 per CRITERIA_KEYS entry
+    positions: array = field(default_factory=lambda: array('q'))
+
+
+class SelectionIndex:
+    """Goal scenarios of one library version, bucketed by conflict type and targeted criteria"""
+
+    def __init__(self, store):
+        t0 = time.perf_counter()
+        self.version = store.version
+        self.goals = store.goal_scenarios
+        self.buckets = []
+        self._by_key = {}
+        for pos, scenario in enumerate(self.goals):
+            self.buckets[self.bucket_of(scenario, create=True)].positions.append(pos)
+        self.build_ms = round((time.perf_counter() - t0) * 1000, 3)
+
+    def bucket_of(self, scenario, create=False):
+        key = (scenario['conflict type'], targeted_criteria(scenario))
+        number = self._by_key.get(key)
+        if number is None and create:
+            number = self._by_key[key] = len(self.buckets)
+            self.buckets.append(Bucket(key[0], key[1], [int(k in key[1]) for k in CRITERIA_KEYS]))
+        return number
+
+
+@dataclass
+class WeaknessProfile:
+    tutor_id: str
+    revision: int
+    built: float
+    weakness: list                                    # 0 (strong) .. 1 (weak) per CRITERIA_KEYS entry
+    graded_attempts: int
+    goals_completed: dict                             # {scenario_id: best score or None}
+    sims_completed: dict                              # {persona_id: best score or None}
+    # Weighted goal candidates for one index version, filled on first use:
+    # [(weight, (kind, bucket number or scenario id), conflict type)]
+    index_version: str = None
+    candidates: list = field(default_factory=list)
+
+    @classmethod
+    def build(cls, tutor_id, progress):
+        revision = progress.tutor_revision(tutor_id)
+        history = progress.criteria_history(tutor_id, PROFILE_ATTEMPTS)
+        weakness = []
+        for i in range(len(CRITERIA_KEYS)):
+            total, weight, w = PRIOR_SCORE * PRIOR_WEIGHT, PRIOR_WEIGHT, 1.0
+            for row in history:
+                total += w * row[i]
+                weight += w
+                w *= RECENCY_DECAY
+            weakness.append(min(1.0, max(0.0, (SCORE_MAX - total / weight) / (SCORE_MAX - 1))))
+        return cls(tutor_id, revision, time.monotonic(), weakness, len(history),
+                   progress.completed(tutor_id, progress_store.GOAL),
+                   progress.completed(tutor_id, progress_store.SIM))
+
+    def bucket_weakness(self, bucket):
+        """Rubric-weighted weakness over the criteria a bucket targets"""
+        weighted = sum(m * w * x for m, w, x in zip(bucket.mask, WEIGHTS, self.weakness))
+        return weighted / (sum(m * w for m, w in zip(bucket.mask, WEIGHTS)) or 1.0)
+
+    def focus(self, n=2):
+        """Labels of the n weakest criteria once there are graded attempts"""
+        if not self.graded_attempts:
+            return []
+        order = sorted(range(len(CRITERIA_KEYS)), key=lambda i: -self.weakness[i])
+        return [LABELS[CRITERIA_KEYS[i]] for i in order[:n]]
+
+
+class Scheduler:
+    def __init__(self, progress=None, rng=None):
+        self.progress = progress or progress_store.get_progress_store()
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._index = None
+        self._profiles = collections.OrderedDict()
+
+    def index(self, store):
+        """The selection index for the store's current library version"""
+        index = self._index
+        if index is None or index.version != store.version:
+            with self._index_lock:
+                if self._index is None or self._index.version != store.version:
+                    self._index = SelectionIndex(store)
+                index = self._index
+        return index
+
+    def profile(self, tutor_id):
+        """Cached weakness profile, rebuilt after the tutor's next recorded attempt or the TTL"""
+        with self._lock:
+            profile = self._profiles.get(tutor_id)
+            if profile is not None:
+                self._profiles.move_to_end(tutor_id)
+        if (profile is None or profile.revision != self.progress.tutor_revision(tutor_id)
+                or time.monotonic() - profile.built > PROFILE_TTL_SECONDS):
+            profile = WeaknessProfile.build(tutor_id, self.progress)
+            with self._lock:
+                self._profiles[tutor_id] = profile
+                self._profiles.move_to_end(tutor_id)
+                while len(self._profiles) > PROFILE_CACHE:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def _candidates(self, profile, index, store):
+        """Bucket and retry candidates with their weights, computed once per profile and index"""
+        if profile.index_version != index.version:
+            done, retries = collections.Counter(), []
+            for scenario_id, best in profile.goals_completed.items():
+                scenario = store.get_scenario(scenario_id)
+                number = index.bucket_of(scenario) if scenario else None
+                if number is None:
+                    continue
+                done[number] += 1
+                if best is not None and best < PASS_SCORE:
+                    retries.append((number, scenario_id))
+            weights = [EXPLORE + profile.bucket_weakness(bucket) for bucket in index.buckets]
+            candidates = []
+            for number, bucket in enumerate(index.buckets):
+                fresh = len(bucket.positions) - done[number] > 0
+                candidates.append((weights[number] * (NEW_BOOST if fresh else 1.0),
+                                   ("new" if fresh else "any", number), bucket.conflict_type))
+            for number, scenario_id in retries:
+                candidates.append((weights[number] * RETRY_WEIGHT, ("retry", scenario_id),
+                                   index.buckets[number].conflict_type))
+            profile.candidates, profile.index_version = candidates, index.version
+        return profile.candidates
+
+    def _pick(self, candidates, k):
+        """Up to k candidates by weighted sampling without replacement; candidates are (weight, item)"""
+        with self._lock:
+            keyed = [(self.rng.random() ** (1.0 / weight), i) for i, (weight, _) in enumerate(candidates) if weight > 0]
+        return [candidates[i][1] for _, i in heapq.nlargest(k, keyed)]
+
+    def _draw(self, goals, bucket, chosen, completed, tries=8):
+        """
+        A scenario from a bucket that is not in `chosen`, preferably not in
+        `completed` either. Bounded rejection sampling; small buckets are
+        scanned in full if that fails, large ones may return None.
+        """
+        positions = bucket.positions
+        with self._lock:
+            picks = [self.rng.randrange(len(positions)) for _ in range(tries)]
+        if len(positions) <= tries:
+            picks += range(len(positions))
+        fallback = None
+        for pick in picks:
+            scenario = goals[positions[pick]]
+            if scenario['id'] in chosen:
+                continue
+            if scenario['id'] not in completed:
+                return scenario
+            fallback = fallback or scenario
+        return fallback
+
+    def select_goals(self, tutor_id, store, k=2, conflict_type=None):
+        index = self.index(store)
+        profile = self.profile(tutor_id)
+        candidates = [(weight, item) for weight, item, conflict in self._candidates(profile, index, store)
+                      if not conflict_type or conflict == conflict_type]
+
+        # Buckets can yield more than one scenario, so walk the draw order until k distinct ones are found
+        order = self._pick(candidates, len(candidates))
+        chosen, seen = [], set()
+        for _ in range(k):
+            for kind, value in order:
+                if len(chosen) == k:
+                    break
+                if kind == "retry":
+                    scenario = store.get_scenario(value)
+                else:
+                    completed = profile.goals_completed if kind == "new" else ()
+                    scenario = self._draw(index.goals, index.buckets[value], seen, completed)
+                if scenario is not None and scenario['id'] not in seen:
+                    seen.add(scenario['id'])
+                    chosen.append(scenario)
+        return chosen
+
+    def select_personas(self, tutor_id, personas, k=2):
+        """Personas not done yet first, then the ones with the lowest simulation score"""
+        completed = self.profile(tutor_id).sims_completed
+        candidates = []
+        for persona in personas:
+            if persona['id'] not in completed:
+                weight = NEW_BOOST
+            else:
+                best = completed[persona['id']]
+                weight = EXPLORE + (0.5 if best is None else max(0.0, SCORE_MAX - best) / SCORE_MAX)
+            candidates.append((weight, persona))
+        return self._pick(candidates, k)
+
+    def next_batch(self, tutor_id, store, conflict_type=None, goals=2, personas=2):
+        """Same shape as data_manager.get_training_batch, plus the criteria the batch focuses on"""
+        return {
+            "goals": self.select_goals(tutor_id, store, goals, conflict_type),
+            "judgments": self.select_personas(tutor_id, store.personas, personas),
+            "focus": self.profile(tutor_id).focus(),
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Process-wide Scheduler over the shared progress store"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
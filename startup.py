@@ -0,0 +1,192 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# --- COLD START ---
+# app.py only imports what every page needs (streamlit, dotenv, telemetry and
+# this module). The engine modules (model client, graders, stores, prewarm
+# pool) are imported by load_engine() the first time a page uses them, and
+# their one-time setup (backend configuration, store connections, the first
+# prewarm pass) runs there too, once per process. After the first page has
+# rendered, warm_in_background() loads the engine off the script thread so
+# a new replica is ready by the time someone opens the Prototype tab.
+#
+# Each step is timed as a phase, measured from the first import of this
+# module (the start of the first app run). report() lists them against
+# COLD_START_BUDGET_MS; `python startup.py` measures the same path in fresh
+# interpreters and exits non-zero when the static pages go over budget.
+
+PROCESS_START = time.perf_counter()
+BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1500"))
+BACKGROUND_WARMUP = os.getenv("APP_BACKGROUND_WARMUP", "1") != "0"
+
+# Leaf modules first, so each import phase is mostly that module's own cost
+ENGINE_MODULES = (
+    "rubric", "llm_client", "eval_cache", "transcript", "cascade", "goal_setting", "judgment_call",
+    "feedback_training", "scenario_shards", "data_manager", "progress_store", "jobs",
+    "prewarm", "chat_sessions",
+)
+# What app.py imports before the first page renders
+STATIC_MODULES = ("streamlit", "dotenv", "telemetry", "startup")
+
+_phases = {}               # name -> (offset_ms, duration_ms), first occurrence only
+_phases_lock = threading.Lock()
+_engine_lock = threading.Lock()
+_engine_loaded = False
+_warmup_started = False
+
+
+def _since_start(t):
+    return round((t - PROCESS_START) * 1000, 1)
+
+@contextmanager
+def phase(name):
+    """Times a block; only the first run of each phase is kept"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with _phases_lock:
+            _phases.setdefault(name, (_since_start(start), round((end - start) * 1000, 1)))
+
+def mark(name):
+    """Records a point in time (e.g. "first_render") the first time it is reached"""
+    with _phases_lock:
+        if name in _phases:
+            return
+        _phases[name] = (_since_start(time.perf_counter()), 0.0)
+    if name == "first_render" and _phases[name][0] > BUDGET_MS:
+        print(f"Warning: first render took {_phases[name][0]:.0f} ms (cold-start budget {BUDGET_MS:.0f} ms)")
+
+def engine_loaded():
+    return _engine_loaded
+
+def load_engine():
+    """
+    Imports the engine modules and runs their one-time setup. Cheap after the
+    first call, so pages call it on every rerun.
+    """
+    global _engine_loaded
+    if _engine_loaded:
+        return
+    with _engine_lock:
+        if _engine_loaded:
+            return
+        with phase("engine"):
+            for name in ENGINE_MODULES:
+                if name not in sys.modules:
+                    with phase(f"import:{name}"):
+                        importlib.import_module(name)
+            _setup()
+        _engine_loaded = True
+
+def _setup():
+    import data_manager
+    import llm_client
+    import prewarm
+    import progress_store
+    import telemetry
+
+    with phase("llm_configure"):
+        try:
+            llm_client.configure()
+        except Exception as e:
+            # Reported again (and shown to the user) on the first model call
+            telemetry.record_error("startup.llm_configure", e)
+    with phase("scenario_store"):
+        store = data_manager.get_store()
+    with phase("progress_store"):
+        progress_store.get_progress_store()
+    pool = prewarm.get_pool()
+    if pool and store:
+        with phase("prewarm_schedule"):
+            pool.refresh(store)
+
+def warm_in_background():
+    """Starts load_engine() on a daemon thread (once per process, APP_BACKGROUND_WARMUP=0 disables)"""
+    global _warmup_started
+    if not BACKGROUND_WARMUP or _engine_loaded:
+        return
+    with _engine_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=_warm, name="engine-warmup", daemon=True).start()
+
+def _warm():
+    try:
+        load_engine()
+    except Exception as e:
+        import telemetry
+        telemetry.record_error("startup.warmup", e)
+
+def report():
+    """Startup phases in the order they started, plus the budget check"""
+    with _phases_lock:
+        phases = sorted(_phases.items(), key=lambda item: (item[1][0], -item[1][1]))
+    first_render = dict(phases).get("first_render", (None,))[0]
+    return {
+        "budget_ms": BUDGET_MS,
+        "first_render_ms": first_render,
+        "over_budget": first_render is not None and first_render > BUDGET_MS,
+        "engine_loaded": _engine_loaded,
+        "phases": [{"phase": name, "at_ms": offset, "ms": duration} for name, (offset, duration) in phases],
+    }
+
+# --- MEASUREMENT ---
+# Fresh interpreters, so nothing is already imported or configured.
+
+def _run_fresh(code, env=None):
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, **(env or {})))
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_imports(modules=STATIC_MODULES):
+    """{module: cold import ms (dependencies included), or None if it failed}"""
+    code = ("import json, time; t = time.perf_counter(); import {0}; "
+            "print(json.dumps((time.perf_counter() - t) * 1000))")
+    return {name: _run_fresh(code.format(name)) for name in modules}
+
+def measure_engine():
+    """report() after a cold load_engine(), without starting the prewarm pool"""
+    code = "import json, startup; startup.load_engine(); print(json.dumps(startup.report()))"
+    return _run_fresh(code, env={"PREWARM_ENABLED": "0"})
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure app cold-start time against the budget.")
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="Budget for the static pages in ms")
+    parser.add_argument("--json", action="store_true", help="Print the measurements as JSON")
+    args = parser.parse_args()
+
+    imports = measure_imports()
+    engine = measure_engine()
+    # Each measurement is its own process, so dependencies shared between
+    # modules are counted more than once; that only errs on the safe side
+    static_ms = round(sum(ms for ms in imports.values() if ms), 1)
+    over = static_ms > args.budget
+
+    if args.json:
+        print(json.dumps({"budget_ms": args.budget, "static_ms": static_ms, "over_budget": over,
+                          "imports": imports, "engine": engine}, indent=2))
+    else:
+        print(f"{'static page imports':<32}{'ms':>10}")
+        for name, ms in imports.items():
+            print(f"  {name:<30}{'failed' if ms is None else f'{ms:.1f}':>10}")
+        print(f"  {'total':<30}{static_ms:>10.1f}   budget {args.budget:.0f} ms{'  OVER' if over else ''}")
+        print(f"\n{'engine (first Prototype use)':<32}{'ms':>10}")
+        if engine is None:
+            print("  failed to load")
+        else:
+            for row in engine["phases"]:
+                print(f"  {row['phase']:<30}{row['ms']:>10.1f}")
+    sys.exit(1 if over else 0)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+# --- OFFLINE STUB BACKEND ---
+# A stand-in for google.generativeai with the same duck-typed surface
+# (generate_content, start_chat, send_message, streaming responses).
+# Replies are deterministic for a given prompt; latency, chunking and
+# failure rates are configured through STUB_* environment variables.
+# JSON-mode requests (response_mime_type + response_schema) get a
+# deterministic object that fits the schema.
+# Select it with LLM_BACKEND=stub.
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "300"))          # total generation time
+FIRST_CHUNK_MS = float(os.getenv("STUB_FIRST_CHUNK_MS", "80"))   # time to first chunk
+CHUNK_CHARS = int(os.getenv("STUB_CHUNK_CHARS", "24"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))            # chance of a 500
+RATE_LIMIT_RATE = float(os.getenv("STUB_429_RATE", "0"))         # chance of a 429
+SEED = os.getenv("STUB_SEED")
+
+SENTENCES = [
+    "I guess that makes sense.",
+    "I'm not really sure what you mean.",
+    "Can we just get this over with?",
+    "Okay... I can try that.",
+    "Nobody ever explains it like that.",
+    "I don't know, it's been a rough week.",
+    "That actually helps a little.",
+    "Why does this even matter?",
+    "The tutor acknowledged both sides and proposed a clear compromise.",
+    "A stronger response would name the student's feelings before moving to solutions.",
+    "Keep the student doing the cognitive work while updating the parent on progress.",
+    "Score: 7. The response balances both requests but could be more specific.",
+]
+
+
+class StubError(Exception):
+    """Mimics google.api_core errors closely enough for llm_client.is_retryable"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class UsageMetadata:
+    def __init__(self, prompt_tokens, response_tokens, cached_tokens=0):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.cached_content_token_count = cached_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class StubChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubResponse:
+    """Iterable like a streaming genai response; .text is the full reply"""
+
+    def __init__(self, text, prompt_text, stream, on_done=None, cached_tokens=0):
+        self.text = text
+        self.usage_metadata = UsageMetadata(_tokens(prompt_text), _tokens(text), cached_tokens)
+        self._stream = stream
+        self._on_done = on_done
+        self._chunks = [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)] or [""]
+        if not stream:
+            _sleep_ms(LATENCY_MS)
+            self._finish()
+
+    def __iter__(self):
+        if not self._stream:
+            yield StubChunk(self.text)
+            return
+        per_chunk = max(0.0, LATENCY_MS - FIRST_CHUNK_MS) / max(1, len(self._chunks) - 1)
+        for i, chunk in enumerate(self._chunks):
+            _sleep_ms(FIRST_CHUNK_MS if i == 0 else per_chunk)
+            yield StubChunk(chunk)
+        self._finish()
+
+    def resolve(self):
+        for _ in self:
+            pass
+
+    def _finish(self):
+        if self._on_done:
+            self._on_done(self.text)
+            self._on_done = None
+
+
+class StubChatSession:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, message, stream=False, **kwargs):
+        context = "".join(part for turn in self.history for part in turn.get("parts", []))
+        prompt_text = self.model.system_instruction + context + message
+        self.model._maybe_fail()
+        text = self.model._reply(prompt_text)
+
+        def record(reply):
+            self.history.append({"role": "user", "parts": [message]})
+            self.history.append({"role": "model", "parts": [reply]})
+        return StubResponse(text, prompt_text, stream, on_done=record, cached_tokens=self.model.cached_tokens)
+
+
+class StubModel:
+    """
+    system_instruction counts towards prompt tokens like it does on Gemini;
+    with cached=True it is reported as cached_content_token_count.
+    """
+
+    def __init__(self, model_name, system_instruction=None, cached=False, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.cached_tokens = _tokens(self.system_instruction) if cached and system_instruction else 0
+        self._rng = random.Random(SEED)
+        self._rng_lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        prompt_text = self.system_instruction + (prompt if isinstance(prompt, str) else str(prompt))
+        self._maybe_fail()
+        schema = _json_schema(generation_config)
+        if schema is not None:
+            text = json.dumps(_fill_schema(schema, self._digest(prompt_text)))
+        else:
+            text = self._reply(prompt_text)
+        return StubResponse(text, prompt_text, stream, cached_tokens=self.cached_tokens)
+
+    def start_chat(self, history=None, **kwargs):
+        return StubChatSession(self, history)
+
+    def _maybe_fail(self):
+        with self._rng_lock:
+            roll = self._rng.random()
+        if roll < RATE_LIMIT_RATE:
+            _sleep_ms(FIRST_CHUNK_MS)
+            raise StubError(429, "Resource has been exhausted (stub quota).")
+        if roll < RATE_LIMIT_RATE + ERROR_RATE:
+            _sleep_ms(FIRST_CHUNK_MS)
+            raise StubError(500, "Internal error (stub).")
+
+    def _digest(self, prompt_text):
+        return hashlib.sha256(f"{self.model_name}\n{prompt_text}".encode('utf-8')).digest()
+
+    def _reply(self, prompt_text):
+        """Deterministic reply of 2-4 canned sentences chosen by the prompt hash"""
+        digest = self._digest(prompt_text)
+        count = 2 + digest[0] % 3
+        return " ".join(SENTENCES[digest[i + 1] % len(SENTENCES)] for i in range(count))
+
+
+def _json_schema(generation_config):
+    """The response_schema of a JSON-mode request, else None"""
+    if generation_config is None:
+        return None
+    get = generation_config.get if isinstance(generation_config, dict) else \
+        (lambda key: getattr(generation_config, key, None))
+    if get("response_mime_type") != "application/json":
+        return None
+    return get("response_schema") or {"type": "object", "properties": {}}
+
+def _fill_schema(schema, digest, path=""):
+    """Deterministic value for a (Gemini subset) JSON schema"""
+    seed = hashlib.sha256(digest + path.encode('utf-8')).digest()
+    kind = str(schema.get("type", "string")).lower()
+    if "enum" in schema:
+        return schema["enum"][seed[0] % len(schema["enum"])]
+    if kind == "object":
+        return {key: _fill_schema(sub, digest, f"{path}.{key}") for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_fill_schema(schema.get("items", {}), digest, f"{path}[{i}]") for i in range(1 + seed[0] % 3)]
+    if kind == "integer":
+        return 1 + seed[0] % 10
+    if kind == "number":
+        return round(seed[0] / 255, 2)
+    if kind == "boolean":
+        return seed[0] < 32      # mostly false
+    return " ".join(SENTENCES[seed[i] % len(SENTENCES)] for i in range(1 + seed[0] % 2))
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
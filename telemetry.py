@@ -0,0 +1,249 @@
+import collections
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- TELEMETRY ---
+# Every model call runs inside a span that records the operation, ids,
+# model, latency, token counts, retries and outcome. Finished spans are
+# handed to the configured sinks:
+#   memory      in-process ring buffer (feeds the admin page)
+#   jsonl       one JSON line per span in TELEMETRY_JSONL_PATH
+#   prometheus  counters/histograms, rendered as Prometheus text
+# TELEMETRY_SINKS picks them (comma separated, default "memory,prometheus").
+# Set METRICS_PORT to serve the Prometheus text over HTTP. It listens on
+# METRICS_HOST, localhost unless set (e.g. 0.0.0.0 for a scraper elsewhere).
+
+SINKS = os.getenv("TELEMETRY_SINKS", "memory,prometheus")
+RING_SIZE = int(os.getenv("TELEMETRY_RING_SIZE", "5000"))
+JSONL_PATH = os.getenv("TELEMETRY_JSONL_PATH", "telemetry.jsonl")
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class RingBufferSink:
+    def __init__(self, size=RING_SIZE):
+        self._spans = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def emit(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+
+class JsonlSink:
+    def __init__(self, path=JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, span):
+        line = json.dumps(span, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line + "\n")
+
+
+class PrometheusSink:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._calls = collections.Counter()       # (op, outcome) -> count
+        self._tokens = collections.Counter()      # (op, kind) -> tokens
+        self._retries = collections.Counter()     # op -> retries
+        self._hist = {}                           # op -> [bucket counts..., +Inf]
+        self._sum = collections.Counter()         # op -> total latency ms
+        self._lock = threading.Lock()
+
+    def emit(self, span):
+        op = span["op"]
+        with self._lock:
+            self._calls[(op, span["outcome"])] += 1
+            self._tokens[(op, "prompt")] += span.get("prompt_tokens") or 0
+            self._tokens[(op, "response")] += span.get("response_tokens") or 0
+            self._tokens[(op, "cached")] += span.get("cached_tokens") or 0
+            self._retries[op] += span.get("retries", 0)
+            counts = self._hist.setdefault(op, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if span["latency_ms"] <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sum[op] += span["latency_ms"]
+
+    def render(self):
+        lines = [
+            "# TYPE llm_calls_total counter",
+        ]
+        with self._lock:
+            for (op, outcome), n in sorted(self._calls.items()):
+                lines.append(f'llm_calls_total{{op="{op}",outcome="{outcome}"}} {n}')
+            lines.append("# TYPE llm_tokens_total counter")
+            for (op, kind), n in sorted(self._tokens.items()):
+                lines.append(f'llm_tokens_total{{op="{op}",kind="{kind}"}} {n}')
+            lines.append("# TYPE llm_retries_total counter")
+            for op, n in sorted(self._retries.items()):
+                lines.append(f'llm_retries_total{{op="{op}"}} {n}')
+            lines.append("# TYPE llm_latency_ms histogram")
+            for op, counts in sorted(self._hist.items()):
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f'llm_latency_ms_bucket{{op="{op}",le="{bound}"}} {n}')
+                lines.append(f'llm_latency_ms_bucket{{op="{op}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'llm_latency_ms_sum{{op="{op}"}} {round(self._sum[op], 3)}')
+                lines.append(f'llm_latency_ms_count{{op="{op}"}} {counts[-1]}')
+        return "\n".join(lines) + "\n"
+
+
+SINK_TYPES = {"memory": RingBufferSink, "jsonl": JsonlSink, "prometheus": PrometheusSink}
+
+sinks = [SINK_TYPES[name.strip()]() for name in SINKS.split(",") if name.strip() in SINK_TYPES]
+
+def add_sink(sink):
+    """Any object with an emit(span_dict) method"""
+    sinks.append(sink)
+
+def find_sink(sink_type):
+    return next((s for s in sinks if isinstance(s, sink_type)), None)
+
+def emit(span):
+    for sink in sinks:
+        try:
+            sink.emit(span)
+        except Exception as e:
+            print(f"Telemetry sink error: {e}")
+
+# --- SPANS ---
+
+@contextmanager
+def span(op, **tags):
+    """
+    Times a block as one operation. Inside it, annotate() adds fields to
+    the span (tokens, retries, ...). Exceptions mark the outcome and re-raise.
+    """
+    record = {"op": op, "module": op.split(".")[0], "ts": time.time(), "retries": 0,
+              "prompt_tokens": None, "response_tokens": None, "outcome": "ok"}
+    record.update({k: v for k, v in tags.items() if v is not None})
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except GeneratorExit:
+        # A streaming caller stopped reading part-way through
+        record["outcome"] = "cancelled"
+        raise
+    except BaseException as e:
+        record["outcome"] = "error"
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass  # abandoned generator finalized from another context
+        emit(record)
+
+def annotate(**fields):
+    """Adds fields to the span currently running on this thread (if any)"""
+    record = _current.get()
+    if record is not None:
+        record.update(fields)
+
+def add_retry():
+    record = _current.get()
+    if record is not None:
+        record["retries"] += 1
+
+def record_usage(response):
+    """Copies token counts from a genai-style response.usage_metadata"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        annotate(prompt_tokens=getattr(usage, "prompt_token_count", None),
+                 response_tokens=getattr(usage, "candidates_token_count", None),
+                 cached_tokens=getattr(usage, "cached_content_token_count", None) or 0)
+
+def record_error(op, error, **tags):
+    """Counts an error handled outside a model call (e.g. an except branch in app.py)"""
+    record = {"op": op, "module": op.split(".")[0], "ts": time.time(), "retries": 0,
+              "latency_ms": 0.0, "outcome": "error", "error": type(error).__name__}
+    record.update({k: v for k, v in tags.items() if v is not None})
+    emit(record)
+
+# --- REPORTING ---
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def summary():
+    """Per-operation count, error rate and latency percentiles from the ring buffer"""
+    ring = find_sink(RingBufferSink)
+    if ring is None:
+        return []
+    by_op = collections.defaultdict(list)
+    for s in ring.spans():
+        by_op[s["op"]].append(s)
+    rows = []
+    for op, spans in sorted(by_op.items()):
+        latencies = sorted(s["latency_ms"] for s in spans)
+        errors = sum(1 for s in spans if s["outcome"] != "ok")
+        rows.append({
+            "op": op,
+            "calls": len(spans),
+            "errors": errors,
+            "error_rate": round(errors / len(spans), 3),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "retries": sum(s.get("retries", 0) for s in spans),
+            "prompt_tokens": sum(s.get("prompt_tokens") or 0 for s in spans),
+            "cached_tokens": sum(s.get("cached_tokens") or 0 for s in spans),
+            "response_tokens": sum(s.get("response_tokens") or 0 for s in spans),
+        })
+    return rows
+
+def render_prometheus():
+    sink = find_sink(PrometheusSink)
+    return sink.render() if sink else ""
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves render_prometheus() on /metrics in a daemon thread (once per process)"""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        # Imported here: http.server is slow to import and most processes never serve metrics
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        _server = ThreadingHTTPServer((host, int(port)), Handler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
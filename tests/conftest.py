@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Tests run against the offline stub with no pacing, no disk caches and
+# scratch stores; set before any engine module reads its configuration.
+SCRATCH = tempfile.mkdtemp(prefix="tutor-tests-")
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["LLM_RATE_PER_MINUTE"] = "0"
+os.environ["EVAL_CACHE_DISABLED"] = "1"
+os.environ["PREWARM_ENABLED"] = "0"
+os.environ["TELEMETRY_SINKS"] = "memory"
+os.environ["STUB_LATENCY_MS"] = "5"
+os.environ["STUB_FIRST_CHUNK_MS"] = "1"
+os.environ["STUB_CHUNK_CHARS"] = "8"
+os.environ["STUB_SEED"] = "0"
+os.environ["PROGRESS_DB_PATH"] = os.path.join(SCRATCH, "progress.sqlite3")
+os.environ["CHAT_STORE_PATH"] = os.path.join(SCRATCH, "chats.sqlite3")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
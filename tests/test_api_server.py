@@ -0,0 +1,98 @@
+import pytest
+
+import api_smoke
+import chat_sessions
+
+
+@pytest.fixture(scope="module")
+def client():
+    return api_smoke.Client(api_smoke.start_server())
+
+@pytest.fixture(scope="module")
+def scenario(client):
+    _, page = client.request("GET", "/scenarios?limit=5")
+    return page["scenarios"][0]
+
+@pytest.fixture(scope="module")
+def persona(client):
+    _, page = client.request("GET", "/personas")
+    return page["personas"][0]
+
+@pytest.fixture
+def chat(client, persona):
+    status, chat = client.request("POST", "/chat/sessions", {"persona_id": persona["id"], "tutor_id": "pytest"})
+    assert status == 200 and chat["opening"]
+    return f"/chat/sessions/{chat['session_id']}"
+
+
+def test_health_and_metrics(client):
+    status, health = client.request("GET", "/health")
+    assert status == 200 and health["backend"] == "stub"
+    status, metrics = client.request("GET", "/metrics")
+    assert status == 200 and "api_in_flight" in metrics
+    status, metrics = client.request("GET", "/metrics?format=json")
+    assert status == 200 and "api" in metrics
+
+def test_scenario_lookup(client, scenario):
+    status, found = client.request("GET", f"/scenarios/{scenario['id']}")
+    assert status == 200 and found["id"] == scenario["id"]
+    status, _ = client.request("GET", "/scenarios/does-not-exist")
+    assert status == 404
+
+def test_persona_lookup(client, persona):
+    status, found = client.request("GET", f"/personas/{persona['id']}")
+    assert status == 200 and found["id"] == persona["id"]
+
+def test_training_batch(client):
+    status, batch = client.request("GET", "/training-batch?tutor_id=pytest")
+    assert status == 200 and batch["goals"]
+
+def test_grade(client, scenario):
+    status, graded = client.request("POST", "/grade", {"response": "Let's agree on a plan together.",
+                                                       "scenario_id": scenario["id"], "tutor_id": "pytest"})
+    assert status == 200 and "evaluation" in graded
+    status, _ = client.request("POST", "/grade", {"scenario_id": scenario["id"]})
+    assert status == 400
+
+def test_training_plan(client, persona):
+    status, plan = client.request("POST", "/training-plan", {"conversation_log": ["Tutor: Hi.", "Student: Hey."],
+                                                             "persona_id": persona["id"], "tutor_id": "pytest"})
+    assert status == 200 and plan["training_plan"]
+
+def test_chat_replies_as_json_and_sse(client, chat):
+    status, reply = client.request("POST", f"{chat}/messages", {"message": "How are you feeling today?"})
+    assert status == 200 and reply["reply"] and reply["turns"] == 3
+    status, events = client.events(f"{chat}/messages", {"message": "What part feels hardest?"})
+    kinds = [event for event, _ in events]
+    assert status == 200 and "chunk" in kinds and kinds[-1] == "done"
+    assert "".join(data["text"] for event, data in events if event == "chunk")
+    assert events[-1][1]["turns"] == 5
+
+def test_message_while_replying_is_turned_away(client, chat):
+    (first, _), (second, _) = api_smoke.race(client, chat)
+    assert (first, second) == (200, 409)
+    status, record = client.request("GET", chat)
+    assert status == 200 and len(record["turns"]) == 3
+    assert record["turns"][-2][1] == "Race 0"
+    live = chat_sessions._live.get(chat.rsplit("/", 1)[1])
+    raced = [part for turn in live[1].history for part in turn.get("parts", []) if str(part).startswith("Race ")]
+    assert raced == ["Race 0"]
+    status, reply = client.request("POST", f"{chat}/messages", {"message": "Thanks for telling me."})
+    assert status == 200 and reply["turns"] == 5
+
+def test_chat_plan(client, chat):
+    status, _ = client.request("POST", f"{chat}/plan")
+    assert status == 400
+    client.request("POST", f"{chat}/messages", {"message": "How are you feeling today?"})
+    status, plan = client.request("POST", f"{chat}/plan")
+    assert status == 200 and plan["training_plan"]
+
+def test_unknown_route_and_method(client):
+    status, _ = client.request("GET", "/nowhere")
+    assert status == 404
+    status, _ = client.request("DELETE", "/health")
+    assert status == 405
+
+def test_smoke_script_checks_pass(client, capsys):
+    passed, total = api_smoke.run_checks(client)
+    assert passed, capsys.readouterr().out
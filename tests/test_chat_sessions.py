@@ -0,0 +1,84 @@
+import pytest
+
+import chat_sessions
+from chat_sessions import ChatRecord, StaleChatRecord
+
+PERSONA = "You are 'Alex', a shy 10th-grade math student."
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def store(request, tmp_path):
+    path = tmp_path / ("chats.sqlite3" if request.param == "sqlite" else "chats")
+    return chat_sessions.STORES[request.param](str(path))
+
+@pytest.fixture
+def shared_store(store, monkeypatch):
+    monkeypatch.setattr(chat_sessions, "_store", store)
+    monkeypatch.setattr(chat_sessions, "_live", chat_sessions.collections.OrderedDict())
+    return store
+
+def saved_record(store):
+    record = ChatRecord.new("tutor", "persona-1")
+    record.add("student", "Hi.")
+    store.put(record)
+    return record
+
+
+def test_put_bumps_the_revision_and_round_trips(store):
+    record = saved_record(store)
+    assert record.revision == 1
+    record.add("tutor", "Hello!")
+    store.put(record)
+    loaded = store.get(record.session_id)
+    assert loaded == record and loaded.revision == 2
+    assert store.get("unknown") is None
+
+def test_saving_an_outdated_copy_is_stale(store):
+    record = saved_record(store)
+    first, second = store.get(record.session_id), store.get(record.session_id)
+    first.add("tutor", "From replica one")
+    store.put(first)
+    second.add("tutor", "From replica two")
+    with pytest.raises(StaleChatRecord):
+        store.put(second)
+    assert second.revision == 1                # unchanged, so the caller can reload and retry
+    assert store.get(record.session_id).turns[-1] == ["tutor", "From replica one"]
+
+def test_a_new_record_cannot_overwrite_an_existing_chat(store):
+    record = saved_record(store)
+    clash = ChatRecord(session_id=record.session_id, tutor_id="other", persona_id="persona-2")
+    with pytest.raises(StaleChatRecord):
+        store.put(clash)
+    assert store.get(record.session_id).tutor_id == "tutor"
+
+def test_expired_chats_are_not_returned(store):
+    record = saved_record(store)
+    store.ttl_seconds = -1
+    assert store.get(record.session_id) is None
+
+def test_record_turn_keeps_the_live_chat_for_the_new_revision(shared_store):
+    record = saved_record(shared_store)
+    chat = chat_sessions.get_chat(record, PERSONA, "stub-chat")
+    reply = chat.send_message("How are you?").text
+    chat_sessions.record_turn(record, PERSONA, "stub-chat", chat, "How are you?", reply)
+    assert record.revision == 2 and record.turns[-1] == ["student", reply]
+    assert chat_sessions.get_chat(record, PERSONA, "stub-chat") is chat
+    outdated = ChatRecord.from_dict(dict(record.to_dict(), revision=1))
+    assert chat_sessions.get_chat(outdated, PERSONA, "stub-chat") is not chat
+
+def test_record_turn_on_a_stale_record_saves_nothing(shared_store):
+    record = saved_record(shared_store)
+    other = shared_store.get(record.session_id)
+    other.add("tutor", "Elsewhere")
+    shared_store.put(other)
+    chat = chat_sessions.get_chat(record, PERSONA, "stub-chat")
+    with pytest.raises(StaleChatRecord):
+        chat_sessions.record_turn(record, PERSONA, "stub-chat", chat, "Here", "Reply")
+    assert record.session_id not in chat_sessions._live
+    assert shared_store.get(record.session_id).turns[-1] == ["tutor", "Elsewhere"]
+
+def test_file_store_rejects_unsafe_session_ids(tmp_path):
+    store = chat_sessions.FileChatStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put(ChatRecord(session_id="../escape", tutor_id="t", persona_id="p"))
+    assert store.get("../escape") is None
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import goal_setting
+from goal_setting import CRITERIA_KEYS, ETHICAL_CAP, PROCESS_CAP, score_from_criteria
+
+
+def criteria(default=8, **scores):
+    return dict({key: default for key in CRITERIA_KEYS}, **scores)
+
+def payload(**overrides):
+    return dict(criteria(), violates_integrity=False, ignores_party=False, feedback="Fine.") | overrides
+
+
+def test_weights_sum_to_one():
+    assert sum(weight for _, _, weight, _ in goal_setting.CRITERIA) == pytest.approx(1.0)
+
+def test_weighted_score_uses_the_criterion_weights():
+    scores = criteria(pedagogical_integrity=10, stakeholder_alignment=5, tone=4, empathy=6,
+                      compromise=8, communication=3)
+    weighted, score, cap = score_from_criteria(scores, "General", False, False)
+    assert weighted == pytest.approx(0.25 * 10 + 0.20 * 5 + 0.10 * 4 + 0.10 * 6 + 0.25 * 8 + 0.10 * 3)
+    assert (score, cap) == (7, None)
+
+def test_half_points_round_up():
+    # round() would send 6.5 to 6
+    weighted, score, _ = score_from_criteria(criteria(default=6, pedagogical_integrity=8), "General", False, False)
+    assert weighted == pytest.approx(6.5) and score == 7
+    weighted, score, _ = score_from_criteria(criteria(default=6, pedagogical_integrity=7), "General", False, False)
+    assert weighted == pytest.approx(6.25) and score == 6
+
+def test_sub_scores_are_clamped_to_one_to_ten():
+    weighted, score, _ = score_from_criteria(criteria(default=15), "General", False, False)
+    assert (weighted, score) == (10, 10)
+    weighted, score, _ = score_from_criteria(criteria(default=-3), "General", False, False)
+    assert (weighted, score) == (1, 1)
+
+@pytest.mark.parametrize("conflict_type, violates, ignores, expected_cap", [
+    ("Ethical", True, False, ETHICAL_CAP),
+    ("Ethical", False, True, None),         # ignoring a party only caps Process conflicts
+    ("Process", False, True, PROCESS_CAP),
+    ("Process", True, False, None),         # integrity only caps Ethical conflicts
+    ("General", True, True, None),
+])
+def test_caps_follow_the_conflict_type(conflict_type, violates, ignores, expected_cap):
+    weighted, score, cap = score_from_criteria(criteria(default=9), conflict_type, violates, ignores)
+    assert weighted == 9 and cap == expected_cap
+    assert score == (expected_cap or 9)
+
+def test_cap_is_not_reported_when_the_score_is_already_below_it():
+    weighted, score, cap = score_from_criteria(criteria(default=2), "Process", False, True)
+    assert (score, cap) == (2, None)
+
+def test_build_evaluation_keeps_the_uncapped_weighted_score():
+    scenario = {"id": 7, "parent": "p", "student": "s", "conflict type": "Ethical"}
+    evaluation = goal_setting.build_evaluation(payload(violates_integrity=True, tone=42), scenario, "stub-m")
+    assert evaluation.criteria["tone"] == 10
+    assert evaluation.weighted_score > ETHICAL_CAP
+    assert (evaluation.score, evaluation.cap) == (ETHICAL_CAP, ETHICAL_CAP)
+    assert goal_setting.GoalEvaluation.from_dict(evaluation.to_dict()) == evaluation
+
+def test_parse_structured_accepts_fences_and_rejects_missing_keys():
+    assert goal_setting.parse_structured("```json\n" + json.dumps(payload()) + "\n```") == payload()
+    partial = payload()
+    del partial["compromise"]
+    with pytest.raises(ValueError, match="compromise"):
+        goal_setting.parse_structured(json.dumps(partial))
+
+def test_structured_grading_against_the_stub():
+    scenario = {"id": 1, "parent": "More practice", "student": "Less", "conflict type": "Process"}
+    evaluation = goal_setting.grade_tutor_response_structured("Let's plan together.", scenario, use_cache=False)
+    assert set(evaluation.criteria) == set(CRITERIA_KEYS)
+    assert all(1 <= value <= 10 for value in evaluation.criteria.values())
+    expected = score_from_criteria(evaluation.criteria, "Process", evaluation.violates_integrity,
+                                   evaluation.ignores_party)
+    assert (evaluation.weighted_score, evaluation.score, evaluation.cap) == expected
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import jobs
+
+
+def finish(queue):
+    """Waits until every submitted job has been taken off the queue and processed"""
+    queue._queue.join()
+
+
+def test_result_is_delivered_through_on_done():
+    queue = jobs.JobQueue(workers=2)
+    seen = []
+    job_id = queue.submit(lambda a, b=0: a + b, 2, b=3, kind="sum", on_done=lambda r: seen.append(r) or r * 10)
+    finish(queue)
+    job = queue.get(job_id)
+    assert (job.kind, job.status, job.result, job.error) == ("sum", jobs.DONE, 50, None)
+    assert seen == [5]
+    assert job.fn is None and job.on_done is None
+
+def test_errors_skip_on_done():
+    queue = jobs.JobQueue(workers=1)
+    seen = []
+
+    def boom():
+        raise RuntimeError("model down")
+    job_id = queue.submit(boom, on_done=seen.append)
+    finish(queue)
+    job = queue.get(job_id)
+    assert job.status == jobs.FAILED and str(job.error) == "model down"
+    assert seen == []
+
+def test_on_done_errors_fail_the_job():
+    queue = jobs.JobQueue(workers=1)
+
+    def save(result):
+        raise OSError("disk full")
+    job_id = queue.submit(lambda: "graded", on_done=save)
+    finish(queue)
+    assert queue.get(job_id).status == jobs.FAILED
+
+def test_cancelled_queued_job_never_runs():
+    queue = jobs.JobQueue(workers=1)
+    gate = threading.Event()
+    ran = []
+    blocker = queue.submit(gate.wait)
+    job_id = queue.submit(ran.append, "ran", on_done=ran.append)
+    assert queue.cancel(job_id)
+    gate.set()
+    finish(queue)
+    assert queue.get(job_id).status == jobs.CANCELLED and ran == []
+    assert queue.get(blocker).status == jobs.DONE
+
+def test_cancelled_running_job_discards_its_result():
+    queue = jobs.JobQueue(workers=1)
+    started, gate = threading.Event(), threading.Event()
+    saved = []
+
+    def grade():
+        started.set()
+        gate.wait()
+        return "graded"
+    job_id = queue.submit(grade, on_done=saved.append)
+    started.wait(5)
+    assert queue.get(job_id).status == jobs.RUNNING
+    assert queue.cancel(job_id)
+    gate.set()
+    finish(queue)
+    job = queue.get(job_id)
+    assert (job.status, job.result) == (jobs.CANCELLED, None)
+    assert saved == []
+
+def test_cancel_is_refused_once_on_done_has_started():
+    queue = jobs.JobQueue(workers=1)
+    committing, gate = threading.Event(), threading.Event()
+
+    def save(result):
+        committing.set()
+        gate.wait()
+        return result
+    job_id = queue.submit(lambda: "graded", on_done=save)
+    committing.wait(5)
+    assert not queue.cancel(job_id)
+    gate.set()
+    finish(queue)
+    assert queue.get(job_id).status == jobs.DONE and queue.get(job_id).result == "graded"
+
+def test_finished_jobs_cannot_be_cancelled():
+    queue = jobs.JobQueue(workers=1)
+    job_id = queue.submit(lambda: 1)
+    finish(queue)
+    assert not queue.cancel(job_id)
+    assert not queue.cancel("no-such-job")
+
+def test_full_queue_rejects_new_jobs():
+    queue = jobs.JobQueue(workers=1, max_queued=1)
+    started, gate = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait()
+    queue.submit(hold)
+    started.wait(5)
+    queue.submit(lambda: None)
+    with pytest.raises(jobs.JobQueueFull):
+        queue.submit(lambda: None)
+    assert queue.stats()["queued"] == 1 and queue.stats()["running"] == 1
+    gate.set()
+    finish(queue)
+    assert queue.stats()["done"] == 2
+
+def test_old_results_are_pruned_on_submit():
+    queue = jobs.JobQueue(workers=1, result_ttl=0)
+    old = queue.submit(lambda: 1)
+    finish(queue)
+    queue.get(old).finished -= 1
+    queue.submit(lambda: 2)
+    assert queue.get(old) is None
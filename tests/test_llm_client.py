@@ -0,0 +1,190 @@
+import pytest
+
+import llm_client
+import stub_backend
+
+
+class FakeClock:
+    """Stands in for llm_client's time module: sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_client, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def fresh_models(monkeypatch):
+    monkeypatch.setattr(llm_client, "_models", {})
+    monkeypatch.setattr(llm_client, "_backend", None)
+
+
+# --- BACKEND SELECTION ---
+
+def test_stub_backend_is_selected(fresh_models):
+    assert llm_client.is_offline()
+    assert isinstance(llm_client.configure(), llm_client.StubBackend)
+    model = llm_client.get_model(llm_client.resolve_model_name("GEMINI_MODEL_1"))
+    assert isinstance(model, stub_backend.StubModel)
+
+def test_unknown_backend_is_rejected(fresh_models, monkeypatch):
+    monkeypatch.setattr(llm_client, "BACKEND", "nope")
+    with pytest.raises(ValueError, match="Unknown LLM_BACKEND"):
+        llm_client.configure()
+
+def test_registered_backend_is_used(fresh_models, monkeypatch):
+    class Custom(llm_client.StubBackend):
+        configured = 0
+
+        def configure(self):
+            Custom.configured += 1
+
+    monkeypatch.setitem(llm_client.BACKENDS, "custom", Custom)
+    monkeypatch.setattr(llm_client, "BACKEND", "custom")
+    assert isinstance(llm_client.configure(), Custom)
+    llm_client.configure()
+    assert Custom.configured == 1
+
+def test_stub_model_names_need_no_environment(monkeypatch):
+    monkeypatch.delenv("GEMINI_MODEL_X", raising=False)
+    assert llm_client.resolve_model_name("GEMINI_MODEL_X") == "stub-gemini_model_x"
+    monkeypatch.setattr(llm_client, "BACKEND", "gemini")
+    assert llm_client.resolve_model_name("GEMINI_MODEL_X") is None
+
+
+# --- RATE LIMITER ---
+
+def test_rate_limiter_allows_a_burst_then_waits_for_refill(clock):
+    limiter = llm_client.RateLimiter(60, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == []
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+def test_rate_limiter_refills_with_elapsed_time(clock):
+    limiter = llm_client.RateLimiter(60, burst=1)
+    limiter.acquire()
+    clock.now += 0.5
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+    clock.now += 10
+    limiter.acquire()
+    assert len(clock.sleeps) == 1          # the bucket refilled, but only up to the burst
+
+def test_rate_limiter_keys_have_separate_buckets(clock):
+    limiter = llm_client.RateLimiter(60, burst=1)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    assert clock.sleeps == []
+
+def test_rate_limiter_zero_rate_never_waits(clock):
+    limiter = llm_client.RateLimiter(0)
+    for _ in range(100):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+
+# --- RETRIES ---
+
+@pytest.fixture
+def jitter(monkeypatch, clock):
+    """Records the (low, high) range of every backoff draw and sleeps for its upper bound"""
+    ranges = []
+
+    def uniform(low, high):
+        ranges.append((low, high))
+        return high
+    monkeypatch.setattr(llm_client.random, "uniform", uniform)
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(llm_client, "BACKOFF_MAX", 3.0)
+    monkeypatch.setattr(llm_client, "MAX_RETRIES", 3)
+    return ranges
+
+def failing(*errors, result="ok"):
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return call, calls
+
+def test_transient_errors_are_retried_with_capped_jitter(jitter, clock):
+    call, calls = failing(stub_backend.StubError(503, "busy"), stub_backend.StubError(429, "quota"),
+                          stub_backend.StubError(500, "oops"))
+    assert llm_client.with_retries(call) == "ok"
+    assert len(calls) == 4
+    # Full jitter: [0, base * 2^attempt], capped at BACKOFF_MAX
+    assert jitter == [(0, 1.0), (0, 2.0), (0, 3.0)]
+    assert clock.sleeps == [1.0, 2.0, 3.0]
+
+def test_permanent_errors_are_not_retried(jitter):
+    call, calls = failing(stub_backend.StubError(400, "bad request"))
+    with pytest.raises(stub_backend.StubError):
+        llm_client.with_retries(call)
+    assert len(calls) == 1 and jitter == []
+
+def test_retries_give_up_after_max_retries(jitter):
+    call, calls = failing(*[stub_backend.StubError(503, "busy")] * 10)
+    with pytest.raises(stub_backend.StubError):
+        llm_client.with_retries(call)
+    assert len(calls) == 4
+
+def test_is_retryable_reads_codes_not_substrings():
+    assert llm_client.is_retryable(stub_backend.StubError(429, "quota"))
+    assert not llm_client.is_retryable(ValueError("scenario 503 not found"))
+    assert llm_client.is_retryable(RuntimeError("503 Service Unavailable"))
+
+
+# --- PROMPT PREFIX CACHE ---
+
+PREFIX = llm_client.PromptPrefix("test", "1", """
+    A static rubric that is long enough to be worth caching.
+""")
+
+def test_prefix_key_follows_version_and_text():
+    assert PREFIX.key.startswith("test@1:")
+    assert llm_client.PromptPrefix("test", "2", PREFIX.text).key != PREFIX.key
+    assert llm_client.PromptPrefix("test", "1", PREFIX.text + "!").key != PREFIX.key
+    assert llm_client.template_key(PREFIX, "{a}") != llm_client.template_key(PREFIX, "{b}")
+
+def test_prefix_model_is_reused(fresh_models, monkeypatch):
+    monkeypatch.setattr(llm_client, "CONTEXT_CACHE", False)
+    first = llm_client.get_model("stub-m", PREFIX)
+    assert llm_client.get_model("stub-m", PREFIX) is first
+    assert first.system_instruction == PREFIX.text
+    assert llm_client.get_model("stub-m") is not first
+
+def test_context_cached_model_is_recreated_before_it_expires(fresh_models, monkeypatch, clock):
+    monkeypatch.setattr(llm_client, "CONTEXT_CACHE", True)
+    monkeypatch.setattr(llm_client, "CONTEXT_CACHE_TTL", 100)
+    first = llm_client.get_model("stub-m", PREFIX)
+    assert first.cached_tokens > 0
+    clock.now += 89
+    assert llm_client.get_model("stub-m", PREFIX) is first
+    clock.now += 2                         # past 90% of the TTL
+    second = llm_client.get_model("stub-m", PREFIX)
+    assert second is not first and second.cached_tokens > 0
+
+def test_generate_with_prefix_bills_only_the_suffix(fresh_models, monkeypatch):
+    monkeypatch.setattr(llm_client, "CONTEXT_CACHE", True)
+    model = llm_client.get_model("stub-m", PREFIX)
+    response = model.generate_content("short suffix")
+    usage = response.usage_metadata
+    assert usage.cached_content_token_count == model.cached_tokens
+    assert usage.prompt_token_count - usage.cached_content_token_count < usage.prompt_token_count
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import near_duplicates
+from near_duplicates import MinHasher, NearDuplicateIndex, shingles, similarity
+
+VOCABULARY = [f"word{i}" for i in range(500)]
+
+
+def text(rng, words=80):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+def edit(rng, source, changes):
+    """source with `changes` words replaced at seeded positions"""
+    words = source.split()
+    for i in rng.sample(range(len(words)), changes):
+        words[i] = rng.choice(VOCABULARY) + "x"
+    return " ".join(words)
+
+def jaccard(a, b):
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+def test_shingles():
+    assert shingles("The tutor, the parent") == {"the tutor the", "tutor the parent"}
+    assert shingles("Too short") == {"too short"}
+
+def test_signatures_are_deterministic_for_a_seed():
+    sample = text(random.Random(1))
+    assert MinHasher(seed=1).signature(sample) == MinHasher(seed=1).signature(sample)
+    assert MinHasher(seed=1).signature(sample) != MinHasher(seed=2).signature(sample)
+    assert len(MinHasher(num_hashes=32).signature(sample)) == 32
+
+def test_signature_similarity_estimates_jaccard():
+    rng = random.Random(7)
+    hasher = MinHasher(num_hashes=256)
+    for changes in (0, 2, 5, 10, 20):
+        base = text(rng)
+        other = edit(rng, base, changes)
+        estimate = similarity(hasher.signature(base), hasher.signature(other))
+        assert estimate == pytest.approx(jaccard(base, other), abs=0.1)
+
+def test_near_copies_are_found_and_unrelated_texts_are_not():
+    rng = random.Random(11)
+    index = NearDuplicateIndex()
+    originals = [text(rng) for _ in range(200)]
+    for i, original in enumerate(originals):
+        assert index.add_if_new(i, original) is None
+    assert len(index) == 200
+    for i in range(0, 200, 10):
+        copy = edit(rng, originals[i], 2)       # Jaccard around 0.85
+        assert jaccard(copy, originals[i]) > 0.75
+        key, score = index.find(copy)
+        assert key == i and score >= near_duplicates.THRESHOLD
+    for _ in range(50):
+        assert index.find(text(rng)) is None
+
+def test_pairs_below_the_threshold_are_not_matches():
+    rng = random.Random(13)
+    index = NearDuplicateIndex(threshold=0.6)
+    base = text(rng)
+    index.add("base", base)
+    distant = edit(rng, base, 25)               # Jaccard well under 0.3
+    assert jaccard(base, distant) < 0.3
+    assert index.find(distant) is None
+
+def test_threshold_decides_borderline_matches():
+    rng = random.Random(17)
+    base = text(rng)
+    copy = edit(rng, base, 2)
+    loose, strict = NearDuplicateIndex(threshold=0.5), NearDuplicateIndex(threshold=1.0)
+    loose.add("base", base)
+    strict.add("base", base)
+    assert loose.find(copy)[0] == "base"
+    assert strict.find(copy) is None
+    assert strict.find(base) == ("base", 1.0)
+
+def test_add_if_new_keeps_only_the_first_of_a_pair():
+    rng = random.Random(19)
+    index = NearDuplicateIndex()
+    base = text(rng)
+    assert index.add_if_new("first", base) is None
+    key, _ = index.add_if_new("second", edit(rng, base, 1))
+    assert key == "first" and len(index) == 1
+
+def test_bands_must_divide_the_hashes():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_hashes=64, bands=10)
@@ -0,0 +1,123 @@
+import collections
+import random
+
+import pytest
+
+import progress_store
+import scheduler
+from rubric import CRITERIA_KEYS
+
+
+class FakeProgress:
+    """The progress_store reads the scheduler uses, from in-memory data"""
+
+    def __init__(self, history=(), goals=None, sims=None):
+        self.history = [list(row) for row in history]      # newest first
+        self.goals = dict(goals or {})
+        self.sims = dict(sims or {})
+        self.revision = 0
+
+    def tutor_revision(self, tutor_id):
+        return self.revision
+
+    def criteria_history(self, tutor_id, limit=50):
+        return self.history[:limit]
+
+    def completed(self, tutor_id, kind):
+        return dict(self.goals if kind == progress_store.GOAL else self.sims)
+
+
+class FakeStore:
+    def __init__(self, per_type=20):
+        self.version = "v1"
+        self.goal_scenarios = [{"id": f"{kind[0]}{i}", "conflict type": kind}
+                               for kind in ("Ethical", "Process") for i in range(per_type)]
+        self.personas = [{"id": f"p{i}"} for i in range(4)]
+        self._by_id = {s["id"]: s for s in self.goal_scenarios}
+
+    def get_scenario(self, scenario_id):
+        return self._by_id.get(scenario_id)
+
+
+def row(default=8, **scores):
+    return [scores.get(key, default) for key in CRITERIA_KEYS]
+
+def new_scheduler(seed=0, **progress):
+    return scheduler.Scheduler(progress=FakeProgress(**progress), rng=random.Random(seed))
+
+
+def test_pick_follows_the_weights():
+    picker = new_scheduler(seed=1)
+    counts = collections.Counter(picker._pick([(1.0, "a"), (3.0, "b"), (0.0, "never")], 1)[0]
+                                 for _ in range(4000))
+    assert counts["b"] / 4000 == pytest.approx(0.75, abs=0.03)
+    assert "never" not in counts
+
+def test_pick_draws_without_replacement():
+    picker = new_scheduler(seed=2)
+    drawn = picker._pick([(w, name) for w, name in zip((5, 1, 1, 0.1), "abcd")], 4)
+    assert sorted(drawn) == ["a", "b", "c", "d"]
+
+def test_selection_is_reproducible_for_a_seed():
+    store = FakeStore()
+    first = [s["id"] for _ in range(20) for s in new_scheduler(seed=7).select_goals("t", store)]
+    second = [s["id"] for _ in range(20) for s in new_scheduler(seed=7).select_goals("t", store)]
+    assert first == second
+
+def test_profile_without_attempts_uses_the_prior():
+    profile = new_scheduler().profile("t")
+    expected = (scheduler.SCORE_MAX - scheduler.PRIOR_SCORE) / (scheduler.SCORE_MAX - 1)
+    assert profile.weakness == pytest.approx([expected] * len(CRITERIA_KEYS))
+    assert profile.focus() == []
+
+def test_recent_attempts_count_more():
+    recent_low = new_scheduler(history=[row(empathy=2), row(empathy=9)]).profile("t")
+    recent_high = new_scheduler(history=[row(empathy=9), row(empathy=2)]).profile("t")
+    i = CRITERIA_KEYS.index("empathy")
+    assert recent_low.weakness[i] > recent_high.weakness[i]
+    assert recent_low.focus(1) == ["Empathy"]
+
+def test_profile_is_rebuilt_after_a_new_attempt():
+    picker = new_scheduler(history=[row()])
+    profile = picker.profile("t")
+    assert picker.profile("t") is profile
+    picker.progress.revision += 1
+    assert picker.profile("t") is not profile
+
+def test_weak_areas_come_up_most_often():
+    # Weak on what Process cases target, strong on what Ethical cases target
+    weak_process = row(default=9, compromise=2, tone=2, empathy=2)
+    picker = new_scheduler(seed=3, history=[weak_process] * 10)
+    store = FakeStore()
+    counts = collections.Counter(s["conflict type"] for _ in range(500) for s in picker.select_goals("t", store, k=1))
+    assert counts["Process"] > 2 * counts["Ethical"] > 0
+
+def test_goals_are_distinct_and_prefer_unseen_scenarios():
+    store = FakeStore(per_type=3)
+    done = {s["id"]: 9 for s in store.goal_scenarios if s["id"] not in ("E0", "P0")}
+    picker = new_scheduler(seed=4, goals=done)
+    for _ in range(50):
+        ids = [s["id"] for s in picker.select_goals("t", store, k=2)]
+        assert sorted(ids) == ["E0", "P0"]
+
+def test_conflict_type_filter():
+    picker = new_scheduler(seed=5)
+    goals = picker.select_goals("t", FakeStore(), k=4, conflict_type="Ethical")
+    assert len(goals) == 4 and {g["conflict type"] for g in goals} == {"Ethical"}
+
+def test_failed_scenarios_come_back_as_retries():
+    store = FakeStore(per_type=1)
+    picker = new_scheduler(seed=6, goals={"E0": 3, "P0": 9})
+    candidates = picker._candidates(picker.profile("t"), picker.index(store), store)
+    assert [item for _, item, _ in candidates if item[0] == "retry"] == [("retry", "E0")]
+
+def test_unseen_personas_are_preferred():
+    store = FakeStore()
+    picker = new_scheduler(seed=8, sims={"p0": 9, "p1": 9})
+    counts = collections.Counter(p["id"] for _ in range(500) for p in picker.select_personas("t", store.personas, 1))
+    assert counts["p2"] + counts["p3"] > 4 * (counts["p0"] + counts["p1"])
+
+def test_next_batch_shape():
+    batch = new_scheduler(seed=9, history=[row(tone=1)]).next_batch("t", FakeStore())
+    assert len(batch["goals"]) == 2 and len(batch["judgments"]) == 2
+    assert batch["focus"][0] == "Tone"
@@ -0,0 +1,82 @@
+import pytest
+
+import judgment_call
+import llm_client
+import stub_backend
+
+HISTORY = [{"role": "user", "parts": ["You are Alex."]}, {"role": "model", "parts": ["Okay."]}]
+
+
+def new_chat():
+    return llm_client.start_chat("stub-streaming", history=HISTORY)
+
+
+class BrokenStream:
+    """Wraps a stub chat so its stream fails after `after` chunks"""
+
+    def __init__(self, chat, after=1):
+        self.chat = chat
+        self.after = after
+        self.model = chat.model
+
+    @property
+    def history(self):
+        return self.chat.history
+
+    def send_message(self, message, stream=False):
+        response = self.chat.send_message(message, stream=stream)
+
+        def chunks():
+            for i, chunk in enumerate(response):
+                if i == self.after:
+                    raise ConnectionError("stream dropped")
+                yield chunk
+        return chunks()
+
+
+def test_chunks_arrive_in_order_and_join_to_the_reply():
+    expected = llm_client.send_message(new_chat(), "How was your week?").text
+    pieces = list(judgment_call.stream_reply(new_chat(), "How was your week?"))
+    assert len(pieces) > 1
+    assert all(len(piece) <= stub_backend.CHUNK_CHARS for piece in pieces)
+    assert "".join(pieces) == expected
+
+def test_history_is_appended_once_the_stream_finishes():
+    chat = new_chat()
+    stream = judgment_call.stream_reply(chat, "How was your week?")
+    pieces = [next(stream)]
+    assert chat.history == HISTORY
+    pieces.extend(stream)
+    assert chat.history == HISTORY + [{"role": "user", "parts": ["How was your week?"]},
+                                      {"role": "model", "parts": ["".join(pieces)]}]
+
+def test_error_mid_stream_leaves_history_untouched():
+    chat = new_chat()
+    pieces = []
+    with pytest.raises(ConnectionError):
+        for piece in judgment_call.stream_reply(BrokenStream(chat), "How was your week?"):
+            pieces.append(piece)
+    assert len(pieces) == 1
+    assert chat.history == HISTORY
+
+def test_abandoned_stream_leaves_history_untouched():
+    chat = new_chat()
+    stream = judgment_call.stream_reply(chat, "How was your week?")
+    next(stream)
+    stream.close()
+    assert chat.history == HISTORY
+
+def test_failed_first_request_is_retried(monkeypatch):
+    monkeypatch.setattr(llm_client.time, "sleep", lambda seconds: None)
+    chat = new_chat()
+    errors = [stub_backend.StubError(503, "busy")]
+    send = chat.send_message
+
+    def flaky(message, stream=False):
+        if errors:
+            raise errors.pop()
+        return send(message, stream=stream)
+    monkeypatch.setattr(chat, "send_message", flaky)
+    reply = "".join(judgment_call.stream_reply(chat, "How was your week?"))
+    assert reply and chat.history[-1] == {"role": "model", "parts": [reply]}
+    assert len(chat.history) == len(HISTORY) + 2
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+import turn_scoring
+from turn_scoring import CRITERIA_KEYS, SessionScore, SessionScorer, TurnAssessment
+
+PERSONA = "You are 'Alex', a shy 10th-grade math student."
+TURNS = [("student", "Hi."), ("tutor", "How are you?"), ("student", "Fine."),
+         ("tutor", "What feels hard?"), ("student", "Everything."), ("tutor", "Let's start small.")]
+
+
+def assessment(turn, score=6, rating="moderately appropriate"):
+    return TurnAssessment(turn=turn, criteria={key: score for key in CRITERIA_KEYS}, appropriateness=rating,
+                          strength="Warm.", growth="Ask more.", practice="Pause first.", tutor_text=f"turn {turn}")
+
+
+class FakeScorer:
+    """Stands in for score_turn: turns listed in `hold` block until release(), `fail` fail once"""
+
+    def __init__(self, hold=(), fail=()):
+        self.hold = set(hold)
+        self.fail = set(fail)
+        self.calls = []
+        self.started = threading.Event()
+        self._released = threading.Event()
+
+    def release(self):
+        self._released.set()
+
+    def __call__(self, turn_index, persona_desc, context, tutor_text, reply, **kwargs):
+        self.calls.append(turn_index)
+        if turn_index in self.hold:
+            self.started.set()
+            self._released.wait(30)
+        if turn_index in self.fail:
+            self.fail.discard(turn_index)
+            raise RuntimeError("model down")
+        return assessment(turn_index)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def install(**kwargs):
+        scorer = FakeScorer(**kwargs)
+        monkeypatch.setattr(turn_scoring, "score_turn", scorer)
+        return scorer
+    return install
+
+
+def test_turns_are_scored_in_the_background(fake):
+    fake()
+    queue = jobs.JobQueue(workers=2)
+    scorer = SessionScorer(PERSONA, job_queue=queue)
+    scorer.catch_up(TURNS)
+    queue._queue.join()
+    assert sorted(scorer.state.scored) == [1, 3]         # the last tutor turn has no reply yet
+    assert scorer.stats() == {"scored": 2, "in_flight": 0, "unscored": 0, "failed": 0}
+    plan = scorer.training_plan(timeout=1)
+    assert "Partial plan" not in plan and "2 turns scored" in plan
+
+def test_resubmitting_a_scored_turn_is_a_no_op(fake):
+    scores = fake()
+    queue = jobs.JobQueue(workers=1)
+    scorer = SessionScorer(PERSONA, job_queue=queue)
+    scorer.catch_up(TURNS)
+    queue._queue.join()
+    scorer.catch_up(TURNS)
+    queue._queue.join()
+    assert sorted(scores.calls) == [1, 3]
+
+def test_turns_that_missed_the_queue_are_scored_by_wait(fake):
+    fake()
+    queue = jobs.JobQueue(workers=0, max_queued=1)      # nothing ever runs the queued job
+    scorer = SessionScorer(PERSONA, job_queue=queue)
+    scorer.catch_up(TURNS)
+    assert scorer.stats()["in_flight"] == 1 and scorer.stats()["unscored"] == 1
+    state = scorer.wait(timeout=5)
+    assert sorted(state.scored) == [1, 3]
+    assert scorer.stats()["unscored"] == 0
+
+def test_failed_turns_are_retried_as_leftovers(fake):
+    fake(fail={3})
+    queue = jobs.JobQueue(workers=1)
+    scorer = SessionScorer(PERSONA, job_queue=queue)
+    scorer.catch_up(TURNS)
+    queue._queue.join()
+    assert scorer.stats()["failed"] == 1 and scorer.stats()["unscored"] == 1
+    assert sorted(scorer.wait(timeout=5).scored) == [1, 3]
+
+def test_wait_waits_for_turns_in_flight(fake):
+    scores = fake(hold={1})
+    scorer = SessionScorer(PERSONA, job_queue=jobs.JobQueue(workers=1))
+    scorer.submit(1, "Hi.", "How are you?", "Fine.")
+    scores.started.wait(5)
+    threading.Timer(0.05, scores.release).start()
+    assert scorer.wait(timeout=10).scored == [1]
+
+def test_plan_is_partial_when_the_deadline_passes(fake):
+    scores = fake(hold={3})
+    scorer = SessionScorer(PERSONA, job_queue=jobs.JobQueue(workers=0))
+    for i in (1, 3):
+        scorer._inputs[i] = ("", f"tutor {i}", "reply")  # as if the queue had been full
+    try:
+        start = time.monotonic()
+        plan = scorer.training_plan(timeout=0.2)
+        assert time.monotonic() - start < 5
+        assert scorer.state.scored == [1]
+        assert plan.endswith("_Partial plan: 1 turn(s) could not be scored in time and are not included._")
+    finally:
+        scores.release()
+
+def test_no_plan_without_any_scored_turn(fake):
+    scores = fake(hold={1})
+    scorer = SessionScorer(PERSONA, job_queue=jobs.JobQueue(workers=0))
+    scorer._inputs[1] = ("", "tutor", "reply")
+    try:
+        assert scorer.training_plan(timeout=0.1) is None
+    finally:
+        scores.release()
+
+
+def test_session_score_skips_inapplicable_criteria_and_duplicates():
+    state = SessionScore()
+    first = assessment(1, score=8, rating="highly appropriate")
+    first.criteria["equity_awareness"] = 0
+    assert state.add(first)
+    assert not state.add(assessment(1, score=2))
+    assert state.add(assessment(3, score=4, rating="inappropriate"))
+    averages = state.averages()
+    assert averages["equity_awareness"] == 4 and averages["genuine_care"] == 6
+    assert state.best["genuine_care"][1] == 1 and state.worst["genuine_care"][1] == 3
+    assert state.overall_rating() == "moderately appropriate"
+    assert SessionScore.from_dict(state.to_dict()) == state
@@ -0,0 +1,432 @@
+import argparse
+import atexit
+import collections
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# --- TRAFFIC RECORD / REPLAY ---
+# With TRAFFIC_RECORD_PATH set, the app (and judgment_call's CLI) append
+# every tutor-facing operation to a cassette: one JSON line per operation
+# with the session, scenario/persona id, the tutor's input, the model's
+# output, the wall-clock time and the latency. A path ending in .gz is
+# gzip-compressed.
+#
+#   op         what ran                                  in / out
+#   goal       grading a goal-setting response           response / grade
+#   chat_open  a Judgment Call chat's opening line       - / opening
+#   chat       one tutor turn and the student's reply    message / reply
+#   plan       the end-of-session training plan          - / plan
+#
+# `python traffic.py replay <cassette>` runs the recorded sessions through
+# the same engine calls the app makes, at the recorded pace (--speed 1),
+# N times faster (--speed N) or as fast as possible (--speed 0), with up to
+# --concurrency sessions at once, and prints a latency/throughput report.
+# Replays default to the offline stub and scratch stores; --backend
+# cassette answers chat turns with the recorded replies so transcripts
+# (and therefore prompt sizes) match production. The client rate limit
+# (LLM_RATE_PER_MINUTE) applies as in the app; set it to 0 to measure the
+# engine without it.
+
+RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH")
+FORMAT_VERSION = 1
+
+GOAL = "goal"
+CHAT_OPEN = "chat_open"
+CHAT = "chat"
+PLAN = "plan"
+
+
+# --- RECORDING ---
+
+def _open(path, mode):
+    folder = os.path.dirname(path)
+    if folder and mode != "r":
+        os.makedirs(folder, exist_ok=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Recorder:
+    """Appends events to a cassette; each process starts with a header line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = 0
+        self._lock = threading.Lock()
+        self._file = _open(path, "a")
+        self._write({"cassette": FORMAT_VERSION, "started": time.time(), "pid": os.getpid(),
+                     "backend": os.getenv("LLM_BACKEND", "gemini")})
+
+    def _write(self, line):
+        text = json.dumps(line, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._file.write(text)
+            self._file.flush()
+
+    def record(self, session, op, item_id=None, tutor_input=None, output=None, ms=0.0, ok=True, ts=None):
+        event = {"ts": round(ts or time.time(), 3), "s": session, "op": op, "ms": round(ms, 1)}
+        if item_id is not None:
+            event["id"] = item_id
+        if tutor_input is not None:
+            event["in"] = tutor_input
+        if output is not None:
+            event["out"] = output
+        if not ok:
+            event["ok"] = False
+        self._write(event)
+        self.events += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+def get_recorder():
+    """Process-wide Recorder, or None when TRAFFIC_RECORD_PATH is not set"""
+    global _recorder
+    if not RECORD_PATH:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder(RECORD_PATH)
+            # Closing writes the gzip trailer
+            atexit.register(_recorder.close)
+        return _recorder
+
+@contextmanager
+def capture(op, session, item_id=None, tutor_input=None):
+    """
+    Times a block and records it. Set event["out"] inside the block to
+    record the model's output. Does nothing when recording is off or
+    session is None.
+    """
+    event = {}
+    recorder = get_recorder() if session is not None else None
+    if recorder is None:
+        yield event
+        return
+    ts, start = time.time(), time.perf_counter()
+    ok = False
+    try:
+        yield event
+        ok = True
+    finally:
+        recorder.record(session, op, item_id, tutor_input, event.get("out"),
+                        (time.perf_counter() - start) * 1000, ok, ts)
+
+
+def load(path):
+    """(headers, events) of a cassette, events in time order"""
+    headers, events = [], []
+    with _open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            (headers if "cassette" in entry else events).append(entry)
+    events.sort(key=lambda e: e["ts"])
+    return headers, events
+
+def describe(events):
+    """Sessions, operations and duration of a recording"""
+    if not events:
+        return {"sessions": 0, "events": 0}
+    return {
+        "sessions": len({e["s"] for e in events}),
+        "events": len(events),
+        "ops": dict(collections.Counter(e["op"] for e in events)),
+        "errors": sum(1 for e in events if e.get("ok") is False),
+        "duration_s": round(events[-1]["ts"] - events[0]["ts"], 3),
+    }
+
+
+# --- CASSETTE BACKEND ---
+# The offline stub, except that chats answer a tutor message (or the
+# opening request) with the reply recorded for it. replay() registers it
+# in place of the stub, like benchmark.py does; everything else behaves
+# like the stub.
+
+def register_cassette_backend(events):
+    import llm_client
+    import stub_backend
+    import transcript
+
+    replies = collections.defaultdict(collections.deque)
+    for event in events:
+        if event.get("ok") is False or not isinstance(event.get("out"), str):
+            continue
+        if event["op"] == CHAT and event.get("in"):
+            replies[event["in"]].append(event["out"])
+        elif event["op"] == CHAT_OPEN:
+            replies[transcript.OPENING_MESSAGE].append(event["out"])
+    lock = threading.Lock()
+
+    def recorded_reply(message):
+        with lock:
+            queue = replies.get(message)
+            if not queue:
+                return None
+            # Cycle so a message replayed more often than recorded still gets a real reply
+            queue.rotate(-1)
+            return queue[-1]
+
+    class CassetteChatSession(stub_backend.StubChatSession):
+        def send_message(self, message, stream=False, **kwargs):
+            text = recorded_reply(message)
+            if text is None:
+                return super().send_message(message, stream=stream, **kwargs)
+            prompt_text = self.model.system_instruction + "".join(
+                part for turn in self.history for part in turn.get("parts", [])) + message
+            self.model._maybe_fail()
+
+            def record(reply):
+                self.history.append({"role": "user", "parts": [message]})
+                self.history.append({"role": "model", "parts": [reply]})
+            return stub_backend.StubResponse(text, prompt_text, stream, on_done=record,
+                                             cached_tokens=self.model.cached_tokens)
+
+    class CassetteModel(stub_backend.StubModel):
+        def start_chat(self, history=None, **kwargs):
+            return CassetteChatSession(self, history)
+
+    class CassetteBackend(llm_client.StubBackend):
+        def create_model(self, model_name, system_instruction=None):
+            return CassetteModel(model_name, system_instruction=system_instruction)
+
+        def create_cached_model(self, model_name, system_instruction, ttl):
+            return CassetteModel(model_name, system_instruction=system_instruction, cached=True)
+
+    llm_client.register_backend("stub", CassetteBackend)
+
+
+# --- REPLAY ---
+
+class ReplaySession:
+    """State of one recorded session while it is replayed (its chat record)"""
+
+    def __init__(self, session_id):
+        self.tutor_id = f"replay-{session_id}"
+        self.record = None
+        self.persona = None
+
+    def open_chat(self, persona_id):
+        import chat_sessions
+        import data_manager
+        import judgment_call
+        store = data_manager.get_store()
+        persona = store.get_persona(persona_id) if persona_id is not None and store else None
+        # Recordings from the CLI have no persona id: they used the default persona
+        self.persona = persona or {"id": persona_id or "default", "description": judgment_call.DEFAULT_PERSONA}
+        self.record = chat_sessions.ChatRecord.new(self.tutor_id, self.persona['id'])
+
+    # One method per op, each making the same engine calls as the app
+
+    def goal(self, event):
+        import data_manager
+        import goal_setting
+        import progress_store
+        scenario = data_manager.get_store().get_scenario(event.get("id"))
+        if scenario is None:
+            raise KeyError(f"Scenario {event.get('id')!r} is not in the library")
+        if goal_setting.EVAL_MODE == "structured":
+            evaluation = goal_setting.grade_tutor_response_structured(event["in"], scenario)
+        else:
+            evaluation = goal_setting.grade_tutor_response(event["in"], scenario)
+        progress_store.get_progress_store().record_goal(self.tutor_id, scenario['id'], evaluation)
+
+    def chat_open(self, event):
+        import chat_sessions
+        import judgment_call
+        self.open_chat(event.get("id"))
+        opening = judgment_call.opening_line(self.persona['description'], self.persona['id'])
+        self.record.add("student", opening)
+        chat_sessions.get_chat_store().put(self.record)
+
+    def chat(self, event):
+        import chat_sessions
+        import judgment_call
+        import turn_scoring
+        if self.record is None:
+            self.open_chat(event.get("id"))
+        desc = self.persona['description']
+        chat = chat_sessions.get_chat(self.record, desc, judgment_call.MODEL_NAME)
+        reply = "".join(judgment_call.stream_reply(chat, event["in"], self.persona['id']))
+        chat_sessions.record_turn(self.record, desc, judgment_call.MODEL_NAME, chat, event["in"], reply)
+        if turn_scoring.ENABLED:
+            turn_scoring.get_scorer(self.record.session_id, desc, self.persona['id']).catch_up(self.record.turns)
+
+    def plan(self, event):
+        import feedback_training
+        import progress_store
+        import turn_scoring
+        if self.record is None or len(self.record.turns) < 2:
+            raise ValueError("Plan requested before any conversation")
+        desc = self.persona['description']
+        training_plan = None
+        if turn_scoring.ENABLED:
+            scorer = turn_scoring.get_scorer(self.record.session_id, desc, self.persona['id'])
+            scorer.catch_up(self.record.turns)
+            training_plan = scorer.training_plan()
+        if training_plan is None:
+            training_plan = feedback_training.generate_training_plan(self.record.transcript(desc).as_log(),
+                                                                     persona_id=self.persona['id'])
+        progress_store.get_progress_store().record_sim(self.tutor_id, self.persona['id'], training_plan)
+
+
+class Replayer:
+    """
+    Replays recorded sessions: each session runs its events in order on one
+    worker, each event scheduled at its recorded offset divided by `speed`
+    (0 = no waiting). At most `concurrency` sessions run at once; events
+    that start late because of that show up as lag.
+    """
+
+    def __init__(self, events, speed=1.0, concurrency=8):
+        self.events = events
+        self.speed = speed
+        self.concurrency = concurrency
+        self.results = []           # (op, latency_s, ok, lag_s)
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def run(self):
+        sessions = collections.OrderedDict()
+        for event in self.events:
+            sessions.setdefault(event["s"], []).append(event)
+        t0 = self.events[0]["ts"] if self.events else 0.0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as pool:
+            for session_id, session_events in sessions.items():
+                pool.submit(self._replay_session, session_id, session_events, t0, start)
+        return time.perf_counter() - start
+
+    def _replay_session(self, session_id, events, t0, start):
+        session = ReplaySession(session_id)
+        for event in events:
+            lag = 0.0
+            if self.speed > 0:
+                due = start + (event["ts"] - t0) / self.speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                lag = max(0.0, time.perf_counter() - due)
+            handler = getattr(session, event["op"], None)
+            t = time.perf_counter()
+            ok = True
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown op {event['op']!r}")
+                handler(event)
+            except Exception as e:
+                ok = False
+                with self._lock:
+                    self.errors[f"{event['op']}: {type(e).__name__}: {e}"[:200]] += 1
+            with self._lock:
+                self.results.append((event["op"], time.perf_counter() - t, ok, lag))
+
+    def report(self, wall_s):
+        import telemetry
+        by_op = collections.defaultdict(list)
+        for op, latency, ok, lag in self.results:
+            by_op[op].append((latency, ok, lag))
+        recorded = collections.defaultdict(list)
+        for event in self.events:
+            recorded[event["op"]].append(event.get("ms", 0.0))
+
+        def ms(ordered, q):
+            return round(telemetry.percentile(ordered, q) * 1000, 1)
+
+        ops = {}
+        for op, rows in sorted(by_op.items()):
+            latencies = sorted(r[0] for r in rows)
+            lags = sorted(r[2] for r in rows)
+            ops[op] = {
+                "count": len(rows),
+                "errors": sum(1 for r in rows if not r[1]),
+                "p50_ms": ms(latencies, 0.50), "p95_ms": ms(latencies, 0.95), "p99_ms": ms(latencies, 0.99),
+                "recorded_p50_ms": telemetry.percentile(sorted(recorded[op]), 0.50),
+                "lag_p95_ms": ms(lags, 0.95), "lag_max_ms": round(lags[-1] * 1000, 1),
+            }
+        total = len(self.results)
+        return {
+            "recording": describe(self.events),
+            "speed": self.speed,
+            "concurrency": self.concurrency,
+            "wall_s": round(wall_s, 3),
+            "ops_per_sec": round(total / wall_s, 2) if wall_s else 0.0,
+            "errors": sum(1 for r in self.results if not r[2]),
+            "ops": ops,
+            "error_samples": dict(self.errors.most_common(10)),
+            "model_calls": telemetry.summary(),
+        }
+
+
+def replay(path, speed=1.0, concurrency=8, backend="stub", scratch=True):
+    """
+    Replays a cassette and returns the report. backend is "stub",
+    "cassette" (stub plus recorded chat replies) or "live" (LLM_BACKEND as
+    configured). With scratch=True the progress, chat and evaluation-cache
+    stores go to a temporary folder unless their paths are already set.
+    Call before the engine modules are imported: they read these settings
+    at import time.
+    """
+    _, events = load(path)
+    if backend != "live":
+        os.environ["LLM_BACKEND"] = "stub"
+    if scratch:
+        folder = tempfile.mkdtemp(prefix="replay-")
+        os.environ.setdefault("PROGRESS_DB_PATH", os.path.join(folder, "progress.sqlite3"))
+        os.environ.setdefault("CHAT_STORE_PATH", os.path.join(folder, "chats.sqlite3"))
+        os.environ.setdefault("EVAL_CACHE_PATH", os.path.join(folder, "eval_cache.sqlite3"))
+    if backend == "cassette":
+        register_cassette_backend(events)
+    # Don't record the replay itself
+    global RECORD_PATH
+    RECORD_PATH = None
+
+    replayer = Replayer(events, speed, concurrency)
+    wall_s = replayer.run()
+    report = replayer.report(wall_s)
+    report.update(cassette=path, backend=backend)
+    return report
+
+
+# --- MAIN EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay recorded tutor traffic.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="Summarize a cassette")
+    info.add_argument("cassette")
+    run = commands.add_parser("replay", help="Replay a cassette and report latency and throughput")
+    run.add_argument("cassette")
+    run.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, N = N times faster, 0 = unthrottled")
+    run.add_argument("--concurrency", type=int, default=8, help="Sessions replayed at once")
+    run.add_argument("--backend", choices=["stub", "cassette", "live"], default="stub",
+                     help="Model backend: offline stub, stub with recorded chat replies, or LLM_BACKEND")
+    run.add_argument("--no-scratch", action="store_true", help="Use the configured stores instead of temporary ones")
+    run.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        headers, events = load(args.cassette)
+        print(json.dumps(dict(describe(events), recordings=len(headers)), indent=2))
+        sys.exit(0)
+
+    result = replay(args.cassette, args.speed, args.concurrency, args.backend, scratch=not args.no_scratch)
+    text = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
@@ -0,0 +1,131 @@
+import os
+
+import llm_client
+
+# --- ROLLING TRANSCRIPT ---
+# Long Judgment Call sessions would otherwise resend the whole chat history
+# on every turn. Once a session passes COMPACT_AFTER turns (or the verbatim
+# part passes MAX_HISTORY_TOKENS), the older exchanges are folded into a
+# running summary and only the last KEEP_TURNS turns stay verbatim.
+
+COMPACTION_ENABLED = os.getenv("TRANSCRIPT_COMPACTION", "1") != "0"
+KEEP_TURNS = int(os.getenv("TRANSCRIPT_KEEP_TURNS", "6"))
+COMPACT_AFTER = int(os.getenv("TRANSCRIPT_COMPACT_AFTER", "12"))
+MAX_HISTORY_TOKENS = int(os.getenv("TRANSCRIPT_MAX_TOKENS", "2000"))
+SUMMARY_TOKENS = int(os.getenv("TRANSCRIPT_SUMMARY_TOKENS", "300"))
+
+OPENING_MESSAGE = "Start conversation now."
+SPEAKERS = {"tutor": "Tutor", "student": "Student"}
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+def persona_history(persona_desc):
+    """The two priming turns every persona chat starts with"""
+    return [
+        {"role": "user", "parts": [f"System Instruction: Roleplay this student strictly.\n\n{persona_desc}"]},
+        {"role": "model", "parts": ["Understood. I am in character."]}
+    ]
+
+
+class RollingTranscript:
+    def __init__(self, persona_desc, keep_turns=KEEP_TURNS, compact_after=COMPACT_AFTER,
+                 max_tokens=MAX_HISTORY_TOKENS, summary_tokens=SUMMARY_TOKENS):
+        self.persona = persona_desc
+        self.keep_turns = keep_turns
+        self.compact_after = compact_after
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.turns = []          # [(speaker, text)], speaker is "tutor" or "student"
+        self.summary = ""
+        self.compacted_turns = 0
+
+    def add(self, speaker, text):
+        self.turns.append((speaker, text))
+
+    def lines(self, turns=None):
+        return [f"{SPEAKERS[speaker]}: {text}" for speaker, text in (self.turns if turns is None else turns)]
+
+    def recent_tokens(self):
+        return sum(estimate_tokens(text) for _, text in self.turns)
+
+    def needs_compaction(self):
+        if len(self.turns) <= self.keep_turns:
+            return False
+        return len(self.turns) > self.compact_after or self.recent_tokens() > self.max_tokens
+
+    def compact(self, summarize):
+        """
+        Folds everything but the recent window into the summary.
+        summarize(previous_summary, lines, token_budget) returns the new summary.
+        """
+        keep = self.keep_turns
+        # Shrink the verbatim window if a few long turns alone blow the budget
+        while keep > 2 and sum(estimate_tokens(t) for _, t in self.turns[-keep:]) > self.max_tokens:
+            keep -= 2
+        # Start the verbatim window on a tutor turn so chat roles keep alternating
+        if keep > 1 and self.turns[-keep][0] == "student":
+            keep -= 1
+        older, recent = self.turns[:-keep], self.turns[-keep:]
+        if not older:
+            return False
+        self.summary = summarize(self.summary, self.lines(older), self.summary_tokens)
+        self.compacted_turns += len(older)
+        self.turns = recent
+        return True
+
+    def chat_history(self):
+        """Gemini chat history: persona priming, the summary, then recent turns verbatim"""
+        history = persona_history(self.persona)
+        if self.summary:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far (stay consistent with it):\n{self.summary}"]})
+            history.append({"role": "model", "parts": ["Understood. I remember."]})
+        elif self.turns and self.turns[0][0] == "student":
+            history.append({"role": "user", "parts": [OPENING_MESSAGE]})
+        for speaker, text in self.turns:
+            role = "user" if speaker == "tutor" else "model"
+            # Merge back-to-back turns from the same side (e.g. after a failed reply)
+            if history[-1]["role"] == role:
+                history[-1]["parts"] = [history[-1]["parts"][0] + "\n" + text]
+            else:
+                history.append({"role": role, "parts": [text]})
+        return history
+
+    def as_log(self):
+        """Compact transcript for the feedback generator"""
+        log = []
+        if self.summary:
+            log.append(f"Summary of earlier conversation ({self.compacted_turns} turns): {self.summary}")
+        return log + self.lines()
+
+
+def summarize_with_model(model_name):
+    """Returns a summarize() callable for RollingTranscript.compact backed by the LLM"""
+    def summarize(previous_summary, lines, token_budget):
+        transcript_text = "\n".join(lines)
+        prompt = f"""
+        You are keeping notes on a tutoring roleplay between a tutor and a simulated student.
+        Update the running summary with the new exchanges below.
+        Keep the student's persona, emotional state and key emotional beats, what the tutor tried,
+        and how the student reacted. Write in the third person, at most {int(token_budget * 0.75)} words.
+
+        RUNNING SUMMARY:
+        {previous_summary or "(none yet)"}
+
+        NEW EXCHANGES:
+        {transcript_text}
+        """
+        return llm_client.generate(model_name, prompt, op="transcript.summarize").strip()
+    return summarize
+
+def maybe_compact(transcript, model_name):
+    """Compacts the transcript if it is over budget; returns True if it changed"""
+    if not COMPACTION_ENABLED or not transcript.needs_compaction():
+        return False
+    try:
+        return transcript.compact(summarize_with_model(model_name))
+    except Exception as e:
+        # Keep the full history rather than losing turns
+        print(f"Transcript compaction skipped: {e}")
+        return False
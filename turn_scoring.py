@@ -0,0 +1,381 @@
+import collections
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import asdict, dataclass, field
+
+import cascade
+import eval_cache
+import feedback_training
+import jobs
+import llm_client
+import telemetry
+
+# --- INCREMENTAL TURN SCORING ---
+# Each tutor turn of a Judgment Call chat is scored against the empathy
+# rubric on the background job pool as soon as the student has replied.
+# The per-turn assessments are folded into a running per-criterion state
+# (SessionScore), so "End Simulation & Get Feedback" only has to wait for
+# the last turn in flight and merge: no model call over the whole
+# transcript, whatever the length of the conversation.
+#
+# Assessments are cached by content in eval_cache, so a replica that picks
+# up a conversation started elsewhere (see chat_sessions.py) re-scores the
+# earlier turns from the cache. TURN_SCORING=0 goes back to one
+# generate_training_plan() call at the end.
+#
+# Turns that never got scored in the background (queue full, failures, a
+# replica that picked the conversation up late) are scored at the end in
+# parallel, LEFTOVER_WORKERS at a time, within the same wait deadline.
+# Whatever is still missing then is left out and the plan says it is partial.
+
+ENABLED = os.getenv("TURN_SCORING", "1") != "0"
+# Per-turn calls are small; use the cascade's fast model when there is one
+MODEL_NAME = (llm_client.resolve_model_name("GEMINI_MODEL_TURN") or cascade.FAST_MODEL
+              or feedback_training.MODEL_NAME)
+WAIT_SECONDS = float(os.getenv("TURN_SCORING_WAIT_SECONDS", "20"))
+LIVE_SCORERS = int(os.getenv("TURN_SCORING_LIVE_SESSIONS", "256"))
+LEFTOVER_WORKERS = int(os.getenv("TURN_SCORING_LEFTOVER_WORKERS", "8"))
+QUOTE_CHARS = 160
+
+PROMPT_VERSION = "1"
+
+# (key, label) for the empathy criteria of the training-plan rubric
+CRITERIA = [
+    ("emotional_recognition", "Emotional Recognition"),
+    ("perspective_taking", "Perspective-Taking"),
+    ("intensity_alignment", "Alignment with Emotional Intensity"),
+    ("non_judgmental", "Non-judgmental Stance"),
+    ("pause_reflection", "Pause and Reflection"),
+    ("collaborative_language", "Collaborative Problem-Solving Language"),
+    ("genuine_care", "Expression of Genuine Care"),
+    ("noticing_appreciation", "Noticing and Appreciation"),
+    ("follow_through", "Follow-Through Intent"),
+    ("seeking_understanding", "Seeking to Understand"),
+    ("equity_awareness", "Equity Awareness"),
+]
+CRITERIA_KEYS = [key for key, _ in CRITERIA]
+LABELS = dict(CRITERIA)
+CRITERIA_TEXT = "\n    ".join(f"{i}. {label}" for i, (_, label) in enumerate(CRITERIA, 1))
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": dict(
+        {key: {"type": "integer", "description": f"{label}: 1-10, or 0 if this turn gave no opportunity to show it"}
+         for key, label in CRITERIA},
+        appropriateness={"type": "string", "enum": feedback_training.APPROPRIATENESS},
+        strength={"type": "string", "description": "One sentence: what worked in this turn"},
+        growth={"type": "string", "description": "One sentence: what was missed or could be better"},
+        practice={"type": "string", "description": "One short exercise targeting the growth point"},
+    ),
+    "required": CRITERIA_KEYS + ["appropriateness", "strength", "growth", "practice"],
+}
+
+PREFIX = llm_client.PromptPrefix("turn_scoring", PROMPT_VERSION, f"""
+    ROLE:
+    You are an expert evaluator for educational tutors, observing a live simulation between a candidate tutor and a simulated student.
+    Each message gives you the student persona, the student's previous line, ONE tutor turn and the student's reply to it.
+
+    TASK:
+    Score only that tutor turn. For each criterion give an integer from 1 to 10, or 0 if the turn gave no opportunity to show it:
+    {CRITERIA_TEXT}
+
+    appropriateness: highly appropriate (empathy, perspective-taking, skillful intervention), moderately appropriate
+    (some understanding but missed opportunities) or inappropriate (avoidant, dismissive or reactive).
+    strength, growth and practice are single sentences specific to this turn; do not restate the criteria.
+
+    Respond with JSON only, matching the provided schema.
+""")
+
+SUFFIX_TEMPLATE = """STUDENT PERSONA:
+{persona}
+
+STUDENT (before): {context}
+TUTOR: {tutor_text}
+STUDENT (reply): {reply}
+"""
+
+TEMPLATE_KEY = llm_client.template_key(PREFIX, SUFFIX_TEMPLATE)
+
+
+@dataclass
+class TurnAssessment:
+    turn: int                      # index of the tutor turn in the conversation
+    criteria: dict                 # criterion key -> 1-10, or 0 when not applicable
+    appropriateness: str
+    strength: str
+    growth: str
+    practice: str
+    tutor_text: str = ""
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _quote(text):
+    text = " ".join(text.split())
+    return text if len(text) <= QUOTE_CHARS else text[:QUOTE_CHARS - 1] + "…"
+
+def parse_turn(text):
+    """JSON payload from the model, tolerating ```json fences"""
+    payload = json.loads(text.strip().removeprefix("```json").removeprefix("```").removesuffix("```"))
+    missing = [k for k in RESPONSE_SCHEMA["required"] if k not in payload]
+    if missing:
+        raise ValueError(f"Turn assessment is missing: {', '.join(missing)}")
+    if payload["appropriateness"] not in feedback_training.APPROPRIATENESS:
+        raise ValueError(f"Unknown rating: {payload['appropriateness']!r}")
+    return payload
+
+# Scores one tutor turn, takes in:
+    # persona_desc (str): personality description
+    # context (str): the student's line the tutor is answering ("" at the start)
+    # tutor_text, reply (str): the tutor turn and the student's reply to it
+# Returns a TurnAssessment. Raises on API or parse errors.
+def score_turn(turn_index, persona_desc, context, tutor_text, reply, persona_id=None,
+               model_name=MODEL_NAME, use_cache=True):
+    prompt = SUFFIX_TEMPLATE.format(persona=persona_desc.strip(), context=context or "(start of session)",
+                                    tutor_text=tutor_text, reply=reply)
+
+    def call_model():
+        text = llm_client.generate(model_name, prompt, op="turn_scoring.score_turn", prefix=PREFIX,
+                                   tags={"persona_id": persona_id},
+                                   generation_config={"response_mime_type": "application/json",
+                                                      "response_schema": RESPONSE_SCHEMA})
+        # Parse before caching so malformed output is never stored
+        return parse_turn(text)
+
+    if use_cache:
+        inputs = [persona_desc, context, tutor_text, reply]
+        payload = eval_cache.get_cache().get_or_compute(model_name, TEMPLATE_KEY, inputs, call_model)
+    else:
+        payload = call_model()
+    criteria = {key: min(10, max(0, int(payload[key]))) for key in CRITERIA_KEYS}
+    return TurnAssessment(turn=turn_index, criteria=criteria, appropriateness=payload["appropriateness"],
+                          strength=payload["strength"], growth=payload["growth"], practice=payload["practice"],
+                          tutor_text=_quote(tutor_text))
+
+
+# --- RUNNING STATE ---
+
+@dataclass
+class SessionScore:
+    """Per-criterion running totals plus the best and worst moment for each criterion"""
+    scored: list = field(default_factory=list)      # tutor turn indices already folded in
+    totals: dict = field(default_factory=dict)      # criterion -> sum of applicable scores
+    counts: dict = field(default_factory=dict)      # criterion -> turns where it applied
+    best: dict = field(default_factory=dict)        # criterion -> [score, turn, quote, strength]
+    worst: dict = field(default_factory=dict)       # criterion -> [score, turn, quote, growth, practice]
+    ratings: dict = field(default_factory=dict)     # appropriateness -> turns
+
+    def add(self, assessment):
+        """Folds one assessment in; returns False if that turn was already counted"""
+        if assessment.turn in self.scored:
+            return False
+        self.scored.append(assessment.turn)
+        for key, score in assessment.criteria.items():
+            if not score:
+                continue
+            self.totals[key] = self.totals.get(key, 0) + score
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if key not in self.best or score > self.best[key][0]:
+                self.best[key] = [score, assessment.turn, assessment.tutor_text, assessment.strength]
+            if key not in self.worst or score < self.worst[key][0]:
+                self.worst[key] = [score, assessment.turn, assessment.tutor_text, assessment.growth,
+                                   assessment.practice]
+        self.ratings[assessment.appropriateness] = self.ratings.get(assessment.appropriateness, 0) + 1
+        return True
+
+    def averages(self):
+        return {key: self.totals[key] / self.counts[key] for key in CRITERIA_KEYS if self.counts.get(key)}
+
+    def mean_score(self):
+        averages = self.averages()
+        return round(sum(averages.values()) / len(averages), 2) if averages else None
+
+    def overall_rating(self):
+        """Turn-weighted average of the ratings, mapped back onto the three bands"""
+        turns = sum(self.ratings.values())
+        if not turns:
+            return None
+        bands = feedback_training.APPROPRIATENESS
+        position = sum(bands.index(rating) * n for rating, n in self.ratings.items()) / turns
+        return bands[int(position + 0.5)]
+
+    def as_markdown(self, strengths=2, growth=2):
+        """The training plan: a merge of the per-turn assessments"""
+        averages = self.averages()
+        if not averages:
+            return None
+        ranked = sorted(averages, key=averages.get)
+        weakest = ranked[:growth]
+        strongest = [key for key in reversed(ranked) if key not in weakest][:strengths]
+        rating_counts = ", ".join(f"{n} {rating}" for rating, n in
+                                  sorted(self.ratings.items(), key=lambda item: -item[1]))
+
+        lines = [f"**Overall: {self.overall_rating()}** ({len(self.scored)} turns scored: {rating_counts})", "",
+                 "**STRENGTHS (What to keep doing)**"]
+        for key in strongest:
+            score, turn, quote, note = self.best[key]
+            lines.append(f"- **{LABELS[key]}** (avg {averages[key]:.1f}/10). {note} "
+                         f"Best moment, turn {turn + 1}: _\"{quote}\"_")
+        lines += ["", "**AREAS FOR GROWTH**"]
+        for key in weakest:
+            score, turn, quote, note, _ = self.worst[key]
+            lines.append(f"- **{LABELS[key]}** (avg {averages[key]:.1f}/10). {note} "
+                         f"Turn {turn + 1}: _\"{quote}\"_")
+        lines += ["", "**ACTIONABLE PRACTICE**"]
+        # Both weak spots may come from the same turn
+        lines += [f"- {tip}" for tip in dict.fromkeys(self.worst[key][4] for key in weakest)]
+        rows = "\n".join(f"| {LABELS[key]} | {averages[key]:.1f}/10 | {self.counts[key]} |"
+                         for key in CRITERIA_KEYS if key in averages)
+        lines += ["", f"| Criterion | Average | Turns |\n|---|---|---|\n{rows}"]
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+# --- SESSION SCORER ---
+
+class SessionScorer:
+    """
+    Scores the tutor turns of one conversation in the background and keeps
+    its SessionScore. submit() never blocks; training_plan() waits (up to
+    `timeout`) only for turns still in flight.
+    """
+
+    def __init__(self, persona_desc, persona_id=None, model_name=MODEL_NAME, job_queue=None):
+        self.persona_desc = persona_desc
+        self.persona_id = persona_id
+        self.model_name = model_name
+        self.state = SessionScore()
+        self.failed = 0
+        self._queue = job_queue
+        self._lock = threading.Lock()
+        self._pending = {}          # turn index -> threading.Event set when its job ends
+        self._running = set()
+        self._inputs = {}           # turn index -> (context, tutor_text, reply) until scored
+
+    def submit(self, turn_index, context, tutor_text, reply):
+        """Queues one tutor turn for scoring (no-op if it is scored or in flight)"""
+        with self._lock:
+            if turn_index in self.state.scored or turn_index in self._pending:
+                return
+            self._inputs[turn_index] = (context, tutor_text, reply)
+            done = self._pending[turn_index] = threading.Event()
+        try:
+            (self._queue or jobs.get_queue()).submit(self._run, turn_index, done, kind="turn_score")
+        except jobs.JobQueueFull as e:
+            # Left in _inputs: scored inline by training_plan()
+            telemetry.record_error("turn_scoring.queue_full", e, persona_id=self.persona_id)
+            with self._lock:
+                del self._pending[turn_index]
+
+    def catch_up(self, turns):
+        """
+        Submits every tutor turn of a [(speaker, text)] conversation that has
+        a student reply and is not scored yet, e.g. turns served by another
+        replica before this one picked the conversation up
+        """
+        for i, (speaker, text) in enumerate(turns):
+            if speaker != "tutor" or i + 1 >= len(turns) or turns[i + 1][0] != "student":
+                continue
+            context = turns[i - 1][1] if i > 0 and turns[i - 1][0] == "student" else ""
+            self.submit(i, context, text, turns[i + 1][1])
+
+    def _run(self, turn_index, done):
+        with self._lock:
+            if turn_index not in self._pending:
+                # Claimed by wait() while still queued
+                done.set()
+                return
+            self._running.add(turn_index)
+        try:
+            self._score(turn_index)
+        finally:
+            with self._lock:
+                self._pending.pop(turn_index, None)
+                self._running.discard(turn_index)
+            done.set()
+
+    def _score(self, turn_index):
+        with self._lock:
+            inputs = self._inputs.get(turn_index)
+        if inputs is None:
+            return
+        try:
+            assessment = score_turn(turn_index, self.persona_desc, *inputs, persona_id=self.persona_id,
+                                    model_name=self.model_name)
+        except Exception as e:
+            telemetry.record_error("turn_scoring.score_turn", e, persona_id=self.persona_id)
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.state.add(assessment)
+            self._inputs.pop(turn_index, None)
+
+    def wait(self, timeout=WAIT_SECONDS):
+        """
+        Waits for the turns being scored right now, then scores every turn
+        that is still queued, failed or never made it onto the queue, in
+        parallel on a private pool, until the deadline. Queued turns are
+        taken over rather than waited for, so this is safe to call from a job
+        on the same pool. Returns the SessionScore (possibly partial).
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            for turn in [t for t in self._pending if t not in self._running]:
+                del self._pending[turn]
+            events = list(self._pending.values())
+        for done in events:
+            done.wait(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            leftovers = sorted(turn for turn in self._inputs if turn not in self._pending)
+        if leftovers:
+            # Failures are already counted by _score(); late results still fold into the state
+            pool = ThreadPoolExecutor(max_workers=min(LEFTOVER_WORKERS, len(leftovers)),
+                                      thread_name_prefix="turn-leftover")
+            futures = [pool.submit(self._score, turn) for turn in leftovers]
+            wait_futures(futures, timeout=max(0.0, deadline - time.monotonic()))
+            pool.shutdown(wait=False, cancel_futures=True)
+        return self.state
+
+    def training_plan(self, timeout=WAIT_SECONDS):
+        """Training plan merged from the turn assessments, or None if no turn could be scored"""
+        state = self.wait(timeout)
+        with self._lock:
+            plan = state.as_markdown()
+            missing = len(self._inputs)
+        if plan and missing:
+            plan += f"\n\n_Partial plan: {missing} turn(s) could not be scored in time and are not included._"
+        return plan
+
+    def stats(self):
+        with self._lock:
+            return {"scored": len(self.state.scored), "in_flight": len(self._pending),
+                    "unscored": len(self._inputs) - len(self._pending), "failed": self.failed}
+
+
+# Scorers for the conversations this process served recently, keyed by chat session id
+
+_scorers = collections.OrderedDict()
+_scorers_lock = threading.Lock()
+
+def get_scorer(session_id, persona_desc, persona_id=None):
+    """The SessionScorer for a chat session, created on first use"""
+    with _scorers_lock:
+        scorer = _scorers.get(session_id)
+        if scorer is None or scorer.persona_desc != persona_desc:
+            scorer = _scorers[session_id] = SessionScorer(persona_desc, persona_id)
+        _scorers.move_to_end(session_id)
+        while len(_scorers) > LIVE_SCORERS:
+            _scorers.popitem(last=False)
+        return scorer